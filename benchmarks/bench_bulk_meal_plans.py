@@ -0,0 +1,72 @@
+"""
+Throughput of scheduling many meals: one add_meal_plan POST per meal (old way)
+vs. a single bulk_add_meal_plans request.
+
+    python benchmarks/bench_bulk_meal_plans.py --meals 20 60 --ingredients 8
+"""
+import argparse
+import datetime
+import time
+
+from _django import setup
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--meals', type=int, nargs='+', default=[20, 60])
+    parser.add_argument('--ingredients', type=int, default=8, help='ingredients per recipe')
+    args = parser.parse_args()
+
+    setup()
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext, setup_test_environment
+    from django.contrib.auth.models import User
+    from django.urls import reverse
+    from core import inventory
+    from core.models import Ingredient, MealPlan, Recipe, RecipeIngredient
+
+    setup_test_environment()
+    user = User.objects.create_user('bench', password='pw')
+    recipes = []
+    for r in range(5):
+        recipe = Recipe.objects.create(title=f'Recipe {r}', instructions='-', author=user)
+        for i in range(args.ingredients):
+            ingredient, _ = Ingredient.objects.get_or_create(name=f'Ingredient {i}')
+            RecipeIngredient.objects.create(recipe=recipe, ingredient=ingredient, quantity=1)
+        recipes.append(recipe)
+    client = Client()
+    client.login(username='bench', password='pw')
+    start_date = datetime.date(2026, 1, 1)
+
+    def restock(meals):
+        MealPlan.objects.all().delete()
+        inventory.add_stock(user, {i.id: meals for i in Ingredient.objects.all()}, 'restock')
+
+    print(f"{'meals':>6} {'variant':<12} {'ms':>9} {'meals/s':>9} {'queries':>8}")
+    for meals in args.meals:
+        plan = [(recipes[n % len(recipes)].id, start_date + datetime.timedelta(days=n)) for n in range(meals)]
+
+        restock(meals)
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for recipe_id, day in plan:
+                client.post(reverse('add_meal_plan'), {'recipe': recipe_id, 'date': day.isoformat()})
+            loop = time.perf_counter() - start
+        loop_queries = len(queries)
+
+        restock(meals)
+        payload = {'mode': 'all_or_nothing',
+                   'meals': [{'recipe': recipe_id, 'date': day.isoformat()} for recipe_id, day in plan]}
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            client.post(reverse('bulk_add_meal_plans'), payload, content_type='application/json')
+            bulk = time.perf_counter() - start
+        assert MealPlan.objects.count() == meals
+
+        print(f"{meals:>6} {'loop':<12} {loop * 1000:>9.1f} {meals / loop:>9.0f} {loop_queries:>8}")
+        print(f"{meals:>6} {'bulk':<12} {bulk * 1000:>9.1f} {meals / bulk:>9.0f} {len(queries):>8}")
+
+
+if __name__ == '__main__':
+    main()
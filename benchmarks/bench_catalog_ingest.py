@@ -0,0 +1,45 @@
+"""
+Streaming catalog ingest: rows/s and peak memory for a large JSON Lines catalog
+(every tenth row repeats an earlier name with different case).
+
+    python benchmarks/bench_catalog_ingest.py --rows 1000000 --batch-size 1000
+"""
+import argparse
+import json
+import os
+import resource
+import tempfile
+
+from _django import setup
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup()
+    from django.conf import settings
+    from core.catalog_ingest import ingest, iter_rows
+
+    settings.DEBUG = False  # DEBUG keeps the last 9000 SQL statements in memory
+
+    path = os.path.join(tempfile.mkdtemp(prefix='recipe-bench-'), 'catalog.jsonl')
+    with open(path, 'w') as fp:
+        for n in range(args.rows):
+            if n % 10 == 9:
+                fp.write(json.dumps({'name': f'INGREDIENT {n // 2}'}) + '\n')
+            else:
+                fp.write(json.dumps({'name': f'Ingredient {n}', 'unit': ('g', 'ml', 'pieces')[n % 3]}) + '\n')
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    stats = ingest(iter_rows(path), batch_size=args.batch_size)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{stats['rows']} rows: {stats['created']} created, {stats['unchanged']} already present")
+    print(f"{stats['seconds']:.1f} s  ->  {stats['rows'] / stats['seconds']:,.0f} rows/s; "
+          f"peak RSS {peak / 1024:.0f} MB (+{(peak - before) / 1024:.0f} MB during ingest)")
+
+
+if __name__ == '__main__':
+    main()
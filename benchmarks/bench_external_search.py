@@ -0,0 +1,96 @@
+"""
+External recipe search under load against the local Spoonacular stub: the same
+view served through the WSGI handler by a fixed pool of worker threads vs. the
+ASGI handler on one event loop, with every request missing the cache.
+
+    python benchmarks/bench_external_search.py --requests 400 --concurrency 200 --delay 0.25
+
+The handlers are driven in-process (no HTTP server in front of Django), so the
+numbers compare how many upstream waits each side can overlap, not socket I/O.
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+
+from _django import setup
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=200, help='simultaneous ASGI requests')
+    parser.add_argument('--wsgi-threads', type=int, default=8, help='WSGI worker threads')
+    parser.add_argument('--delay', type=float, default=0.25, help='upstream latency in seconds')
+    args = parser.parse_args()
+
+    setup()
+    from django.conf import settings
+    from django.core.asgi import get_asgi_application
+    from django.core.wsgi import get_wsgi_application
+    from core import spoonacular
+    from core.spoonacular_stub import StubServer
+
+    stub = StubServer(delay=args.delay).start()
+    settings.SPOONACULAR_BASE_URL = stub.url
+    settings.SPOONACULAR_MAX_CONCURRENCY = args.concurrency
+    settings.SPOONACULAR_POOL_SIZE = args.concurrency
+    settings.SPOONACULAR_CACHE_SIZE = 0  # every request goes upstream
+    spoonacular.reset_client()
+    path = '/external-recipes/'
+
+    wsgi = get_wsgi_application()
+
+    def wsgi_request(n):
+        environ = {'PATH_INFO': path, 'QUERY_STRING': f'query=wsgi+{n}'}
+        setup_testing_defaults(environ)
+        status = []
+        body = b''.join(wsgi(environ, lambda s, headers, exc_info=None: status.append(s)))
+        assert status[0].startswith('200'), status
+        return len(body)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.wsgi_threads) as pool:
+        list(pool.map(wsgi_request, range(args.requests)))
+    wsgi_seconds = time.perf_counter() - start
+
+    asgi = get_asgi_application()
+
+    async def asgi_request(n, limit):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+            'query_string': f'query=asgi+{n}'.encode(), 'headers': [(b'host', b'localhost')],
+            'client': ('127.0.0.1', 50000), 'server': ('localhost', 80),
+        }
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        async with limit:
+            await asgi(scope, receive, send)
+        assert messages[0]['status'] == 200, messages[0]
+
+    async def asgi_run():
+        limit = asyncio.Semaphore(args.concurrency)
+        await asyncio.gather(*[asgi_request(n, limit) for n in range(args.requests)])
+
+    start = time.perf_counter()
+    asyncio.run(asgi_run())
+    asgi_seconds = time.perf_counter() - start
+    stub.stop()
+
+    backend = 'httpx' if spoonacular.httpx is not None else 'thread pool'
+    print(f"{args.requests} requests, upstream delay {args.delay * 1000:.0f} ms, async upstream: {backend}")
+    print(f"{'server':<28} {'seconds':>8} {'req/s':>8}")
+    print(f"{f'WSGI ({args.wsgi_threads} threads)':<28} {wsgi_seconds:>8.2f} {args.requests / wsgi_seconds:>8.0f}")
+    print(f"{f'ASGI ({args.concurrency} concurrent)':<28} {asgi_seconds:>8.2f} {args.requests / asgi_seconds:>8.0f}")
+
+
+if __name__ == '__main__':
+    main()
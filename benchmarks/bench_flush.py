@@ -0,0 +1,88 @@
+"""
+flush_except_users: the old per-model ORM delete vs. the dependency-ordered
+batched DELETE and the backend flush SQL, each on a fresh copy of the same data.
+
+    python benchmarks/bench_flush.py --recipes 5000 --ingredients-per-recipe 8
+"""
+import argparse
+import resource
+import shutil
+import time
+
+from _django import setup
+
+
+def seed(recipes, per_recipe):
+    from django.contrib.auth.models import User
+    from core.models import Ingredient, InventoryItem, Recipe, RecipeIngredient, StockMovement
+
+    user = User.objects.create_user('bench', password='pw')
+    Ingredient.objects.bulk_create([Ingredient(name=f'Ingredient {n}', measurement_unit='g')
+                                    for n in range(2000)], batch_size=500)
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    Recipe.objects.bulk_create([Recipe(author=user, title=f'Recipe {n}', instructions='Cook.')
+                                for n in range(recipes)], batch_size=500)
+    rows = [RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredient_ids[(recipe_id * 7 + k) % 2000], quantity=1)
+            for recipe_id in Recipe.objects.values_list('id', flat=True) for k in range(per_recipe)]
+    RecipeIngredient.objects.bulk_create(rows, batch_size=500)
+    InventoryItem.objects.bulk_create([InventoryItem(user=user, ingredient_id=i, current_stock=10)
+                                       for i in ingredient_ids], batch_size=500)
+    StockMovement.objects.bulk_create([StockMovement(user=user, ingredient_id=ingredient_ids[n % 2000], delta=1,
+                                                     reason='restock') for n in range(recipes * 2)], batch_size=500)
+    return len(rows)
+
+
+def old_flush():
+    # The command's previous implementation.
+    from django.apps import apps
+    from django.contrib.auth.models import Group, User
+    for model in apps.get_models():
+        if model not in (User, Group) and model.objects.count():
+            model.objects.all().delete()
+
+
+def new_flush(truncate, batch_size):
+    from django.contrib.auth.models import Group, User
+    from core.flush import delete_tables, plan_flush, truncate_tables
+    plan = plan_flush({User, Group})
+    if truncate:
+        truncate_tables(plan)
+    else:
+        list(delete_tables(plan, batch_size))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--recipes', type=int, default=5000)
+    parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    db_path = setup()
+    from django.conf import settings
+    from django.db import connection
+
+    settings.DEBUG = False
+    lines = seed(args.recipes, args.ingredients_per_recipe)
+    connection.close()
+    seeded = db_path + '.seeded'
+    shutil.copyfile(db_path, seeded)
+
+    print(f"{args.recipes} recipes, {lines} recipe lines")
+    print(f"{'method':<24} {'seconds':>8} {'peak RSS MB':>12}")
+    runs = [('ORM delete (old)', old_flush),
+            (f'batched DELETE ({args.batch_size})', lambda: new_flush(False, args.batch_size)),
+            ('flush SQL', lambda: new_flush(True, args.batch_size))]
+    for label, run in runs:
+        shutil.copyfile(seeded, db_path)
+        start = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - start
+        connection.close()
+        # ru_maxrss never goes down, so later rows show the peak so far.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"{label:<24} {seconds:>8.2f} {peak:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
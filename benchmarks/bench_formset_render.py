@@ -0,0 +1,67 @@
+"""
+Recipe ingredient formset render time: per-row catalog queries (old) vs. the
+shared cached choice list vs. the autocomplete widget.
+
+    python benchmarks/bench_formset_render.py --rows 20 --ingredients 50000
+"""
+import argparse
+
+from _django import setup, timed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20)
+    parser.add_argument('--ingredients', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup()
+    from django import forms
+    from django.db import connection
+    from django.forms import inlineformset_factory
+    from django.test.utils import CaptureQueriesContext, override_settings
+    from core import ingredient_index
+    from core.forms import BaseRecipeIngredientInlineFormSet, RecipeIngredientForm
+    from core.models import Ingredient, Recipe, RecipeIngredient
+
+    Ingredient.objects.bulk_create(
+        [Ingredient(name=f'Ingredient {i:06d}', measurement_unit='g') for i in range(args.ingredients)],
+        batch_size=5000,
+    )
+
+    class LegacyRecipeIngredientForm(RecipeIngredientForm):
+        # The previous behaviour: a fresh queryset (and query) per form.
+        def __init__(self, *a, **kw):
+            super().__init__(*a, **kw)
+            field = self.fields['ingredient']
+            field.widget = forms.Select()
+            field.__dict__.pop('_choices', None)
+            field.queryset = Ingredient.objects.all()
+            field.label_from_instance = lambda obj: f"{obj.name} ({obj.measurement_unit})"
+
+    def formset_class(form):
+        return inlineformset_factory(Recipe, RecipeIngredient, form=form,
+                                     formset=BaseRecipeIngredientInlineFormSet, extra=args.rows)
+
+    def render(form):
+        return formset_class(form)().as_p()
+
+    ingredient_index.get_index()  # built once per process, like a warm worker
+    print(f"{args.rows} rows, {args.ingredients} ingredients")
+    print(f"{'variant':<22} {'ms':>9} {'queries':>8} {'html KB':>9}")
+    variants = [
+        ('per-row queryset', LegacyRecipeIngredientForm, args.ingredients + 1),
+        ('cached select', RecipeIngredientForm, args.ingredients + 1),
+        ('autocomplete widget', RecipeIngredientForm, 0),
+    ]
+    for label, form, threshold in variants:
+        with override_settings(INGREDIENT_AUTOCOMPLETE_THRESHOLD=threshold):
+            seconds, html = timed(lambda: render(form), args.repeat)
+            with CaptureQueriesContext(connection) as queries:
+                render(form)
+        print(f"{label:<22} {seconds * 1000:>9.1f} {len(queries):>8} {len(html) / 1024:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
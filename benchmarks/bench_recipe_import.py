@@ -0,0 +1,60 @@
+"""
+Import throughput of recipe_import.import_recipes for a synthetic Spoonacular-format
+dump (written to a temp file and read back, as the import_recipes command does).
+
+    python benchmarks/bench_recipe_import.py --recipes 5000 --ingredients 10 --vocabulary 800
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from _django import setup
+
+# Each ingredient is measured in units of one kind, as in real recipe data.
+UNIT_KINDS = [['g', 'kg', 'oz', 'lb'], ['cup', 'tbsp', 'tsp', 'ml'], ['cloves', 'large', '']]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--recipes', type=int, default=5000)
+    parser.add_argument('--ingredients', type=int, default=10, help='ingredient lines per recipe')
+    parser.add_argument('--vocabulary', type=int, default=800, help='distinct ingredient names')
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    setup()
+    from django.contrib.auth.models import User
+    from core.models import Ingredient, RecipeIngredient
+    from core.recipe_import import import_recipes, load_dump
+
+    rng = random.Random(1)
+    names = [f'ingredient {n}' for n in range(args.vocabulary)]
+    kinds = {name: UNIT_KINDS[n % len(UNIT_KINDS)] for n, name in enumerate(names)}
+    # A quarter of the vocabulary is already in the catalog.
+    Ingredient.objects.bulk_create([Ingredient(name=name.title(), measurement_unit=('g', 'ml', 'pieces')[n % 3])
+                                    for n, name in enumerate(names[:args.vocabulary // 4])])
+    recipes = [{
+        'id': n, 'title': f'Imported recipe {n}', 'summary': '<p>Generated.</p>',
+        'instructions': '<ol><li>Mix.</li><li>Bake.</li></ol>',
+        'extendedIngredients': [{'name': name, 'amount': rng.randint(1, 500), 'unit': rng.choice(kinds[name])}
+                                for name in rng.sample(names, args.ingredients)],
+    } for n in range(args.recipes)]
+    path = os.path.join(tempfile.mkdtemp(prefix='recipe-bench-'), 'dump.json')
+    with open(path, 'w') as fp:
+        json.dump(recipes, fp)
+
+    user = User.objects.create_user('bench')
+    start = time.perf_counter()
+    with open(path) as fp:
+        stats = import_recipes(user, load_dump(fp), batch_size=args.batch_size)
+    seconds = time.perf_counter() - start
+    print(f"{stats['created']} recipes, {RecipeIngredient.objects.count()} ingredient rows, "
+          f"{stats['ingredients_created']} new ingredients, {stats['lines_skipped']} unconvertible lines")
+    print(f"{seconds:.2f} s  ->  {stats['created'] / seconds * 60:,.0f} recipes/minute")
+
+
+if __name__ == '__main__':
+    main()
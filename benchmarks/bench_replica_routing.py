@@ -0,0 +1,135 @@
+"""
+A read-only view under concurrent writes, served from the primary alone vs. with
+the read replica (RECIPE_MANAGER_REPLICA), refreshed every --refresh seconds
+by the backup API while the benchmark runs. Each variant runs in its own
+process on a fresh database with the development SQLite settings.
+
+    python benchmarks/bench_replica_routing.py --readers 4 --writers 4 --requests 300 --path /recipes/1/
+
+Readers request --path through the WSGI handler; writers restock through
+inventory.add_stock, pausing --write-pause between restocks, until the readers
+are done.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from wsgiref.util import setup_testing_defaults
+
+from _django import setup
+
+VARIANTS = ['primary', 'replica']
+
+
+def run(args):
+    if args.variant == 'replica':
+        os.environ['RECIPE_MANAGER_REPLICA'] = os.path.join(tempfile.mkdtemp(prefix='recipe-bench-'), 'replica.sqlite3')
+    setup()
+    from django.contrib.auth.models import User
+    from django.core.wsgi import get_wsgi_application
+    from django.db import OperationalError, connections
+    from core import inventory, replica
+    from core.models import Ingredient, Recipe, RecipeIngredient
+
+    author = User.objects.create_user('bench')
+    writers = [User.objects.create_user(f'writer{n}') for n in range(args.writers)]
+    Ingredient.objects.bulk_create([Ingredient(name=f'Ingredient {n}') for n in range(100)])
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    Recipe.objects.bulk_create([Recipe(author=author, title=f'Recipe {n}', instructions='Cook.')
+                                for n in range(args.recipes)])
+    RecipeIngredient.objects.bulk_create([RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredient_ids[k], quantity=1)
+                                          for recipe_id in Recipe.objects.values_list('id', flat=True)
+                                          for k in range(5)])
+    refresh_seconds = []
+    if args.variant == 'replica':
+        refresh_seconds.append(replica.refresh_replica())
+    connections.close_all()
+
+    app = get_wsgi_application()
+    done = threading.Event()
+    latencies, writes, locked = [], [0], [0]
+
+    def reader(n):
+        try:
+            for _ in range(args.requests):
+                environ = {'PATH_INFO': args.path}
+                setup_testing_defaults(environ)
+                status = []
+                start = time.perf_counter()
+                b''.join(app(environ, lambda s, headers, exc_info=None: status.append(s)))
+                latencies.append(time.perf_counter() - start)
+                assert status[0].startswith('200'), status
+        finally:
+            connections.close_all()
+
+    def writer(n):
+        try:
+            k = 0
+            while not done.is_set():
+                try:
+                    inventory.add_stock(writers[n], {ingredient_ids[k % len(ingredient_ids)]: 1}, 'restock')
+                    writes[0] += 1
+                except OperationalError:
+                    locked[0] += 1
+                k += 1
+                time.sleep(args.write_pause)
+        finally:
+            connections.close_all()
+
+    def refresher():
+        try:
+            while not done.wait(args.refresh):
+                refresh_seconds.append(replica.refresh_replica())
+        finally:
+            connections.close_all()
+
+    background = [threading.Thread(target=writer, args=(n,)) for n in range(args.writers)]
+    if args.variant == 'replica':
+        background.append(threading.Thread(target=refresher))
+    readers = [threading.Thread(target=reader, args=(n,)) for n in range(args.readers)]
+    for thread in background + readers:
+        thread.start()
+    start = time.perf_counter()
+    for thread in readers:
+        thread.join()
+    seconds = time.perf_counter() - start
+    done.set()
+    for thread in background:
+        thread.join()
+
+    p95 = statistics.quantiles(latencies, n=20)[-1] * 1000
+    refresh = f"{statistics.median(refresh_seconds) * 1000:.0f}" if refresh_seconds else '-'
+    print(f"{args.variant:<8} {len(latencies) / seconds:>8.0f} {p95:>8.1f} {writes[0] / seconds:>9.0f} "
+          f"{locked[0]:>7} {refresh:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=300, help='requests per reader')
+    parser.add_argument('--path', default='/recipes/1/', help='a read-only view (REPLICA_READ_VIEWS)')
+    parser.add_argument('--recipes', type=int, default=200)
+    parser.add_argument('--refresh', type=float, default=1.0, help='seconds between replica refreshes')
+    parser.add_argument('--write-pause', type=float, default=0.0, help='seconds each writer waits between restocks')
+    parser.add_argument('--variant', choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.variant:
+        return run(args)
+
+    print(f"{args.readers} readers x {args.requests} requests to {args.path}, {args.writers} writers, "
+          f"{args.recipes} recipes")
+    print(f"{'reads':<8} {'req/s':>8} {'p95 ms':>8} {'writes/s':>9} {'locked':>7} {'refresh ms':>11}")
+    for variant in VARIANTS:
+        subprocess.run([sys.executable, __file__, '--variant', variant] +
+                       [f"--{name.replace('_', '-')}={getattr(args, name)}"
+                        for name in ('readers', 'writers', 'requests', 'path', 'recipes', 'refresh', 'write_pause')],
+                       check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Concurrent writers on the development SQLite setup vs. the production profile
+(RECIPE_MANAGER_DB_PROFILE=production: WAL, pragmas, BEGIN IMMEDIATE, busy
+retries, persistent connections). Each profile runs in its own process on a
+fresh database.
+
+    python benchmarks/bench_sqlite_profile.py --writers 8 --writes 200 --requests 2000
+
+writers: threads each restocking through inventory.add_stock (a read, then
+writes, in one transaction); a write that fails with "database is locked" is
+counted and not retried. requests: sequential request-sized reads, with
+close_old_connections() between them as the request handler does.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from _django import setup
+
+PROFILES = ['development', 'production']
+
+
+def run(args):
+    os.environ['RECIPE_MANAGER_DB_PROFILE'] = args.profile
+    setup()
+    from django.contrib.auth.models import User
+    from django.db import OperationalError, close_old_connections, connections
+    from core import inventory
+    from core.models import Ingredient, InventoryItem
+
+    users = [User.objects.create_user(f'bench{n}') for n in range(args.writers)]
+    Ingredient.objects.bulk_create([Ingredient(name=f'Ingredient {n}') for n in range(50)])
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    connections.close_all()
+
+    written, locked = [0] * args.writers, [0] * args.writers
+
+    def writer(n):
+        try:
+            for k in range(args.writes):
+                try:
+                    inventory.add_stock(users[n], {ingredient_ids[k % len(ingredient_ids)]: 1}, 'restock')
+                    written[n] += 1
+                except OperationalError:
+                    locked[n] += 1
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(args.writers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    write_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        close_old_connections()
+        InventoryItem.objects.filter(user=users[0], current_stock__gt=0).count()
+    request_seconds = time.perf_counter() - start
+
+    print(f"{args.profile:<12} {sum(written) / write_seconds:>10.0f} {sum(locked):>8} "
+          f"{request_seconds / args.requests * 1e6:>12.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--writes', type=int, default=200, help='restocks per writer')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--profile', choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.profile:
+        return run(args)
+
+    print(f"{args.writers} writers x {args.writes} restocks, {args.requests} requests")
+    print(f"{'profile':<12} {'writes/s':>10} {'locked':>8} {'us/request':>12}")
+    for profile in PROFILES:
+        subprocess.run([sys.executable, __file__, '--profile', profile, '--writers', str(args.writers),
+                        '--writes', str(args.writes), '--requests', str(args.requests)], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Unit conversion throughput: the old per-quantity CONVERSION_MAP lookup the
+forms did vs. units.convert() per call vs. one units.convert_many() batch
+(NumPy when installed, plain Python otherwise).
+
+    python benchmarks/bench_unit_conversion.py --quantities 1000000
+"""
+import argparse
+import random
+
+from _django import setup, timed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--quantities', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup()
+    from core import units
+    from core.units import CONVERSION_MAP, convert, convert_many
+
+    rng = random.Random(0)
+    same_kind = [('kg', 'g'), ('lb', 'g'), ('cup', 'ml'), ('tbsp', 'ml'), ('pieces', 'pieces')]
+    pairs = [same_kind[rng.randrange(len(same_kind))] for _ in range(args.quantities)]
+    quantities = [rng.uniform(0.1, 10) for _ in range(args.quantities)]
+    from_units = [source for source, target in pairs]
+    to_units = [target for source, target in pairs]
+    densities = [rng.choice([None, 0.53, 1.03]) for _ in range(args.quantities)]
+
+    def dict_lookup():
+        # What the forms did: canonical factor only, one quantity at a time.
+        return [q * CONVERSION_MAP[unit][1] for q, unit in zip(quantities, from_units)]
+
+    def per_call():
+        return [convert(q, source, target) for q, source, target in zip(quantities, from_units, to_units)]
+
+    def batch():
+        return convert_many(quantities, from_units, to_units)
+
+    def batch_arrays():
+        # Unit names (and quantities) already in NumPy arrays.
+        return convert_many(quantity_array, from_array, to_array)
+
+    def batch_cross_kind():
+        # Every quantity goes from cups to grams through its density (None -> NaN).
+        return convert_many(quantities, 'cup', 'g', densities)
+
+    backend = 'NumPy' if units.np is not None else 'plain Python'
+    print(f"{args.quantities} quantities, convert_many backend: {backend}")
+    print(f"{'method':<34} {'seconds':>8} {'M/s':>8}")
+    runs = [('dict lookup (old, same kind only)', dict_lookup), ('convert() per call', per_call),
+            ('convert_many()', batch), ('convert_many() cup->g with density', batch_cross_kind)]
+    if units.np is not None:
+        quantity_array, from_array, to_array = (units.np.array(values) for values in (quantities, from_units, to_units))
+        runs.append(('convert_many() on NumPy arrays', batch_arrays))
+    for label, fn in runs:
+        seconds, _ = timed(fn, args.repeat)
+        print(f"{label:<34} {seconds:>8.3f} {args.quantities / seconds / 1e6:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
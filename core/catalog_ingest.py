@@ -0,0 +1,173 @@
+# core/catalog_ingest.py
+"""
+Streaming ingest of an ingredient catalog (JSON Lines or CSV, from a file or URL).
+
+Rows are read lazily and written in batches: each batch is deduplicated by
+normalized name, checked against the catalog with one indexed query,
+and written with one bulk_create (new names) and one bulk_update (predefined
+ingredients whose unit changed). Memory use is bounded by the batch size, not
+the catalog size. User-created ingredients are never modified, and neither is
+the unit of an ingredient that recipes, inventory or grocery lists already
+hold quantities of: those quantities are in the old unit (counted as `in_use`).
+"""
+import csv
+import io
+import json
+import time
+
+import requests
+from django.db import transaction
+
+from . import ingredient_index
+from .models import Ingredient, normalize_ingredient_name
+from .units import CONVERSION_MAP, guess_unit, normalize_unit
+
+DEFAULT_BATCH_SIZE = 1000
+FORMATS = ('jsonl', 'csv')
+
+
+class IngestError(Exception):
+    pass
+
+
+def _open_lines(source):
+    # Yield text lines from a path or an http(s) URL without reading it all.
+    if source.startswith(('http://', 'https://')):
+        try:
+            with requests.get(source, stream=True, timeout=(3.05, 30)) as response:
+                response.raise_for_status()
+                for line in response.iter_lines(decode_unicode=True):
+                    yield line if isinstance(line, str) else line.decode('utf-8')
+        except requests.RequestException as e:
+            raise IngestError(f"Could not download {source}: {e}")
+        return
+    try:
+        with io.open(source, encoding='utf-8', newline='') as fp:
+            yield from fp
+    except OSError as e:
+        raise IngestError(f"Could not read {source}: {e}")
+
+
+def _jsonl_rows(lines):
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise IngestError(f"Line {number} is not valid JSON: {e}")
+        if isinstance(item, str):
+            yield item, None
+        elif isinstance(item, dict):
+            name, unit = item.get('name'), item.get('measurement_unit') or item.get('unit')
+            yield (name if isinstance(name, str) else ''), (unit if isinstance(unit, str) else None)
+        else:
+            yield '', None  # counted as invalid
+
+
+def _csv_rows(lines):
+    reader = csv.DictReader(lines)
+    if not reader.fieldnames or 'name' not in reader.fieldnames:
+        raise IngestError("The CSV needs a 'name' column (and optionally 'measurement_unit' or 'unit').")
+    for row in reader:
+        yield row.get('name') or '', row.get('measurement_unit') or row.get('unit')
+
+
+def iter_rows(source, fmt=None):
+    """Yield (name, unit or None) from a JSON Lines or CSV source; fmt defaults to the file extension."""
+    if fmt is None:
+        fmt = 'csv' if source.lower().split('?')[0].endswith('.csv') else 'jsonl'
+    if fmt not in FORMATS:
+        raise IngestError(f"Unknown format {fmt!r}; expected one of {', '.join(FORMATS)}.")
+    lines = _open_lines(source)
+    return _csv_rows(lines) if fmt == 'csv' else _jsonl_rows(lines)
+
+
+def _canonical_unit(name, unit):
+    if unit:
+        return CONVERSION_MAP[normalize_unit(unit)][0]
+    return guess_unit(name)
+
+
+def _in_use(ingredient_ids):
+    # The ids among `ingredient_ids` that some row (recipe line, stock, ledger, grocery item...) points at.
+    used = set()
+    for rel in Ingredient._meta.related_objects:
+        if rel.one_to_many:
+            used.update(rel.related_model._base_manager
+                        .filter(**{f'{rel.field.name}_id__in': ingredient_ids})
+                        .values_list(f'{rel.field.name}_id', flat=True).distinct())
+    return used
+
+
+@transaction.atomic
+def _write_batch(batch, predefined, stats):
+    # batch: {normalized name: (name, unit or None)}, already deduplicated.
+    existing = Ingredient.objects.in_bulk(list(batch), field_name='normalized_name')
+    created, changed = [], []
+    for key, (name, unit) in batch.items():
+        ingredient = existing.get(key)
+        if ingredient is None:
+            created.append(Ingredient(name=name, measurement_unit=_canonical_unit(name, unit),
+                                      is_predefined=predefined))
+        elif unit and ingredient.is_predefined and ingredient.measurement_unit != _canonical_unit(name, unit):
+            ingredient.measurement_unit = _canonical_unit(name, unit)
+            changed.append(ingredient)
+        else:
+            stats['unchanged'] += 1
+    if changed:
+        # Quantities already stored for an ingredient are in its current unit; leave those units alone.
+        used = _in_use([ingredient.id for ingredient in changed])
+        stats['in_use'] += len(used)
+        changed = [ingredient for ingredient in changed if ingredient.id not in used]
+        Ingredient.objects.bulk_update(changed, ['measurement_unit'])
+    if created:
+        # A concurrent writer may have added some of these names meanwhile; keep its rows,
+        # and count as created only the rows this batch inserted.
+        Ingredient.objects.bulk_create(created, ignore_conflicts=True)
+        wanted = {i.normalized_name: (i.name, i.measurement_unit, i.is_predefined) for i in created}
+        rows = Ingredient.objects.filter(normalized_name__in=list(wanted)).values_list(
+            'normalized_name', 'name', 'measurement_unit', 'is_predefined')
+        inserted = sum(1 for key, *fields in rows if tuple(fields) == wanted[key])
+        stats['created'] += inserted
+        stats['unchanged'] += len(created) - inserted
+    stats['updated'] += len(changed)
+
+
+def ingest(rows, batch_size=DEFAULT_BATCH_SIZE, predefined=True, progress=None):
+    """
+    Upsert (name, unit) rows into the catalog in batches of `batch_size`.
+    Calls progress(stats) after every batch. Returns
+    {'rows', 'created', 'updated', 'unchanged', 'in_use', 'duplicates', 'invalid', 'seconds'}.
+    """
+    stats = dict.fromkeys(['rows', 'created', 'updated', 'unchanged', 'in_use', 'duplicates', 'invalid'], 0)
+    started = time.monotonic()
+    batch = {}
+
+    def flush():
+        _write_batch(batch, predefined, stats)
+        batch.clear()
+        stats['seconds'] = time.monotonic() - started
+        if progress:
+            progress(stats)
+
+    for name, unit in rows:
+        stats['rows'] += 1
+        name = ' '.join((name or '').split())[:255]
+        if not name:
+            stats['invalid'] += 1
+            continue
+        key = normalize_ingredient_name(name)
+        if key in batch:
+            stats['duplicates'] += 1
+            continue
+        batch[key] = (name, unit)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    stats['seconds'] = time.monotonic() - started
+    # bulk writes skip the Ingredient signals; let this process rebuild its lookup index.
+    ingredient_index.reset()
+    return stats
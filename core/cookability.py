@@ -0,0 +1,180 @@
+# core/cookability.py
+from django.db import transaction
+from django.db.models import Count, F, FloatField, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Recipe, RecipeIngredient, InventoryItem, RecipeCookability
+
+
+def _with_available_stock(recipe_ingredients, user):
+    # Annotate each RecipeIngredient row with the user's stock of that ingredient (0 if none).
+    stock = InventoryItem.objects.filter(
+        user=user, ingredient=OuterRef('ingredient')
+    ).values('current_stock')[:1]
+    return recipe_ingredients.annotate(
+        available=Coalesce(Subquery(stock, output_field=FloatField()), Value(0.0))
+    )
+
+
+def short_recipe_ingredients(user, recipes=None):
+    """
+    Return a queryset of RecipeIngredient rows the user does not have enough stock for.
+    Optionally restricted to a queryset (or list of ids) of recipes.
+    """
+    rows = RecipeIngredient.objects.all()
+    if recipes is not None:
+        rows = rows.filter(recipe__in=recipes)
+    return _with_available_stock(rows, user).filter(available__lt=F('quantity'))
+
+
+def sufficient_recipe_ids(user, recipes=None):
+    """
+    Return the set of recipe ids the user can cook with their current inventory.
+    Runs a single query: recipes minus those having at least one short ingredient.
+    """
+    if recipes is None:
+        recipes = Recipe.objects.all()
+    short = short_recipe_ingredients(user).values('recipe_id')
+    return set(recipes.exclude(id__in=short).values_list('id', flat=True))
+
+
+def missing_ingredients(user, recipe):
+    """
+    Return {Ingredient: missing quantity} for a single recipe, in one query.
+    An empty dict means the recipe can be cooked.
+    """
+    rows = short_recipe_ingredients(user, [recipe]).select_related('ingredient')
+    return {ri.ingredient: ri.quantity - ri.available for ri in rows}
+
+
+# ---------------------------------------------------------------------
+# Materialized cookability index (RecipeCookability).
+# Rows exist per (user, recipe) once a user has been indexed; reads are a plain
+# indexed lookup and writes only touch the recipes affected by a change.
+
+def compute_missing_counts(user, recipes=None):
+    """
+    Recompute {recipe_id: missing ingredient count} from scratch for the given recipes.
+    Two queries: the short-ingredient aggregate and the recipe id list.
+    """
+    if recipes is None:
+        recipes = Recipe.objects.all()
+    short = dict(
+        short_recipe_ingredients(user, recipes)
+        .values('recipe_id')
+        .annotate(n=Count('id'))
+        .values_list('recipe_id', 'n')
+    )
+    return {recipe_id: short.get(recipe_id, 0) for recipe_id in recipes.values_list('id', flat=True)}
+
+
+def is_indexed(user_id):
+    return RecipeCookability.objects.filter(user_id=user_id).exists()
+
+
+@transaction.atomic
+def rebuild_index(user):
+    """Drop and recompute every index row for a user."""
+    RecipeCookability.objects.filter(user=user).delete()
+    counts = compute_missing_counts(user)
+    RecipeCookability.objects.bulk_create(
+        [RecipeCookability(user=user, recipe_id=rid, missing_count=n) for rid, n in counts.items()],
+        batch_size=500,
+    )
+    return counts
+
+
+@transaction.atomic
+def refresh_index(user_id, recipes):
+    """Recompute the index rows of an already indexed user for a subset of recipes."""
+    if not is_indexed(user_id):
+        return
+    recipes = Recipe.objects.filter(id__in=recipes)
+    counts = compute_missing_counts(user_id, recipes)
+    RecipeCookability.objects.filter(user_id=user_id, recipe_id__in=list(counts)).delete()
+    RecipeCookability.objects.bulk_create(
+        [RecipeCookability(user_id=user_id, recipe_id=rid, missing_count=n) for rid, n in counts.items()],
+        batch_size=500,
+    )
+
+
+def refresh_for_ingredients(user_id, ingredient_ids):
+    """Called when a user's stock of some ingredients changed."""
+    recipe_ids = RecipeIngredient.objects.filter(ingredient_id__in=ingredient_ids).values('recipe_id')
+    refresh_index(user_id, recipe_ids)
+
+
+@transaction.atomic
+def refresh_for_recipe(recipe_id):
+    """
+    Called when a recipe or its ingredient rows changed: bring the recipe's row
+    up to date for every indexed user. An existing recipe is refreshed with one
+    UPDATE that computes the counts in SQL and writes only the rows whose count
+    changed; a new recipe gets its rows inserted.
+    """
+    if not Recipe.objects.filter(id=recipe_id).exists():
+        return
+    needed = dict(RecipeIngredient.objects.filter(recipe_id=recipe_id).values_list('ingredient_id', 'quantity'))
+    # The user's stock rows that cover one of the recipe's ingredients.
+    enough = Q()
+    for ingredient_id, quantity in needed.items():
+        enough |= Q(ingredient_id=ingredient_id, current_stock__gte=quantity)
+    covered = InventoryItem.objects.filter(enough) if needed else InventoryItem.objects.none()
+    rows = RecipeCookability.objects.filter(recipe_id=recipe_id)
+    if rows.exists():
+        missing = Value(len(needed))
+        if needed:
+            satisfied = (covered.filter(user_id=OuterRef('user_id'))
+                         .values('user_id').annotate(n=Count('id')).values('n'))
+            missing = missing - Coalesce(Subquery(satisfied, output_field=IntegerField()), Value(0))
+        rows.exclude(missing_count=missing).update(missing_count=missing)
+        return
+    user_ids = set(RecipeCookability.objects.values_list('user_id', flat=True).distinct())
+    if not user_ids:
+        return
+    satisfied = dict(covered.filter(user_id__in=RecipeCookability.objects.values('user_id'))
+                     .values('user_id').annotate(n=Count('id')).values_list('user_id', 'n'))
+    RecipeCookability.objects.bulk_create(
+        [RecipeCookability(user_id=user_id, recipe_id=recipe_id, missing_count=len(needed) - satisfied.get(user_id, 0))
+         for user_id in user_ids],
+        batch_size=500,
+    )
+
+
+def refresh_for_recipes(recipe_ids):
+    """Bulk variant of refresh_for_recipe (e.g. after an import): one recomputation per indexed user."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    for user_id in RecipeCookability.objects.values_list('user_id', flat=True).distinct():
+        refresh_index(user_id, recipe_ids)
+
+
+def indexed_missing_counts(user, recipes):
+    """
+    Read {recipe_id: missing count} for the given recipes from the index,
+    building the user's index on first use.
+    """
+    counts = dict(
+        RecipeCookability.objects.filter(user=user, recipe__in=recipes).values_list('recipe_id', 'missing_count')
+    )
+    if not counts and not is_indexed(user.id):
+        rebuild_index(user)
+        counts = dict(
+            RecipeCookability.objects.filter(user=user, recipe__in=recipes).values_list('recipe_id', 'missing_count')
+        )
+    return counts
+
+
+def check_index(user):
+    """
+    Compare the stored index against a full recomputation.
+    Returns a list of (recipe_id, stored, expected) tuples that disagree; empty means consistent.
+    """
+    stored = dict(RecipeCookability.objects.filter(user=user).values_list('recipe_id', 'missing_count'))
+    expected = compute_missing_counts(user)
+    return [
+        (recipe_id, stored.get(recipe_id), expected.get(recipe_id))
+        for recipe_id in sorted(set(stored) | set(expected))
+        if stored.get(recipe_id) != expected.get(recipe_id)
+    ]
@@ -0,0 +1,170 @@
+# core/flush.py
+"""
+Fast flush of every table except the preserved ones (used by flush_except_users).
+
+Instead of Model.objects.all().delete(), which loads every row into Django's
+cascade collector, the tables are emptied with raw SQL in foreign-key order:
+a table is emptied only after every table whose rows point at it. Tables with
+a CASCADE foreign key to an emptied table are emptied too, just as the ORM
+cascade would have done, and SET_NULL foreign keys on kept tables are cleared
+first. Rows are deleted in primary-key ranges of `batch_size`, so each
+statement (and, outside a transaction, each commit) stays small; `truncate`
+uses the backend's own flush SQL instead (TRUNCATE on PostgreSQL/MySQL,
+DELETE on SQLite) in one transaction.
+"""
+import operator
+import time
+from collections import namedtuple
+from functools import reduce
+
+from django.apps import apps
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, models, router, transaction
+
+DEFAULT_BATCH_SIZE = 10000
+
+# models: tables to empty, children first; nullify: [(model, [field, ...])] on kept tables;
+# cascaded: models emptied only because they point at an emptied table.
+FlushPlan = namedtuple('FlushPlan', ['models', 'nullify', 'cascaded'])
+
+
+class FlushError(Exception):
+    pass
+
+
+def _concrete_models(using):
+    return [model for model in apps.get_models(include_auto_created=True)
+            if model._meta.managed and not model._meta.proxy
+            and router.allow_migrate_model(using, model)]
+
+
+def _foreign_keys(model):
+    return [field for field in model._meta.concrete_fields
+            if field.is_relation and field.many_to_one and field.remote_field.model is not None]
+
+
+def plan_flush(preserve, using=DEFAULT_DB_ALIAS):
+    """Work out which tables to empty, in which order, and which columns to clear first."""
+    candidates = _concrete_models(using)
+    preserve = {model._meta.concrete_model for model in preserve}
+    # Many-to-many tables go only if one of their ends goes (auth_user_groups stays with User and Group).
+    flushed = [model for model in candidates if model not in preserve and not model._meta.auto_created]
+    cascaded = []
+    # Follow the on_delete rules the ORM cascade would have applied to the kept tables.
+    changed = True
+    while changed:
+        changed = False
+        for model in candidates:
+            if model in flushed:
+                continue
+            for field in _foreign_keys(model):
+                if field.related_model not in flushed:
+                    continue
+                on_delete = field.remote_field.on_delete
+                if on_delete in (models.PROTECT, models.RESTRICT):
+                    raise FlushError(f"{model._meta.label}.{field.name} protects {field.related_model._meta.label}.")
+                if on_delete is models.CASCADE:
+                    flushed.append(model)
+                    cascaded.append(model)
+                    changed = True
+                    break
+    nullify = []
+    for model in candidates:
+        if model in flushed:
+            continue
+        fields = [field for field in _foreign_keys(model)
+                  if field.related_model in flushed and field.remote_field.on_delete is models.SET_NULL]
+        if fields:
+            nullify.append((model, fields))
+    return FlushPlan(_children_first(flushed), nullify, cascaded)
+
+
+def _children_first(flushed):
+    # Kahn's algorithm on "child points at parent": a table comes before every table it references.
+    referrers = {model: set() for model in flushed}
+    for model in flushed:
+        for field in _foreign_keys(model):
+            if field.related_model in referrers and field.related_model is not model:
+                referrers[field.related_model].add(model)
+    ordered = []
+    pending = sorted(flushed, key=lambda model: model._meta.db_table)
+    while pending:
+        ready = [model for model in pending if not referrers[model] - set(ordered)]
+        if not ready:
+            # A reference cycle: break it at the first table in name order and rely on the
+            # database deferring the check (Django creates its foreign keys DEFERRABLE).
+            ready = pending[:1]
+        ordered.extend(ready)
+        pending = [model for model in pending if model not in ready]
+    return ordered
+
+
+def count_rows(model, using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(model._meta.db_table)}")
+        return cursor.fetchone()[0]
+
+
+def _delete_in_batches(model, batch_size, connection, progress):
+    table = connection.ops.quote_name(model._meta.db_table)
+    pk = connection.ops.quote_name(model._meta.pk.column)
+    deleted = 0
+    with connection.cursor() as cursor:
+        while True:
+            # The pk of the batch_size-th row bounds the next range; none left means a final sweep.
+            cursor.execute(f"SELECT {pk} FROM {table} ORDER BY {pk} LIMIT 1 OFFSET %s", [batch_size - 1])
+            row = cursor.fetchone()
+            with transaction.atomic(using=connection.alias):
+                if row is None:
+                    cursor.execute(f"DELETE FROM {table}")
+                else:
+                    cursor.execute(f"DELETE FROM {table} WHERE {pk} <= %s", [row[0]])
+            deleted += max(cursor.rowcount, 0)
+            if progress:
+                progress(model, deleted)
+            if row is None:
+                return deleted
+
+
+def clear_references(plan, using=DEFAULT_DB_ALIAS):
+    """Set the plan's SET_NULL foreign keys on kept tables to NULL; returns [(model, rows, seconds)]."""
+    report = []
+    for model, fields in plan.nullify:
+        started = time.monotonic()
+        pointing = reduce(operator.or_, [models.Q(**{f'{field.name}__isnull': False}) for field in fields])
+        with transaction.atomic(using=using):
+            updated = model._base_manager.using(using).filter(pointing).update(
+                **{field.name: None for field in fields})
+        report.append((model, updated, time.monotonic() - started))
+    return report
+
+
+def truncate_tables(plan, using=DEFAULT_DB_ALIAS):
+    """
+    Empty the plan's tables with the backend's flush SQL in one transaction.
+    PostgreSQL truncates them in one statement, so only the total time is known:
+    returns ([(model, rows)], seconds).
+    """
+    connection = connections[using]
+    statements = connection.ops.sql_flush(no_style(), [model._meta.db_table for model in plan.models])
+    started = time.monotonic()
+    with transaction.atomic(using=using):
+        counts = [(model, count_rows(model, using)) for model in plan.models]
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+    return counts, time.monotonic() - started
+
+
+def delete_tables(plan, batch_size=DEFAULT_BATCH_SIZE, using=DEFAULT_DB_ALIAS, progress=None):
+    """
+    Empty the plan's tables children first, `batch_size` rows per DELETE, yielding
+    (model, rows deleted, seconds) as each table is done. Calls
+    progress(model, rows deleted so far) after every batch.
+    """
+    connection = connections[using]
+    for model in plan.models:
+        started = time.monotonic()
+        deleted = _delete_in_batches(model, batch_size, connection, progress)
+        yield model, deleted, time.monotonic() - started
@@ -1,41 +1,103 @@
 from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.forms.models import BaseInlineFormSet
-from .models import Recipe, InventoryItem, MealPlan, RecipeIngredient, Ingredient
-
-# Extended measurement unit choices.
-# For mass, canonical unit is grams (g); for volume, canonical is milliliters (ml).
-UNIT_CHOICES = [
-    ("kg", "Kilograms (kg) [1000 g]"),
-    ("g", "Grams (g) [1 g]"),
-    ("oz", "Ounces (oz) [28.35 g]"),
-    ("lb", "Pounds (lb) [453.59 g]"),
-    ("L", "Liters (L) [1000 ml]"),
-    ("ml", "Milliliters (ml) [1 ml]"),
-    ("cup", "Cups (cup) [240 ml]"),
-    ("tbsp", "Tablespoons (tbsp) [15 ml]"),
-    ("tsp", "Teaspoons (tsp) [5 ml]"),
-    ("pint", "Pints (pint) [473 ml]"),
-    ("gallon", "Gallons (gallon) [3785 ml]"),
-    ("pieces", "Pieces"),
-    ("fillets", "Fillets"),
-]
-
-# Conversion map: maps a unit to a tuple (canonical_unit, conversion_factor).
-CONVERSION_MAP = {
-    "kg": ("g", 1000),
-    "g": ("g", 1),
-    "oz": ("g", 28.3495),
-    "lb": ("g", 453.592),
-    "L": ("ml", 1000),
-    "ml": ("ml", 1),
-    "cup": ("ml", 240),
-    "tbsp": ("ml", 15),
-    "tsp": ("ml", 5),
-    "pint": ("ml", 473.176),
-    "gallon": ("ml", 3785.41),
-    "pieces": ("pieces", 1),
-    "fillets": ("fillets", 1),
-}
+from django.urls import reverse
+from django.utils.html import format_html
+from . import cookability, grocery, search
+from .ingredient_index import get_index
+from .meal_plans import ALL_OR_NOTHING, SCHEDULE_MODES
+from .ingredients import resolve_ingredients
+from .models import Recipe, InventoryItem, MealPlan, RecipeIngredient, Ingredient, normalize_ingredient_name
+from .units import CONVERSION_MAP, UNIT_CHOICES, convert, density_of, to_canonical
+
+# Catalog size above which ingredient pickers render an autocomplete box instead of a <select>.
+# Override with INGREDIENT_AUTOCOMPLETE_THRESHOLD in settings (0 = always autocomplete).
+DEFAULT_AUTOCOMPLETE_THRESHOLD = 500
+
+# (catalog version, choices) - shared by every form in the process.
+_ingredient_choices = (None, [])
+
+def ingredient_choices():
+    """
+    Return [(id, "name (unit)"), ...] sorted by name, read from the in-memory ingredient index.
+    The list is rebuilt only when the catalog changes, so formsets with many rows
+    no longer run one query per row.
+    """
+    global _ingredient_choices
+    index = get_index()
+    version = (id(index), index.version)
+    cached_version, choices = _ingredient_choices
+    if cached_version != version:
+        entries = []
+        for ingredient_id in index.search(''):
+            name, unit = index.get(ingredient_id)
+            entries.append((ingredient_id, f"{name} ({unit})"))
+        choices = entries
+        _ingredient_choices = (version, choices)
+    return choices
+
+class IngredientAutocompleteWidget(forms.HiddenInput):
+    """
+    Text box backed by the ingredient_autocomplete endpoint, posting the chosen id
+    through a hidden input. Only the selected ingredient is rendered; the field's
+    queryset still validates the submitted id with a single-row lookup.
+    """
+    is_hidden = False
+
+    class Media:
+        js = ('js/ingredient_autocomplete.js',)
+
+    def render(self, name, value, attrs=None, renderer=None):
+        hidden = super().render(name, value, attrs, renderer)
+        label = ''
+        try:
+            entry = get_index().get(int(value)) if value else None
+        except (TypeError, ValueError):
+            entry = None
+        if entry:
+            label = f"{entry[0]} ({entry[1]})"
+        options_id = f"{(attrs or {}).get('id', name)}_options"
+        return format_html(
+            '<input type="text" name="{}_label" value="{}" class="form-control" list="{}" '
+            'autocomplete="off" placeholder="Start typing an ingredient..." data-ingredient-autocomplete="{}">'
+            '<datalist id="{}"></datalist>{}',
+            name, label, options_id, reverse('ingredient_autocomplete'), options_id, hidden,
+        )
+
+def configure_ingredient_field(field):
+    """Use the cached choice list, or the autocomplete widget for large catalogs."""
+    threshold = getattr(settings, 'INGREDIENT_AUTOCOMPLETE_THRESHOLD', DEFAULT_AUTOCOMPLETE_THRESHOLD)
+    if len(get_index()) > threshold:
+        field.widget = IngredientAutocompleteWidget()
+    else:
+        field.choices = [('', field.empty_label)] + ingredient_choices()
+
+def quantity_in_ingredient_unit(quantity, unit, ingredient):
+    """
+    Express `quantity` (in `unit`) in the ingredient's own measurement unit, through
+    its density between mass and volume. None if the two units cannot be converted.
+    """
+    return convert(quantity, unit, ingredient.measurement_unit, density_of(ingredient))
+
+def stored_quantity(quantity, unit, ingredient):
+    # For a typed-in name that matched an ingredient kept in a unit of another kind
+    # (and without a density), fall back to the chosen unit's canonical quantity.
+    converted = quantity_in_ingredient_unit(quantity, unit, ingredient)
+    return converted if converted is not None else to_canonical(quantity, unit)[1]
+
+class IngredientChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField that can validate against ingredients prefetched by its formset."""
+    prefetched = None
+
+    def to_python(self, value):
+        if self.prefetched is not None and value not in self.empty_values:
+            try:
+                return self.prefetched[int(value)]
+            except (KeyError, TypeError, ValueError):
+                raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+        return super().to_python(value)
 
 class RecipeForm(forms.ModelForm):
     class Meta:
@@ -60,56 +122,150 @@ class RecipeIngredientForm(forms.ModelForm):
     class Meta:
         model = RecipeIngredient
         fields = ['ingredient', 'quantity', 'new_ingredient', 'measurement_unit']
+        field_classes = {'ingredient': IngredientChoiceField}
 
     def __init__(self, *args, **kwargs):
         super(RecipeIngredientForm, self).__init__(*args, **kwargs)
         self.fields['ingredient'].required = False
-        self.fields['ingredient'].queryset = Ingredient.objects.all()
-        # Override label to show the ingredient's canonical unit.
-        self.fields['ingredient'].label_from_instance = lambda obj: f"{obj.name} ({obj.measurement_unit})"
+        # Choice labels show the ingredient's canonical unit.
+        configure_ingredient_field(self.fields['ingredient'])
         # (Optional) You could set an initial value for measurement_unit here if desired.
         self.fields['measurement_unit'].initial = ''
 
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        if self.fields['ingredient'].prefetched is not None:
+            # The formset already resolved the ingredient ids in bulk and checks
+            # duplicates across all of the recipe's rows, so skip the per-row
+            # existence and unique_together queries.
+            exclude.append('ingredient')
+        return exclude
+
     def clean(self):
         cleaned_data = super().clean()
         ingredient = cleaned_data.get('ingredient')
         new_ing = cleaned_data.get('new_ingredient')
         if not ingredient and not new_ing:
             raise forms.ValidationError("Please select an ingredient or enter a new one.")
+        chosen_unit = cleaned_data.get('measurement_unit')
+        if ingredient and not new_ing and chosen_unit and cleaned_data.get('quantity') is not None:
+            if quantity_in_ingredient_unit(cleaned_data['quantity'], chosen_unit, ingredient) is None:
+                raise forms.ValidationError(
+                    f"{ingredient.name} is measured in {ingredient.measurement_unit}; "
+                    f"{chosen_unit} cannot be converted to it.")
         return cleaned_data
 
-    def save(self, commit=True):
-        instance = super().save(commit=False)
+    def new_ingredient_unit(self):
+        # For new ingredients, default to "g" if no unit is chosen.
+        chosen_unit = self.cleaned_data.get('measurement_unit') or "g"
+        canonical_unit, factor = CONVERSION_MAP.get(chosen_unit, ("unit", 1))
+        return canonical_unit
+
+    def converted_quantity(self, ingredient=None):
+        """The quantity in the unit of `ingredient` (default: the selected one)."""
         qty = self.cleaned_data.get('quantity')
         chosen_unit = self.cleaned_data.get('measurement_unit')
+        if self.cleaned_data.get('new_ingredient'):
+            chosen_unit = chosen_unit or "g"
+        elif not chosen_unit:
+            return qty
+        ingredient = ingredient or self.cleaned_data.get('ingredient')
+        return stored_quantity(qty, chosen_unit, ingredient)
+
+    def save(self, commit=True, new_ingredients=None):
+        """
+        `new_ingredients` optionally maps stripped new-ingredient names to Ingredient rows
+        the formset has already resolved in bulk; otherwise they are fetched or created here.
+        """
+        instance = super().save(commit=False)
         new_ing = self.cleaned_data.get('new_ingredient')
         if new_ing:
-            # For new ingredients, default to "g" if no unit is chosen.
-            if not chosen_unit:
-                chosen_unit = "g"
-            canonical_unit, factor = CONVERSION_MAP.get(chosen_unit, ("unit", 1))
-            converted_qty = qty * factor
-            from .models import Ingredient
-            ingredient, created = Ingredient.objects.get_or_create(
-                name=new_ing.strip(),
-                defaults={'measurement_unit': canonical_unit}
-            )
-            instance.ingredient = ingredient
-            instance.quantity = converted_qty
-        else:
-            # For existing ingredients, use the chosen measurement unit if provided.
-            ingredient = self.cleaned_data.get('ingredient')
-            if chosen_unit:
-                canonical_unit, factor = CONVERSION_MAP.get(chosen_unit, (ingredient.measurement_unit, 1))
-                converted_qty = qty * factor
-                instance.quantity = converted_qty
+            name = new_ing.strip()
+            if new_ingredients is not None and name in new_ingredients:
+                ingredient = new_ingredients[name]
             else:
-                instance.quantity = qty
+                ingredient, created = Ingredient.objects.get_or_create(
+                    normalized_name=normalize_ingredient_name(name),
+                    defaults={'name': name, 'measurement_unit': self.new_ingredient_unit()}
+                )
+            instance.ingredient = ingredient
+        instance.quantity = self.converted_quantity(instance.ingredient)
         if commit:
             instance.save()
         return instance
 
 class BaseRecipeIngredientInlineFormSet(BaseInlineFormSet):
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        if self.is_bound:
+            form.fields['ingredient'].prefetched = self._posted_ingredients()
+        return form
+
+    def _posted_ingredients(self):
+        # Resolve every posted ingredient id with one query so each row's
+        # validation does not run its own lookup.
+        if not hasattr(self, '_posted_ingredient_cache'):
+            ids = set()
+            for i in range(self.total_form_count()):
+                value = self.data.get(f'{self.add_prefix(i)}-ingredient')
+                if value and str(value).isdigit():
+                    ids.add(int(value))
+            self._posted_ingredient_cache = Ingredient.objects.in_bulk(ids) if ids else {}
+        return self._posted_ingredient_cache
+
+    def resolve_new_ingredients(self, forms_to_save):
+        """
+        Map every new-ingredient name in the formset to an Ingredient (matching
+        case-insensitively), creating the missing ones with a single bulk insert.
+        """
+        units = {}
+        for form in forms_to_save:
+            new_ing = form.cleaned_data.get('new_ingredient')
+            if new_ing:
+                units.setdefault(new_ing.strip(), form.new_ingredient_unit())
+        if not units:
+            return {}
+        resolved, created = resolve_ingredients(units)
+        return {name: resolved[normalize_ingredient_name(name)] for name in units}
+
+    def save(self, commit=True):
+        """
+        Save all rows with a fixed number of queries: deletes, updates and inserts
+        are each issued in bulk inside one transaction.
+        """
+        if not commit:
+            return super().save(commit=False)
+        with transaction.atomic():
+            self.deleted_objects = [form.instance for form in self.deleted_forms if form.instance.pk]
+            if self.deleted_objects:
+                RecipeIngredient.objects.filter(pk__in=[obj.pk for obj in self.deleted_objects]).delete()
+
+            forms_to_save = [
+                form for form in self.forms
+                if form.has_changed() and not (self.can_delete and self._should_delete_form(form))
+            ]
+            new_ingredients = self.resolve_new_ingredients(forms_to_save)
+            self.new_objects, self.changed_objects = [], []
+            for form in forms_to_save:
+                obj = form.save(commit=False, new_ingredients=new_ingredients)
+                setattr(obj, self.fk.name, self.instance)
+                if obj.pk:
+                    self.changed_objects.append((obj, form.changed_data))
+                else:
+                    self.new_objects.append(obj)
+            if self.changed_objects:
+                RecipeIngredient.objects.bulk_update(
+                    [obj for obj, changed in self.changed_objects], ['ingredient', 'quantity']
+                )
+            if self.new_objects:
+                RecipeIngredient.objects.bulk_create(self.new_objects)
+            if self.new_objects or self.changed_objects:
+                # Bulk writes bypass the RecipeIngredient signals; refresh derived data once.
+                cookability.refresh_for_recipe(self.instance.pk)
+                search.index_recipes([self.instance.pk])
+                grocery.refresh_demand_for_recipe(self.instance.pk)
+        return self.new_objects + [obj for obj, changed in self.changed_objects]
+
     def clean(self):
         super().clean()
         ingredients = []
@@ -119,10 +275,11 @@ class BaseRecipeIngredientInlineFormSet(BaseInlineFormSet):
             ingredient = form.cleaned_data.get('ingredient')
             new_ingredient = form.cleaned_data.get('new_ingredient')
             ing_identifier = None
+            # Compare normalized names so "salt" typed in is a duplicate of a selected "Salt".
             if ingredient:
-                ing_identifier = ingredient.id
+                ing_identifier = ingredient.normalized_name
             elif new_ingredient:
-                ing_identifier = new_ingredient.strip().lower()
+                ing_identifier = normalize_ingredient_name(new_ingredient)
             if ing_identifier:
                 if ing_identifier in ingredients:
                     raise forms.ValidationError("Duplicate ingredients are not allowed in a recipe.")
@@ -153,8 +310,7 @@ class InventoryItemForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super(InventoryItemForm, self).__init__(*args, **kwargs)
         self.fields['ingredient'].required = False
-        self.fields['ingredient'].queryset = Ingredient.objects.all()
-        self.fields['ingredient'].label_from_instance = lambda obj: f"{obj.name} ({obj.measurement_unit})"
+        configure_ingredient_field(self.fields['ingredient'])
         
         # If updating an existing inventory item, set the default measurement unit
         if self.instance and self.instance.pk and self.instance.ingredient:
@@ -171,6 +327,12 @@ class InventoryItemForm(forms.ModelForm):
         new_ing = cleaned_data.get('new_ingredient')
         if not ingredient and not new_ing:
             raise forms.ValidationError("Please select an ingredient or enter a new one.")
+        chosen_unit = cleaned_data.get('measurement_unit')
+        if ingredient and not new_ing and chosen_unit and cleaned_data.get('current_stock') is not None:
+            if quantity_in_ingredient_unit(cleaned_data['current_stock'], chosen_unit, ingredient) is None:
+                raise forms.ValidationError(
+                    f"{ingredient.name} is measured in {ingredient.measurement_unit}; "
+                    f"{chosen_unit} cannot be converted to it.")
         return cleaned_data
 
     def save(self, commit=True):
@@ -183,21 +345,19 @@ class InventoryItemForm(forms.ModelForm):
             if not chosen_unit:
                 chosen_unit = "g"
             canonical_unit, factor = CONVERSION_MAP.get(chosen_unit, ("unit", 1))
-            converted_stock = stock * factor
             from .models import Ingredient
             ingredient, created = Ingredient.objects.get_or_create(
-                name=new_ing.strip(),
-                defaults={'measurement_unit': canonical_unit}
+                normalized_name=normalize_ingredient_name(new_ing),
+                defaults={'name': new_ing.strip(), 'measurement_unit': canonical_unit}
             )
             instance.ingredient = ingredient
-            instance.current_stock = converted_stock
+            instance.current_stock = stored_quantity(stock, chosen_unit, ingredient)
         else:
-            # For an existing ingredient, if the user selected a measurement unit (e.g., "kg"), convert the stock.
+            # For an existing ingredient, if the user selected a measurement unit (e.g., "cup"),
+            # convert the stock to the ingredient's unit (through its density if needed).
             ingredient = self.cleaned_data.get('ingredient')
             if chosen_unit:
-                canonical_unit, factor = CONVERSION_MAP.get(chosen_unit, (ingredient.measurement_unit, 1))
-                converted_stock = stock * factor
-                instance.current_stock = converted_stock
+                instance.current_stock = quantity_in_ingredient_unit(stock, chosen_unit, ingredient)
             else:
                 instance.current_stock = stock
         if commit:
@@ -230,14 +390,14 @@ class AddNewIngredientForm(forms.ModelForm):
         name = self.cleaned_data['name'].strip()
         chosen_unit = self.cleaned_data['measurement_unit']
         stock = self.cleaned_data['current_stock']
-        # Convert the entered stock to canonical units.
+        # Convert the entered stock to the ingredient's unit (canonical for a new one).
         canonical_unit, factor = CONVERSION_MAP.get(chosen_unit, ("g", 1))
-        converted_stock = stock * factor
         from .models import Ingredient, InventoryItem
         ingredient, created = Ingredient.objects.get_or_create(
-            name=name,
-            defaults={'measurement_unit': canonical_unit}
+            normalized_name=normalize_ingredient_name(name),
+            defaults={'name': name, 'measurement_unit': canonical_unit}
         )
+        converted_stock = stored_quantity(stock, chosen_unit, ingredient)
         # Create a new InventoryItem instance.
         instance = InventoryItem(ingredient=ingredient, current_stock=converted_stock)
         if commit:
@@ -252,6 +412,55 @@ class MealPlanForm(forms.ModelForm):
             'date': forms.DateInput(attrs={'type': 'date'}),
         }
 
+class MealPlanEntryForm(forms.Form):
+    # One (recipe, date) row of the bulk scheduler; blank rows are ignored.
+    recipe = forms.TypedChoiceField(coerce=int, required=False, empty_value=None)
+    date = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def __init__(self, *args, recipe_choices=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        # Choices are loaded once by the view and shared by every row.
+        self.fields['recipe'].choices = [('', '---------')] + list(recipe_choices)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('recipe') and not cleaned_data.get('date'):
+            raise forms.ValidationError("Please pick a date for this meal.")
+        return cleaned_data
+
+class BaseMealPlanEntryFormSet(forms.BaseFormSet):
+    def entries(self):
+        """Return [(recipe_id, date)] for every filled-in row."""
+        return [(form.cleaned_data['recipe'], form.cleaned_data['date'])
+                for form in self.forms if form.cleaned_data.get('recipe')]
+
+MealPlanEntryFormSet = forms.formset_factory(
+    MealPlanEntryForm, formset=BaseMealPlanEntryFormSet, extra=7, max_num=60, validate_max=True
+)
+
+class BulkMealPlanForm(forms.Form):
+    mode = forms.ChoiceField(choices=SCHEDULE_MODES, initial=ALL_OR_NOTHING, widget=forms.RadioSelect,
+                             label="If there is not enough stock for every meal")
+
+class GroceryCheckoutForm(forms.Form):
+    """One "purchased" field per item of a grocery list, each at least the listed quantity."""
+
+    def __init__(self, *args, items=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.items = list(items)
+        for item in self.items:
+            self.fields[f'item_{item.id}'] = forms.FloatField(
+                label=f"{item.ingredient.name} ({item.ingredient.measurement_unit})",
+                min_value=item.total_quantity, initial=item.total_quantity,
+            )
+
+    def purchased(self):
+        """Return {item_id: quantity bought} from the cleaned data."""
+        return {item.id: self.cleaned_data[f'item_{item.id}'] for item in self.items}
+
+class RecipeImportForm(forms.Form):
+    dump = forms.FileField(label="Recipe dump (JSON or JSON Lines)")
+
 class UpdateStockForm(forms.ModelForm):
     current_stock = forms.FloatField(label="Current Stock", required=True, min_value=0)
 
@@ -0,0 +1,188 @@
+# core/grocery.py
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import inventory
+from .models import DailyDemand, GroceryList, GroceryListItem, InventoryItem, MealPlan, RecipeIngredient
+
+# Days of meal plans covered by "shop for this week", starting today.
+DEFAULT_WINDOW_DAYS = 7
+
+
+def _demand_rows(**plan_filters):
+    # (user_id, date, ingredient_id, SUM of quantities) over the meal plans matching plan_filters.
+    filters = {f'recipe__mealplan__{key}': value for key, value in plan_filters.items()}
+    filters.setdefault('recipe__mealplan__isnull', False)
+    return (RecipeIngredient.objects.filter(**filters)
+            .values('recipe__mealplan__user_id', 'recipe__mealplan__date', 'ingredient_id')
+            .annotate(total=Sum('quantity'))
+            .values_list('recipe__mealplan__user_id', 'recipe__mealplan__date', 'ingredient_id', 'total'))
+
+
+def _write_demand(rows):
+    DailyDemand.objects.bulk_create(
+        [DailyDemand(user_id=user_id, date=day, ingredient_id=ingredient_id, quantity=total)
+         for user_id, day, ingredient_id, total in rows],
+        batch_size=500,
+    )
+
+
+@transaction.atomic
+def refresh_demand(user_id, dates):
+    """Recompute the DailyDemand rows of one user for the given days from their meal plans."""
+    dates = list(set(dates))
+    if not dates:
+        return
+    DailyDemand.objects.filter(user_id=user_id, date__in=dates).delete()
+    _write_demand(_demand_rows(user_id=user_id, date__in=dates))
+
+
+def refresh_demand_for_recipe(recipe_id):
+    """Recompute every day on which the recipe is planned, for every user planning it."""
+    days = defaultdict(set)
+    for user_id, day in MealPlan.objects.filter(recipe_id=recipe_id).values_list('user_id', 'date').distinct():
+        days[user_id].add(day)
+    for user_id, dates in days.items():
+        refresh_demand(user_id, dates)
+
+
+@transaction.atomic
+def rebuild_demand(user=None):
+    """Rebuild DailyDemand from scratch (for one user or everyone); returns the row count."""
+    scope = {} if user is None else {'user_id': user.id}
+    DailyDemand.objects.filter(**scope).delete()
+    rows = list(_demand_rows(**scope))
+    _write_demand(rows)
+    return len(rows)
+
+
+def check_demand(user):
+    """Return the (date, ingredient_id) pairs whose stored demand disagrees with the meal plans."""
+    stored = {(day, ingredient_id): qty for day, ingredient_id, qty in
+              DailyDemand.objects.filter(user=user).values_list('date', 'ingredient_id', 'quantity')}
+    expected = {(day, ingredient_id): total for _, day, ingredient_id, total in _demand_rows(user_id=user.id)}
+    return sorted(key for key in stored.keys() | expected.keys()
+                  if abs(stored.get(key, 0) - expected.get(key, 0)) > 1e-9)
+
+
+def default_window(days=DEFAULT_WINDOW_DAYS):
+    """(start, end) covering `days` days from today (in TIME_ZONE), both inclusive."""
+    start = timezone.localdate()
+    return start, start + timedelta(days=days - 1)
+
+
+def grocery_deficits(user, start=None, end=None):
+    """
+    Return {ingredient_id: quantity to buy} for the user's meal plans dated
+    start..end (inclusive; either bound may be open). One range-sum query over
+    DailyDemand joined against the user's inventory.
+    """
+    demand = DailyDemand.objects.filter(user=user)
+    if start is not None:
+        demand = demand.filter(date__gte=start)
+    if end is not None:
+        demand = demand.filter(date__lte=end)
+    stock = InventoryItem.objects.filter(
+        user=user, ingredient=OuterRef('ingredient_id')
+    ).values('current_stock')[:1]
+    rows = (demand.values('ingredient_id')
+            .annotate(required=Sum('quantity'),
+                      available=Coalesce(Subquery(stock, output_field=FloatField()), Value(0.0)))
+            .values_list('ingredient_id', 'required', 'available'))
+    return {ingredient_id: required - available
+            for ingredient_id, required, available in rows if required > available}
+
+
+def open_grocery_list(user, create=True):
+    """Return the user's latest incomplete grocery list, creating one if asked."""
+    glist = GroceryList.objects.filter(user=user, is_complete=False).order_by('-created_at').first()
+    if glist is None and create:
+        glist = GroceryList.objects.create(user=user)
+    return glist
+
+
+def _replace(current, new):
+    return max(current, new)
+
+
+def _accumulate(current, new):
+    return current + new
+
+
+@transaction.atomic
+def merge_into_list(glist, quantities, accumulate=False):
+    """
+    Merge {ingredient_id: quantity} into a grocery list with one read, one bulk
+    update and one bulk insert. Ingredients already on the list keep a single row:
+    with accumulate=False its quantity becomes the larger of the two (re-running
+    generation is idempotent); with accumulate=True the quantities are added.
+    """
+    combine = _accumulate if accumulate else _replace
+    existing = {item.ingredient_id: item for item in glist.items.filter(ingredient_id__in=list(quantities))}
+    changed, created = [], []
+    for ingredient_id, qty in quantities.items():
+        item = existing.get(ingredient_id)
+        if item is None:
+            created.append(GroceryListItem(grocery_list=glist, ingredient_id=ingredient_id, total_quantity=qty))
+        else:
+            merged = combine(item.total_quantity, qty)
+            if merged != item.total_quantity:
+                item.total_quantity = merged
+                changed.append(item)
+    if changed:
+        GroceryListItem.objects.bulk_update(changed, ['total_quantity'])
+    if created:
+        GroceryListItem.objects.bulk_create(created)
+    return len(created), len(changed)
+
+
+@transaction.atomic
+def generate_grocery_list(user, start=None, end=None, merge=True):
+    """
+    Write the deficits of the meal plans dated start..end to a grocery list: merged
+    into the open list (default) or as a brand-new list. Returns the list, or None
+    if nothing is missing.
+    """
+    deficits = grocery_deficits(user, start, end)
+    if not deficits:
+        return None
+    glist = open_grocery_list(user) if merge else GroceryList.objects.create(user=user)
+    merge_into_list(glist, deficits)
+    return glist
+
+
+class ShortPurchase(ValueError):
+    """Raised by checkout() when an item was bought short of its listed quantity; nothing is changed."""
+
+    def __init__(self, items):
+        self.items = items
+        super().__init__(f"{len(items)} item(s) were purchased short of the listed quantity.")
+
+
+@transaction.atomic
+def checkout(user, glist, purchased):
+    """
+    Check out a whole grocery list: purchased is {item_id: quantity bought} and must
+    cover every item's total_quantity. All stock is added with one inventory update
+    and the list is closed (its items stay on it as a record of the trip), with a
+    query count independent of the list size. Returns False if the list was
+    already checked out.
+    """
+    # Closing the list first claims it, so a double-submitted checkout cannot add stock twice.
+    if not GroceryList.objects.filter(pk=glist.pk, user=user, is_complete=False).update(is_complete=True):
+        return False
+    items = list(glist.items.all())
+    short = [item for item in items if purchased.get(item.id, 0) < item.total_quantity]
+    if short:
+        raise ShortPurchase(short)
+    totals = defaultdict(float)
+    for item in items:
+        totals[item.ingredient_id] += purchased[item.id]
+    inventory.add_stock(user, totals, 'purchase')
+    glist.is_complete = True
+    return True
@@ -0,0 +1,194 @@
+# core/ingredient_index.py
+"""
+In-process prefix/trigram index over Ingredient.name.
+
+Built lazily on first use from a single query and then kept current by the
+Ingredient save/delete signals in core/signals.py, so lookups never touch the
+database. Each worker process holds its own copy.
+
+Changes made by other processes (the other workers, and management commands
+such as ingest_ingredients, import_recipes or flush_except_users) never reach
+those signals. So at most every INGREDIENT_INDEX_CHECK_SECONDS (default 5; 0
+checks on every use) get_index() compares the catalog's row count and highest
+id with the index's and rebuilds it when they differ. A rename or unit change
+made elsewhere leaves both unchanged; INGREDIENT_INDEX_MAX_AGE (default 300
+seconds) bounds how long the index can miss one.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+
+DEFAULT_CHECK_SECONDS = 5
+DEFAULT_MAX_AGE = 300
+
+
+def _normalize(text):
+    return ' '.join(text.lower().split())
+
+
+def _trigrams(text):
+    padded = f' {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class IngredientIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = {}      # id -> (normalized name, display name, measurement unit)
+        self._words = []        # sorted (word, id) for every word of every name
+        self._trigrams = {}     # trigram -> set of ids
+        self.version = 0        # bumped on every change; lets callers cache derived data
+        self.built_at = self.checked_at = time.monotonic()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def fingerprint(self):
+        """(row count, highest id), comparable with the catalog's catalog_fingerprint()."""
+        with self._lock:
+            return len(self._entries), max(self._entries, default=None)
+
+    def add(self, ingredient_id, name, measurement_unit):
+        with self._lock:
+            self._discard(ingredient_id)
+            key = _normalize(name)
+            self._entries[ingredient_id] = (key, name, measurement_unit)
+            for word in set(key.split()):
+                insort(self._words, (word, ingredient_id))
+            for gram in _trigrams(key):
+                self._trigrams.setdefault(gram, set()).add(ingredient_id)
+            self.version += 1
+
+    def remove(self, ingredient_id):
+        with self._lock:
+            if self._discard(ingredient_id):
+                self.version += 1
+
+    def _discard(self, ingredient_id):
+        entry = self._entries.pop(ingredient_id, None)
+        if entry is None:
+            return False
+        key = entry[0]
+        for word in set(key.split()):
+            i = bisect_left(self._words, (word, ingredient_id))
+            if i < len(self._words) and self._words[i] == (word, ingredient_id):
+                del self._words[i]
+        for gram in _trigrams(key):
+            ids = self._trigrams.get(gram)
+            if ids is not None:
+                ids.discard(ingredient_id)
+                if not ids:
+                    del self._trigrams[gram]
+        return True
+
+    def get(self, ingredient_id):
+        """Return (name, measurement_unit) or None."""
+        entry = self._entries.get(ingredient_id)
+        return entry and entry[1:]
+
+    def _word_prefix_matches(self, prefix):
+        ids = set()
+        i = bisect_left(self._words, (prefix,))
+        while i < len(self._words) and self._words[i][0].startswith(prefix):
+            ids.add(self._words[i][1])
+            i += 1
+        return ids
+
+    def search(self, query):
+        """
+        Return ingredient ids whose name contains `query` (case-insensitive).
+        Names starting with the query come first, then names with a word starting
+        with it, then other substring matches; alphabetical within each group.
+        """
+        key = _normalize(query)
+        with self._lock:
+            if not key:
+                return sorted(self._entries, key=lambda i: self._entries[i][0])
+            if len(key) < 3:
+                # Too short for trigrams: match word prefixes only.
+                candidates = self._word_prefix_matches(key)
+            else:
+                grams = sorted(_trigrams(key) - {f' {key[:2]}', f'{key[-2:]} '},
+                               key=lambda g: len(self._trigrams.get(g, ())))
+                if not grams:
+                    candidates = set(self._entries)
+                else:
+                    candidates = set(self._trigrams.get(grams[0], ()))
+                    for gram in grams[1:]:
+                        if not candidates:
+                            break
+                        candidates &= self._trigrams.get(gram, set())
+                candidates = {i for i in candidates if key in self._entries[i][0]}
+
+            def rank(ingredient_id):
+                name = self._entries[ingredient_id][0]
+                if name.startswith(key):
+                    group = 0
+                elif any(word.startswith(key) for word in name.split()):
+                    group = 1
+                else:
+                    group = 2
+                return group, name
+
+            return sorted(candidates, key=rank)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def catalog_fingerprint():
+    from django.db.models import Count, Max
+    from .models import Ingredient
+    totals = Ingredient.objects.aggregate(count=Count('id'), last=Max('id'))
+    return totals['count'], totals['last']
+
+
+def _build():
+    from .models import Ingredient
+    index = IngredientIndex()
+    for ingredient_id, name, unit in Ingredient.objects.values_list('id', 'name', 'measurement_unit'):
+        index.add(ingredient_id, name, unit)
+    return index
+
+
+def _stale(index):
+    now = time.monotonic()
+    if now - index.built_at >= getattr(settings, 'INGREDIENT_INDEX_MAX_AGE', DEFAULT_MAX_AGE):
+        return True
+    if now - index.checked_at < getattr(settings, 'INGREDIENT_INDEX_CHECK_SECONDS', DEFAULT_CHECK_SECONDS):
+        return False
+    index.checked_at = now
+    return catalog_fingerprint() != index.fingerprint()
+
+
+def get_index():
+    """
+    Return the process-wide index, building it from the database on first use
+    and rebuilding it when the catalog changed outside this process.
+    """
+    global _index
+    index = _index
+    if index is None or _stale(index):
+        with _index_lock:
+            if _index is index:
+                _index = _build()
+    return _index
+
+
+def reset():
+    """Forget the built index; the next get_index() call rebuilds it."""
+    global _index
+    _index = None
+
+
+def ingredient_saved(ingredient):
+    if _index is not None:
+        _index.add(ingredient.id, ingredient.name, ingredient.measurement_unit)
+
+
+def ingredient_deleted(ingredient_id):
+    if _index is not None:
+        _index.remove(ingredient_id)
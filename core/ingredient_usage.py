@@ -0,0 +1,91 @@
+# core/ingredient_usage.py
+"""
+Which recipes use an ingredient, and deleting an ingredient with everything
+that depends on it.
+
+"Recipes using X" reads the (ingredient, recipe) index on RecipeIngredient,
+an inverted index the database keeps current on every write. Deletion works
+on sets instead of loading rows: every table pointing at the ingredient or at
+the recipes using it loses those rows with one DELETE ... WHERE ... IN
+(subquery) each, then the recipes and the ingredient go, all in one
+transaction. The derived data that bulk deletes bypass (search index, daily
+demand, in-memory ingredient index) is refreshed explicitly.
+"""
+from collections import defaultdict
+
+from django.db import models, transaction
+
+from . import grocery, ingredient_index, search
+from .models import Ingredient, MealPlan, Recipe, RecipeIngredient
+
+DEFAULT_BATCH_SIZE = 500  # recipe ids per DELETE
+
+
+def recipe_ids_using(ingredient):
+    """Subquery of the ids of the recipes that use `ingredient`."""
+    return RecipeIngredient.objects.filter(ingredient=ingredient).values('recipe_id')
+
+
+def recipes_using(ingredient):
+    return Recipe.objects.filter(id__in=recipe_ids_using(ingredient))
+
+
+def _dependents(model):
+    # Models with a CASCADE foreign key to `model`, with that field's name.
+    return [(rel.related_model, rel.field.name) for rel in model._meta.related_objects
+            if rel.one_to_many and rel.on_delete is models.CASCADE]
+
+
+def _cascade(ingredient):
+    # [(model, queryset)] in delete order. The recipe lines go last among the
+    # rows pointing at the recipes, since the other steps select through them.
+    recipes = recipe_ids_using(ingredient)
+    steps = []
+    for model, field in sorted(_dependents(Recipe), key=lambda dependent: dependent[0] is RecipeIngredient):
+        steps.append((model, model._base_manager.filter(**{f'{field}__in': recipes})))
+    for model, field in _dependents(Ingredient):
+        if model is not RecipeIngredient:  # already covered by the recipes' lines
+            steps.append((model, model._base_manager.filter(**{field: ingredient})))
+    return steps
+
+
+def deletion_impact(ingredient):
+    """{model label: rows that deleting `ingredient` would remove}, from COUNT queries only."""
+    impact = {model._meta.label: queryset.count() for model, queryset in _cascade(ingredient)}
+    impact[Recipe._meta.label] = recipes_using(ingredient).count()
+    impact[Ingredient._meta.label] = 1
+    return impact
+
+
+@transaction.atomic
+def delete_ingredient(ingredient, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Delete `ingredient`, the recipes using it and every row depending on either.
+    Returns {model label: rows deleted}.
+    """
+    # Ids only: the search index and the meal plan demand are refreshed from them afterwards.
+    recipe_ids = list(recipes_using(ingredient).values_list('id', flat=True))
+    plan_days = defaultdict(set)
+    plans = MealPlan.objects.filter(recipe_id__in=recipe_ids_using(ingredient))
+    for user_id, day in plans.values_list('user_id', 'date').distinct():
+        plan_days[user_id].add(day)
+
+    deleted = {}
+    for model, queryset in _cascade(ingredient):
+        # _raw_delete: one DELETE statement, without collecting rows or sending signals.
+        deleted[model._meta.label] = queryset._raw_delete(queryset.db)
+    # The lines the recipe subquery reads are gone now, so delete the recipes by id.
+    deleted[Recipe._meta.label] = 0
+    for start in range(0, len(recipe_ids), batch_size):
+        ids = recipe_ids[start:start + batch_size]
+        chunk = Recipe._base_manager.filter(id__in=ids)
+        deleted[Recipe._meta.label] += chunk._raw_delete(chunk.db)
+        search.remove_recipes(ids)
+    rows = Ingredient._base_manager.filter(pk=ingredient.pk)
+    deleted[Ingredient._meta.label] = rows._raw_delete(rows.db)
+
+    for user_id, days in plan_days.items():
+        grocery.refresh_demand(user_id, days)
+    ingredient_id = ingredient.pk
+    transaction.on_commit(lambda: ingredient_index.ingredient_deleted(ingredient_id))
+    return deleted
@@ -0,0 +1,44 @@
+# core/ingredients.py
+"""
+Resolving ingredient names to catalog rows.
+
+Names are matched on Ingredient.normalized_name (case and whitespace folded),
+which carries a unique index: lookups are one indexed IN query, and rows are
+created with bulk_create(ignore_conflicts=True), so two requests adding the
+same new ingredient at once both end up with the one row instead of a
+duplicate or an IntegrityError.
+"""
+from django.db import transaction
+
+from . import ingredient_index
+from .models import Ingredient, normalize_ingredient_name
+
+
+def resolve_ingredients(units, predefined=False):
+    """
+    Map ingredient names to Ingredient rows, creating the missing ones.
+
+    `units` is {display name: measurement unit}; the unit (and display name) is
+    only used for rows that have to be created. Returns
+    ({normalized name: Ingredient}, number of names that were missing).
+    """
+    wanted = {}
+    for name, unit in units.items():
+        key = normalize_ingredient_name(name)
+        if key:
+            wanted.setdefault(key, (' '.join(name.split())[:255], unit))
+    if not wanted:
+        return {}, 0
+    found = Ingredient.objects.in_bulk(list(wanted), field_name='normalized_name')
+    missing = [key for key in wanted if key not in found]
+    if missing:
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=wanted[key][0], measurement_unit=wanted[key][1],
+                        is_predefined=predefined) for key in missing],
+            ignore_conflicts=True,
+        )
+        # bulk_create does not send signals (or return pks on SQLite): reload and notify.
+        for ingredient in Ingredient.objects.filter(normalized_name__in=missing):
+            found[ingredient.normalized_name] = ingredient
+            transaction.on_commit(lambda ingredient=ingredient: ingredient_index.ingredient_saved(ingredient))
+    return found, len(missing)
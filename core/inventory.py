@@ -0,0 +1,206 @@
+# core/inventory.py
+"""
+Inventory mutation service.
+
+Every change to InventoryItem.current_stock goes through here: deltas are
+applied in the database with F() expressions inside a transaction (never
+read-modify-write in Python), and each change is appended to the
+StockMovement ledger. StockSnapshot rows checkpoint the ledger so historic
+balances and audits only replay recent movements.
+"""
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Max, Sum, Value, When
+
+from . import cookability
+from .models import InventoryItem, RecipeIngredient, StockMovement, StockSnapshot
+
+
+def recipe_demand(recipe):
+    """Return {ingredient_id: quantity} needed to cook a recipe once."""
+    return dict(RecipeIngredient.objects.filter(recipe=recipe).values_list('ingredient_id', 'quantity'))
+
+
+def recipe_requirements(recipe):
+    """Return {Ingredient: quantity} needed to cook a recipe once, in one query."""
+    return {ri.ingredient: ri.quantity
+            for ri in RecipeIngredient.objects.filter(recipe=recipe).select_related('ingredient')}
+
+
+def _ensure_items(user, ingredient_ids):
+    existing = set(InventoryItem.objects.filter(
+        user=user, ingredient_id__in=ingredient_ids
+    ).values_list('ingredient_id', flat=True))
+    missing = [i for i in ingredient_ids if i not in existing]
+    if missing:
+        # ignore_conflicts: a concurrent request may have created the row meanwhile.
+        InventoryItem.objects.bulk_create(
+            [InventoryItem(user=user, ingredient_id=i, current_stock=0) for i in missing],
+            ignore_conflicts=True,
+        )
+
+
+def _delta_expression(deltas):
+    return Case(
+        *[When(ingredient_id=i, then=Value(float(d))) for i, d in deltas.items()],
+        default=Value(0.0), output_field=FloatField(),
+    )
+
+
+def _record(user, deltas, reason):
+    StockMovement.objects.bulk_create(
+        [StockMovement(user=user, ingredient_id=i, delta=d, reason=reason) for i, d in deltas.items() if d]
+    )
+    # Queryset updates bypass the InventoryItem signals.
+    cookability.refresh_for_ingredients(user.id, list(deltas))
+
+
+@transaction.atomic
+def add_stock(user, deltas, reason):
+    """
+    Add non-negative quantities: {ingredient_id: quantity}. Missing inventory rows
+    are created. Applied with a single UPDATE.
+    """
+    deltas = {int(i): float(d) for i, d in deltas.items() if d}
+    if not deltas:
+        return
+    _ensure_items(user, list(deltas))
+    InventoryItem.objects.filter(user=user, ingredient_id__in=list(deltas)).update(
+        current_stock=F('current_stock') + _delta_expression(deltas)
+    )
+    _record(user, deltas, reason)
+
+
+class ReservationConflict(Exception):
+    """
+    Raised by reserve_stock() when the stock changed between its read and its
+    write on every attempt (heavy contention on the same rows); nothing is
+    changed, so the request can simply be tried again.
+    """
+
+    def __init__(self, attempts):
+        self.attempts = attempts
+        super().__init__(f"Stock kept changing during {attempts} reservation attempt(s); nothing was reserved.")
+
+
+class _ReservationConflict(Exception):
+    pass
+
+
+def _key_id(key):
+    return getattr(key, 'pk', key)
+
+
+def _try_reserve(user, demand, reason):
+    with transaction.atomic():
+        ids = {_key_id(key): key for key in demand}
+        # One query locks and reads every row needed (row locks where the backend has them).
+        available = dict(InventoryItem.objects.select_for_update().filter(
+            user=user, ingredient_id__in=list(ids)
+        ).values_list('ingredient_id', 'current_stock'))
+        deficits = {key: qty - available.get(_key_id(key), 0)
+                    for key, qty in demand.items() if available.get(_key_id(key), 0) < qty}
+        if deficits:
+            return deficits
+        needed = {_key_id(key): qty for key, qty in demand.items()}
+        # One conditional UPDATE for all rows; it only matches rows that still hold enough.
+        updated = InventoryItem.objects.filter(
+            user=user, ingredient_id__in=list(needed),
+            current_stock__gte=_delta_expression(needed),
+        ).update(current_stock=F('current_stock') - _delta_expression(needed))
+        if updated != len(needed):
+            # Stock changed between the read and the write; undo and re-read.
+            raise _ReservationConflict()
+        _record(user, {i: -q for i, q in needed.items()}, reason)
+        return {}
+
+
+def reserve_stock(user, demand, reason, attempts=3):
+    """
+    Atomically deduct every quantity in `demand` ({Ingredient or ingredient_id: quantity})
+    or nothing at all. Returns {} on success, otherwise the deficit map keyed like
+    `demand` ({Ingredient: missing quantity} is what the error templates render).
+    Raises ReservationConflict if concurrent changes defeat all `attempts`.
+    """
+    demand = {key: float(qty) for key, qty in demand.items() if qty}
+    if not demand:
+        return {}
+    for attempt in range(attempts):
+        try:
+            return _try_reserve(user, demand, reason)
+        except _ReservationConflict:
+            if attempt == attempts - 1:
+                raise ReservationConflict(attempts) from None
+
+
+@transaction.atomic
+def set_stock(user, ingredient_id, value, reason='adjustment'):
+    """Set an absolute stock level, recording the difference in the ledger."""
+    item = InventoryItem.objects.select_for_update().get(user=user, ingredient_id=ingredient_id)
+    delta = float(value) - item.current_stock
+    InventoryItem.objects.filter(pk=item.pk).update(current_stock=F('current_stock') + delta)
+    _record(user, {ingredient_id: delta}, reason)
+
+
+# ---------------------------------------------------------------------
+# Snapshots and audit.
+
+@transaction.atomic
+def take_snapshots():
+    """
+    Checkpoint the ledger: one StockSnapshot per user/ingredient that moved since
+    the previous snapshot. Returns the number of snapshots written.
+    """
+    upto = StockMovement.objects.aggregate(m=Max('id'))['m']
+    if upto is None:
+        return 0
+    previous_upto = StockSnapshot.objects.aggregate(m=Max('upto_movement_id'))['m'] or 0
+    if upto == previous_upto:
+        return 0
+    moved = StockMovement.objects.filter(id__gt=previous_upto, id__lte=upto).values(
+        'user_id', 'ingredient_id'
+    ).annotate(total=Sum('delta'))
+    snapshots = []
+    for row in moved:
+        base = _latest_snapshot(row['user_id'], row['ingredient_id'])
+        snapshots.append(StockSnapshot(
+            user_id=row['user_id'], ingredient_id=row['ingredient_id'],
+            balance=(base.balance if base else 0) + row['total'], upto_movement_id=upto,
+        ))
+    StockSnapshot.objects.bulk_create(snapshots, batch_size=500)
+    return len(snapshots)
+
+
+def _latest_snapshot(user_id, ingredient_id, upto_movement_id=None):
+    snapshots = StockSnapshot.objects.filter(user_id=user_id, ingredient_id=ingredient_id)
+    if upto_movement_id is not None:
+        snapshots = snapshots.filter(upto_movement_id__lte=upto_movement_id)
+    return snapshots.order_by('-upto_movement_id').first()
+
+
+def ledger_balance(user_id, ingredient_id, at=None):
+    """
+    Balance according to the ledger (optionally as of datetime `at`):
+    the latest snapshot plus the movements recorded after it.
+    """
+    movements = StockMovement.objects.filter(user_id=user_id, ingredient_id=ingredient_id)
+    upto = None
+    if at is not None:
+        movements = movements.filter(created_at__lte=at)
+        upto = movements.aggregate(m=Max('id'))['m'] or 0
+    snapshot = _latest_snapshot(user_id, ingredient_id, upto)
+    if snapshot:
+        movements = movements.filter(id__gt=snapshot.upto_movement_id)
+    return (snapshot.balance if snapshot else 0) + (movements.aggregate(s=Sum('delta'))['s'] or 0)
+
+
+def audit(user=None):
+    """Return [(InventoryItem, ledger balance)] for rows whose stock disagrees with the ledger."""
+    items = InventoryItem.objects.select_related('ingredient', 'user')
+    if user is not None:
+        items = items.filter(user=user)
+    drift = []
+    for item in items.iterator():
+        expected = ledger_balance(item.user_id, item.ingredient_id)
+        if abs(expected - item.current_stock) > 1e-6:
+            drift.append((item, expected))
+    return drift
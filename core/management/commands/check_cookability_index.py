@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.cookability import check_index, is_indexed
+
+
+class Command(BaseCommand):
+    help = 'Compare the recipe cookability index against a full recomputation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only check the index of this username.')
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.all()
+        if options['user']:
+            users = users.filter(username=options['user'])
+        inconsistent = 0
+        for user in users.iterator():
+            if not is_indexed(user.id):
+                continue
+            for recipe_id, stored, expected in check_index(user):
+                inconsistent += 1
+                self.stdout.write(f"{user}: recipe {recipe_id} stored={stored} expected={expected}")
+        if inconsistent:
+            raise CommandError(f"{inconsistent} inconsistent index row(s); run rebuild_cookability_index.")
+        self.stdout.write(self.style.SUCCESS("Cookability index is consistent."))
@@ -0,0 +1,41 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from core import query_plans
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN QUERY PLAN every query of the hot views and fail on a full table scan"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view', action='append', dest='views', metavar='URL_NAME',
+                            help='Only check this view (repeatable).')
+
+    def handle(self, *args, **options):
+        checks = query_plans.VIEW_CHECKS
+        if options['views']:
+            checks = [check for check in checks if check.url_name in options['views']]
+            if not checks:
+                raise CommandError(f"No query plan check for {', '.join(options['views'])}.")
+        try:
+            results = list(query_plans.check_views(checks))
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+        failures = 0
+        for check, report in results:
+            label = check.url_name + (f" {check.query}" if check.query else '')
+            scans = [(sql, tables) for sql, plan, tables in report if tables]
+            self.stdout.write(f"{label}: {len(report)} quer{'y' if len(report) == 1 else 'ies'}, "
+                              f"{len(scans)} with a full scan.")
+            for sql, plan, tables in report:
+                if tables:
+                    failures += 1
+                    self.stdout.write(f"  Full scan of {', '.join(tables)}: {sql}")
+                elif options['verbosity'] > 1:
+                    self.stdout.write(f"  {sql}")
+                if tables or options['verbosity'] > 1:
+                    for step in plan:
+                        self.stdout.write(f"    {step}")
+        if failures:
+            raise CommandError(f"{failures} quer{'y' if failures == 1 else 'ies'} fell back to a full table scan.")
+        self.stdout.write(self.style.SUCCESS("Every checked query uses an index."))
@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+
+from core import cookability, grocery
+from core.models import (GroceryListItem, Ingredient, InventoryItem, RecipeIngredient, StockMovement,
+                         StockSnapshot, normalize_ingredient_name)
+
+# Until the unit conversion rewrite, a quantity entered in a recipe form with a
+# unit was stored as that unit's canonical amount (g, ml): "2 kg" of an
+# ingredient kept in kg became 2000. These are the factors of that time, frozen
+# here so later changes to core.units do not change what this command does.
+LEGACY_FACTORS = {
+    'kg': 1000,
+    'oz': 28.3495,
+    'lb': 453.592,
+    'L': 1000,
+    'cup': 240,
+    'tbsp': 15,
+    'tsp': 5,
+    'pint': 473.176,
+    'gallon': 3785.41,
+}
+
+
+class Command(BaseCommand):
+    help = ("Divide quantities stored in canonical units (g, ml) by the unit factor of the named ingredients. "
+            "Dry run unless --commit is given.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ingredient', action='append', dest='ingredients', required=True, metavar='NAME',
+                            help='An ingredient whose stored quantities are in g/ml (repeatable).')
+        parser.add_argument('--inventory', action='store_true',
+                            help='Also convert the stock, its ledger and snapshots (only if they were entered '
+                                 'in g/ml too).')
+        parser.add_argument('--grocery', action='store_true', help='Also convert open grocery list items.')
+        parser.add_argument('--commit', action='store_true', help='Write the changes (default: dry run).')
+
+    def handle(self, *args, **options):
+        names = {normalize_ingredient_name(name): name for name in options['ingredients']}
+        ingredients = list(Ingredient.objects.filter(normalized_name__in=names))
+        unknown = set(names) - {ingredient.normalized_name for ingredient in ingredients}
+        if unknown:
+            raise CommandError(f"Unknown ingredient(s): {', '.join(sorted(names[name] for name in unknown))}.")
+
+        querysets = [('recipe line', RecipeIngredient.objects.filter(recipe__external_id=''), 'quantity')]
+        if options['inventory']:
+            querysets += [('inventory row', InventoryItem.objects.all(), 'current_stock'),
+                          ('stock movement', StockMovement.objects.all(), 'delta'),
+                          ('stock snapshot', StockSnapshot.objects.all(), 'balance')]
+        if options['grocery']:
+            querysets.append(('grocery item', GroceryListItem.objects.filter(grocery_list__is_complete=False),
+                              'total_quantity'))
+
+        with transaction.atomic():
+            for ingredient in ingredients:
+                factor = LEGACY_FACTORS.get(ingredient.measurement_unit)
+                if factor is None:
+                    self.stdout.write(f"{ingredient.name}: kept in {ingredient.measurement_unit}, nothing to convert.")
+                    continue
+                counts = []
+                for label, queryset, field in querysets:
+                    rows = queryset.filter(ingredient=ingredient)
+                    n = rows.update(**{field: models.F(field) / factor}) if options['commit'] else rows.count()
+                    counts.append(f"{n} {label}(s)")
+                self.stdout.write(f"{ingredient.name} ({ingredient.measurement_unit}, / {factor}): {', '.join(counts)}.")
+            if options['commit']:
+                self._refresh_derived(ingredients, options['inventory'])
+
+        if options['commit']:
+            self.stdout.write(self.style.SUCCESS("Quantities converted."))
+        else:
+            self.stdout.write("Dry run: nothing was changed; pass --commit to convert.")
+
+    def _refresh_derived(self, ingredients, inventory):
+        # QuerySet.update() sends no signals: refresh the meal plan demand and the cookability index here.
+        recipe_ids = set(RecipeIngredient.objects.filter(ingredient__in=ingredients)
+                         .values_list('recipe_id', flat=True))
+        for recipe_id in recipe_ids:
+            grocery.refresh_demand_for_recipe(recipe_id)
+        cookability.refresh_for_recipes(recipe_ids)
+        if inventory:
+            ingredient_ids = [ingredient.id for ingredient in ingredients]
+            user_ids = set(InventoryItem.objects.filter(ingredient_id__in=ingredient_ids)
+                           .values_list('user_id', flat=True))
+            for user_id in user_ids:
+                cookability.refresh_for_ingredients(user_id, ingredient_ids)
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+
+from core import ingredient_index, search
+from core.flush import (DEFAULT_BATCH_SIZE, FlushError, clear_references, count_rows, delete_tables,
+                        plan_flush, truncate_tables)
+from core.models import Recipe
+
+class Command(BaseCommand):
+    help = 'Flush all data except for user login (auth.User and auth.Group)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only print the tables in deletion order with their row counts.')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Rows per DELETE statement (default %(default)s).')
+        parser.add_argument('--truncate', action='store_true',
+                            help="Empty all tables at once with the database's flush SQL (TRUNCATE where supported).")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        preserved_models = {User}
+        # Optionally, add auth.Group if you want to preserve groups as well.
+        try:
+            from django.contrib.auth.models import Group
+            preserved_models.add(Group)
+        except ImportError:
+            pass
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        try:
+            plan = plan_flush(preserved_models)
+        except FlushError as e:
+            raise CommandError(str(e))
+        for model in sorted(preserved_models, key=lambda model: model.__name__):
+            self.stdout.write(f"Preserving model {model.__name__}.")
+        for model in plan.cascaded:
+            self.stdout.write(f"Also emptying {model._meta.db_table}: it points at an emptied table.")
+
+        if options['dry_run']:
+            for model, fields in plan.nullify:
+                self.stdout.write(f"Would clear {', '.join(field.column for field in fields)} "
+                                  f"on {model._meta.db_table}.")
+            for model in plan.models:
+                self.stdout.write(f"Would delete {count_rows(model)} row(s) from {model._meta.db_table}.")
+            return
+
+        for model, rows, seconds in clear_references(plan):
+            self.stdout.write(f"Cleared {rows} reference(s) on {model._meta.db_table} in {seconds:.2f}s.")
+        if options['truncate']:
+            counts, seconds = truncate_tables(plan)
+            for model, rows in counts:
+                self.stdout.write(f"Emptied {model._meta.db_table} ({rows} row(s)).")
+            self.stdout.write(f"Truncated {len(counts)} table(s) in {seconds:.2f}s.")
+        else:
+            def progress(model, deleted):
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"  {model._meta.db_table}: {deleted} row(s) deleted...")
+
+            for model, rows, seconds in delete_tables(plan, options['batch_size'], progress=progress):
+                self.stdout.write(f"Deleted {rows} row(s) from {model._meta.db_table} in {seconds:.2f}s.")
+
+        # Derived data that is not a model table.
+        if Recipe in plan.models:
+            search.rebuild_index()
+        ingredient_index.reset()
+        self.stdout.write(self.style.SUCCESS("Flushed all data except user login data."))
@@ -0,0 +1,29 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.recipe_import import DEFAULT_BATCH_SIZE, RecipeImportError, import_recipes, load_dump
+
+
+class Command(BaseCommand):
+    help = 'Import external (Spoonacular-format) recipes from a JSON or JSON Lines dump'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSON list, {"recipes": [...]} or one recipe per line.')
+        parser.add_argument('--user', required=True, help='Username the recipes are imported for.')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        author = get_user_model().objects.filter(username=options['user']).first()
+        if author is None:
+            raise CommandError(f"No user named {options['user']!r}.")
+        try:
+            with open(options['path'], encoding='utf-8') as fp:
+                recipes = load_dump(fp)
+        except (OSError, RecipeImportError) as e:
+            raise CommandError(f"Could not read {options['path']}: {e}")
+        stats = import_recipes(author, recipes, batch_size=options['batch_size'])
+        self.stdout.write(
+            f"{stats['skipped']} already imported, {stats['invalid']} invalid, "
+            f"{stats['ingredients_created']} new ingredient(s), {stats['lines_skipped']} unconvertible line(s)."
+        )
+        self.stdout.write(self.style.SUCCESS(f"Imported {stats['created']} recipe(s)."))
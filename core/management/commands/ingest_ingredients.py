@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.catalog_ingest import DEFAULT_BATCH_SIZE, FORMATS, IngestError, ingest, iter_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream an ingredient catalog (JSON Lines or CSV, file or URL) into Ingredient in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Path or http(s) URL.')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to csv for *.csv, else jsonl.')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--not-predefined', action='store_true',
+                            help='Create the ingredients as user-editable instead of predefined.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        def progress(stats):
+            if options['verbosity'] > 1:
+                self.stdout.write(self._rate(stats))
+
+        try:
+            stats = ingest(iter_rows(options['source'], options['format']), batch_size=options['batch_size'],
+                           predefined=not options['not_predefined'], progress=progress)
+        except IngestError as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            f"{stats['created']} created, {stats['updated']} updated, {stats['unchanged']} unchanged, "
+            f"{stats['in_use']} kept their unit (in use), {stats['duplicates']} duplicate(s), "
+            f"{stats['invalid']} invalid."
+        )
+        self.stdout.write(self.style.SUCCESS(self._rate(stats)))
+
+    def _rate(self, stats):
+        rate = stats['rows'] / stats['seconds'] if stats['seconds'] else 0
+        return f"{stats['rows']} rows in {stats['seconds']:.1f}s ({rate:,.0f} rows/s)"
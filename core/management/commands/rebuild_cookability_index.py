@@ -0,0 +1,21 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from core.cookability import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-user recipe cookability index from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild the index of this username.')
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.all()
+        if options['user']:
+            users = users.filter(username=options['user'])
+        for user in users.iterator():
+            counts = rebuild_index(user)
+            cookable = sum(1 for n in counts.values() if n == 0)
+            self.stdout.write(f"{user}: indexed {len(counts)} recipe(s), {cookable} cookable.")
+        self.stdout.write(self.style.SUCCESS("Cookability index rebuilt."))
@@ -0,0 +1,20 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.grocery import rebuild_demand
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-day meal plan ingredient demand table from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild the demand of this username.')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = get_user_model().objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f"No user named {options['user']!r}.")
+        rows = rebuild_demand(user)
+        self.stdout.write(self.style.SUCCESS(f"Grocery demand rebuilt: {rows} row(s)."))
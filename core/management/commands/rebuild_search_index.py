@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from core.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text recipe search index (SQLite FTS5 only)'
+
+    def handle(self, *args, **options):
+        if rebuild_index():
+            self.stdout.write(self.style.SUCCESS("Recipe search index rebuilt."))
+        else:
+            self.stdout.write("Full-text search is not available on this database; using the icontains fallback.")
@@ -0,0 +1,27 @@
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from core.replica import REPLICA_DB, refresh_replica, replica_configured
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database to the read replica with the backup API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float,
+                            help='Keep refreshing every INTERVAL seconds until interrupted.')
+
+    def handle(self, *args, **options):
+        if not replica_configured():
+            raise CommandError(f"No '{REPLICA_DB}' database is configured (set RECIPE_MANAGER_REPLICA).")
+        while True:
+            try:
+                seconds = refresh_replica()
+            except ImproperlyConfigured as e:
+                raise CommandError(str(e))
+            self.stdout.write(f"Replica refreshed in {seconds:.2f}s.")
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
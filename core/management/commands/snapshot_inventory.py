@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import inventory
+
+
+class Command(BaseCommand):
+    help = 'Checkpoint the stock movement ledger and optionally audit inventory against it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--audit', action='store_true',
+                            help='Also compare every InventoryItem with its ledger balance.')
+
+    def handle(self, *args, **options):
+        written = inventory.take_snapshots()
+        self.stdout.write(f"Wrote {written} stock snapshot(s).")
+        if options['audit']:
+            drift = inventory.audit()
+            for item, expected in drift:
+                self.stdout.write(f"{item.user}: {item.ingredient.name} stock={item.current_stock} ledger={expected}")
+            if drift:
+                raise CommandError(f"{len(drift)} inventory row(s) disagree with the ledger.")
+            self.stdout.write(self.style.SUCCESS("Inventory matches the ledger."))
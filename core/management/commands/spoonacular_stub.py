@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.spoonacular_stub import StubServer
+
+
+class Command(BaseCommand):
+    help = 'Serve a local stand-in for the Spoonacular API (point SPOONACULAR_BASE_URL at it)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--delay', type=float, default=0.0, help='Seconds to wait before each response.')
+
+    def handle(self, *args, **options):
+        stub = StubServer(port=options['port'], delay=options['delay'])
+        self.stdout.write(self.style.SUCCESS(f"Spoonacular stub listening on {stub.url}"))
+        try:
+            stub.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stub.stop()
@@ -0,0 +1,81 @@
+# core/meal_plans.py
+from collections import defaultdict
+
+from django.db import transaction
+
+from . import grocery, inventory
+from .models import InventoryItem, MealPlan, RecipeIngredient
+
+ALL_OR_NOTHING = 'all_or_nothing'
+BEST_EFFORT = 'best_effort'
+SCHEDULE_MODES = [
+    (ALL_OR_NOTHING, "All or nothing"),
+    (BEST_EFFORT, "Best effort (schedule what fits)"),
+]
+
+
+def _requirements_by_recipe(recipe_ids):
+    # {recipe_id: {Ingredient: quantity}} for every recipe, in one query.
+    requirements = defaultdict(dict)
+    rows = RecipeIngredient.objects.filter(recipe_id__in=recipe_ids).select_related('ingredient')
+    for ri in rows:
+        requirements[ri.recipe_id][ri.ingredient] = ri.quantity
+    return requirements
+
+
+def _add(total, demand, times=1):
+    for ingredient, qty in demand.items():
+        total[ingredient] = total.get(ingredient, 0) + qty * times
+
+
+def schedule_meals(user, entries, mode=ALL_OR_NOTHING):
+    """
+    Schedule many (recipe_id, date) meals at once, reserving their combined
+    ingredient demand in a single inventory reservation.
+
+    all_or_nothing: every meal is scheduled, or none is and `missing` holds the
+    combined deficits. best_effort: meals are taken in date order while stock
+    lasts; the rest are returned in `skipped` with the deficits that stopped them.
+
+    Returns {'scheduled': [MealPlan], 'skipped': [(recipe_id, date)], 'missing': {Ingredient: qty}}.
+    Raises inventory.ReservationConflict (nothing scheduled) if concurrent stock
+    changes defeat every reservation attempt.
+    """
+    entries = sorted(entries, key=lambda entry: entry[1])
+    requirements = _requirements_by_recipe({recipe_id for recipe_id, date in entries})
+
+    if mode == BEST_EFFORT:
+        # Greedy pass against one read of the relevant stock.
+        ingredient_ids = {ingredient.id for demand in requirements.values() for ingredient in demand}
+        remaining = dict(InventoryItem.objects.filter(
+            user=user, ingredient_id__in=ingredient_ids
+        ).values_list('ingredient_id', 'current_stock'))
+        accepted, skipped, missing = [], [], {}
+        for recipe_id, date in entries:
+            demand = requirements.get(recipe_id, {})
+            short = {ing: qty - remaining.get(ing.id, 0) for ing, qty in demand.items()
+                     if remaining.get(ing.id, 0) < qty}
+            if short:
+                skipped.append((recipe_id, date))
+                _add(missing, short)
+                continue
+            for ing, qty in demand.items():
+                remaining[ing.id] -= qty
+            accepted.append((recipe_id, date))
+    else:
+        accepted, skipped, missing = entries, [], {}
+
+    total = {}
+    for recipe_id, date in accepted:
+        _add(total, requirements.get(recipe_id, {}))
+
+    with transaction.atomic():
+        deficits = inventory.reserve_stock(user, total, 'meal_plan')
+        if deficits:
+            # all_or_nothing, or stock was used by another request since the greedy pass.
+            return {'scheduled': [], 'skipped': entries, 'missing': deficits}
+        plans = [MealPlan(user=user, recipe_id=recipe_id, date=date) for recipe_id, date in accepted]
+        MealPlan.objects.bulk_create(plans)
+        # bulk_create skips the MealPlan signals that maintain the demand table.
+        grocery.refresh_demand(user.id, {plan.date for plan in plans})
+    return {'scheduled': plans, 'skipped': skipped, 'missing': missing}
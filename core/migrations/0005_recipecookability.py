@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0004_auto_20250313_0821'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeCookability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('missing_count', models.PositiveIntegerField(default=0)),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cookability', to='core.recipe')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_cookability', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recipecookability',
+            index=models.Index(fields=['user', 'missing_count'], name='core_recipe_user_id_58f6d1_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='recipecookability',
+            unique_together={('user', 'recipe')},
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+def create_fts_table(apps, schema_editor):
+    # FTS5 is SQLite-only; other backends use the icontains fallback in core/search.py.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE core_recipe_fts USING fts5("
+            "title, description, instructions, ingredients, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    except OperationalError:
+        # SQLite was built without FTS5.
+        return
+    schema_editor.execute(
+        "INSERT INTO core_recipe_fts (rowid, title, description, instructions, ingredients) "
+        "SELECT r.id, r.title, r.description, r.instructions, "
+        "COALESCE((SELECT group_concat(i.name, ' ') FROM core_recipeingredient ri "
+        "JOIN core_ingredient i ON i.id = ri.ingredient_id WHERE ri.recipe_id = r.id), '') "
+        "FROM core_recipe r"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS core_recipe_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_recipecookability'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_daily_demand(apps, schema_editor):
+    RecipeIngredient = apps.get_model('core', 'RecipeIngredient')
+    DailyDemand = apps.get_model('core', 'DailyDemand')
+    rows = (RecipeIngredient.objects
+            .filter(recipe__mealplan__isnull=False)
+            .values('recipe__mealplan__user_id', 'recipe__mealplan__date', 'ingredient_id')
+            .annotate(total=models.Sum('quantity')))
+    DailyDemand.objects.bulk_create(
+        [DailyDemand(user_id=row['recipe__mealplan__user_id'], date=row['recipe__mealplan__date'],
+                     ingredient_id=row['ingredient_id'], quantity=row['total'])
+         for row in rows.iterator()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0007_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyDemand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.FloatField()),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.ingredient')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_demand', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'date', 'ingredient')},
+            },
+        ),
+        migrations.RunPython(populate_daily_demand, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_daily_demand'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='external_id',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddConstraint(
+            model_name='recipe',
+            constraint=models.UniqueConstraint(condition=models.Q(('external_id', ''), _negated=True), fields=('author', 'external_id'), name='unique_external_recipe_per_author'),
+        ),
+    ]
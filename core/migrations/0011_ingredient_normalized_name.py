@@ -0,0 +1,147 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:02
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+# The unit table as of this migration: unit -> (canonical unit, factor). Inlined
+# because migrations must not depend on app code that may change later.
+UNITS = {
+    'kg': ('g', 1000),
+    'g': ('g', 1),
+    'oz': ('g', 28.3495),
+    'lb': ('g', 453.592),
+    'L': ('ml', 1000),
+    'ml': ('ml', 1),
+    'cup': ('ml', 240),
+    'tbsp': ('ml', 15),
+    'tsp': ('ml', 5),
+    'pint': ('ml', 473.176),
+    'gallon': ('ml', 3785.41),
+    'pieces': ('pieces', 1),
+    'fillets': ('fillets', 1),
+}
+
+
+def normalize(name):
+    # Same as core.models.normalize_ingredient_name (migrations must not import models).
+    return ' '.join(name.split()).lower()
+
+
+def unit_factor(from_unit, to_unit):
+    # Factor from one unit to another of the same kind; None across kinds. Unknown units count as pieces.
+    from_canonical, from_factor = UNITS.get(from_unit, UNITS['pieces'])
+    to_canonical, to_factor = UNITS.get(to_unit, UNITS['pieces'])
+    if from_canonical != to_canonical:
+        return None
+    return from_factor / to_factor
+
+
+def _merge_rows(model, keeper, duplicate, key_fields, value_field, factor):
+    # Repoint `duplicate`'s rows to `keeper`, adding into the keeper's row where
+    # the (key_fields, ingredient) unique constraint would otherwise be violated.
+    kept = {tuple(getattr(row, f) for f in key_fields): row
+            for row in model.objects.filter(ingredient_id=keeper.id)}
+    for row in model.objects.filter(ingredient_id=duplicate.id):
+        value = getattr(row, value_field) * factor
+        target = kept.get(tuple(getattr(row, f) for f in key_fields))
+        if target is None:
+            row.ingredient_id = keeper.id
+            setattr(row, value_field, value)
+            row.save(update_fields=['ingredient', value_field])
+        else:
+            setattr(target, value_field, getattr(target, value_field) + value)
+            target.save(update_fields=[value_field])
+            row.delete()
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('core', 'Ingredient')
+    RecipeIngredient = apps.get_model('core', 'RecipeIngredient')
+    InventoryItem = apps.get_model('core', 'InventoryItem')
+    GroceryListItem = apps.get_model('core', 'GroceryListItem')
+    DailyDemand = apps.get_model('core', 'DailyDemand')
+    StockMovement = apps.get_model('core', 'StockMovement')
+    StockSnapshot = apps.get_model('core', 'StockSnapshot')
+    RecipeCookability = apps.get_model('core', 'RecipeCookability')
+
+    groups = defaultdict(list)
+    for ingredient in Ingredient.objects.order_by('-is_predefined', 'id'):
+        groups[normalize(ingredient.name)].append(ingredient)
+
+    merged = []
+    for duplicates in groups.values():
+        # Keep the predefined row if there is one, else the oldest.
+        keeper = duplicates.pop(0)
+        for duplicate in duplicates:
+            factor = 1.0
+            if duplicate.measurement_unit != keeper.measurement_unit:
+                # Quantities of a different kind (e.g. ml into g) are kept as they are.
+                factor = unit_factor(duplicate.measurement_unit, keeper.measurement_unit) or 1.0
+            _merge_rows(RecipeIngredient, keeper, duplicate, ['recipe_id'], 'quantity', factor)
+            _merge_rows(InventoryItem, keeper, duplicate, ['user_id'], 'current_stock', factor)
+            _merge_rows(DailyDemand, keeper, duplicate, ['user_id', 'date'], 'quantity', factor)
+            for item in GroceryListItem.objects.filter(ingredient_id=duplicate.id):
+                item.ingredient_id = keeper.id
+                item.total_quantity *= factor
+                item.save(update_fields=['ingredient', 'total_quantity'])
+            for movement in StockMovement.objects.filter(ingredient_id=duplicate.id):
+                movement.ingredient_id = keeper.id
+                movement.delta *= factor
+                movement.save(update_fields=['ingredient', 'delta'])
+            merged.append((keeper.id, duplicate.id))
+
+    if not merged:
+        return
+    affected = {ingredient_id for pair in merged for ingredient_id in pair}
+    # Balances are recomputed from the ledger when a pair has no snapshot.
+    StockSnapshot.objects.filter(ingredient_id__in=affected).delete()
+    Ingredient.objects.filter(id__in=[duplicate_id for keeper_id, duplicate_id in merged]).delete()
+
+    # Recipes that used two spellings now have one row less; recount their missing ingredients.
+    recipe_ids = set(RecipeIngredient.objects.filter(ingredient_id__in=affected).values_list('recipe_id', flat=True))
+    needs = defaultdict(list)
+    for row in RecipeIngredient.objects.filter(recipe_id__in=recipe_ids):
+        needs[row.recipe_id].append((row.ingredient_id, row.quantity))
+    rows = list(RecipeCookability.objects.filter(recipe_id__in=recipe_ids))
+    stock = {(item.user_id, item.ingredient_id): item.current_stock
+             for item in InventoryItem.objects.filter(user_id__in={row.user_id for row in rows})}
+    for row in rows:
+        row.missing_count = sum(1 for ingredient_id, quantity in needs[row.recipe_id]
+                                if stock.get((row.user_id, ingredient_id), 0.0) < quantity)
+    RecipeCookability.objects.bulk_update(rows, ['missing_count'], batch_size=500)
+
+
+def populate_normalized_name(apps, schema_editor):
+    Ingredient = apps.get_model('core', 'Ingredient')
+    ingredients = list(Ingredient.objects.all())
+    for ingredient in ingredients:
+        ingredient.normalized_name = normalize(ingredient.name)
+    Ingredient.objects.bulk_update(ingredients, ['normalized_name'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_ingredient_lower_name_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='normalized_name',
+            field=models.CharField(editable=False, max_length=255, null=True),
+        ),
+        migrations.RunPython(merge_duplicate_ingredients, migrations.RunPython.noop),
+        migrations.RunPython(populate_normalized_name, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='ingredient',
+            name='normalized_name',
+            field=models.CharField(editable=False, max_length=255, unique=True),
+        ),
+        # The unique index on normalized_name serves the case-insensitive lookups now.
+        migrations.RemoveIndex(
+            model_name='ingredient',
+            name='core_ingredient_lower_name',
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:41
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_recipeingredient_inverted_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='density',
+            field=models.FloatField(blank=True, help_text='Grams per milliliter; leave empty to use a typical value.', null=True, validators=[django.core.validators.MinValueValidator(0.01)]),
+        ),
+    ]
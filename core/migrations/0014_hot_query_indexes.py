@@ -0,0 +1,42 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0013_ingredient_density'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='grocerylist',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='grocery_lists', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='mealplan',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='meal_plans', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='grocerylist',
+            index=models.Index(condition=models.Q(('is_complete', False)), fields=['user', '-created_at'], name='core_grocerylist_open'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['name'], name='core_ingredient_name'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(condition=models.Q(('current_stock__gt', 0)), fields=['user', 'ingredient'], name='core_inventory_in_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='mealplan',
+            index=models.Index(fields=['user', 'date'], name='core_mealplan_user_date'),
+        ),
+    ]
@@ -3,12 +3,36 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 
+def normalize_ingredient_name(name):
+    """The key that makes "Olive Oil", "olive oil" and " olive  oil" the same ingredient."""
+    return ' '.join(name.split()).lower()
+
+class IngredientQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create skips pre_save, which keeps normalized_name in sync for save().
+        objs = list(objs)
+        for obj in objs:
+            obj.normalized_name = normalize_ingredient_name(obj.name)
+        return super().bulk_create(objs, *args, **kwargs)
+
 class Ingredient(models.Model):
     name = models.CharField(max_length=255)
+    # Kept in sync with `name` by a pre_save signal and IngredientQuerySet.bulk_create;
+    # the unique index makes get_or_create(normalized_name=...) and bulk inserts race-safe.
+    normalized_name = models.CharField(max_length=255, unique=True, editable=False)
     measurement_unit = models.CharField(max_length=50, default='unit')
     is_predefined = models.BooleanField(default=False)  # new field for default ingredients
+    # Grams per milliliter, for converting between mass and volume units (see core/units.py).
+    density = models.FloatField(null=True, blank=True, validators=[MinValueValidator(0.01)],
+                                help_text="Grams per milliliter; leave empty to use a typical value.")
     recipes = models.ManyToManyField('Recipe', through='RecipeIngredient')
 
+    objects = IngredientQuerySet.as_manager()
+
+    class Meta:
+        # The catalog is listed and paginated by name (ingredient_list, inventory_list).
+        indexes = [models.Index(fields=['name'], name='core_ingredient_name')]
+
     def __str__(self):
         return self.name
 
@@ -18,39 +42,64 @@ class Recipe(models.Model):
     instructions = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recipes')
+    # Id of the recipe in an external source (e.g. "spoonacular:716429"); blank for recipes written here.
+    external_id = models.CharField(max_length=100, blank=True, default='')
+
+    class Meta:
+        constraints = [
+            # Importing the same external recipe twice for one user is a no-op.
+            models.UniqueConstraint(fields=['author', 'external_id'], condition=~models.Q(external_id=''),
+                                    name='unique_external_recipe_per_author'),
+        ]
 
     def __str__(self):
         return self.title
 
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
-    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
+    # Indexed together with recipe below instead of on its own.
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE, db_index=False)
     # Quantity must be positive (no negatives allowed)
     quantity = models.FloatField(validators=[MinValueValidator(0.01)])
 
     class Meta:
         unique_together = ('recipe', 'ingredient')  # prevent duplicate entries per recipe
+        # Inverted index ingredient -> recipes: "recipes using X" is an index-only range scan
+        # (see core/ingredient_usage.py), kept current by the database on every write.
+        indexes = [models.Index(fields=['ingredient', 'recipe'], name='core_ri_ingredient_recipe')]
 
     def __str__(self):
         return f"{self.quantity} {self.ingredient.measurement_unit} of {self.ingredient.name} in {self.recipe.title}"
 
 class MealPlan(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='meal_plans')
+    # Indexed together with date below instead of on its own.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='meal_plans', db_index=False)
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
     date = models.DateField()
 
     class Meta:
         ordering = ['date']
         # Removed unique_together so that multiple meal plans (even of the same recipe) on one day are allowed
+        # A user's plans in date order (meal_plan_list, grocery windows) without sorting.
+        indexes = [models.Index(fields=['user', 'date'], name='core_mealplan_user_date')]
 
     def __str__(self):
         return f"{self.recipe.title} on {self.date}"
 
 class GroceryList(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='grocery_lists')
+    # Indexed together with is_complete and created_at below instead of on its own.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='grocery_lists', db_index=False)
     created_at = models.DateTimeField(auto_now_add=True)
     is_complete = models.BooleanField(default=False)
 
+    class Meta:
+        # The user's open list is the newest incomplete one (grocery.open_grocery_list, grocery_list).
+        # Partial rather than (user, is_complete, ...): Django filters booleans as `NOT is_complete`,
+        # which SQLite matches against an index condition but not against an index column.
+        # Completed lists, the bulk of the table over time, stay out of it.
+        indexes = [models.Index(fields=['user', '-created_at'], condition=models.Q(is_complete=False),
+                                name='core_grocerylist_open')]
+
     def __str__(self):
         return f"Grocery List from {self.created_at.strftime('%Y-%m-%d')}"
 
@@ -70,6 +119,74 @@ class InventoryItem(models.Model):
 
     class Meta:
         unique_together = ('user', 'ingredient')  # only one record per user/ingredient
+        # Partial index over the rows inventory_list shows as in stock; zero-stock rows stay out of it.
+        indexes = [models.Index(fields=['user', 'ingredient'], condition=models.Q(current_stock__gt=0),
+                                name='core_inventory_in_stock')]
 
     def __str__(self):
         return f"{self.ingredient.name}: {self.current_stock} {self.ingredient.measurement_unit}"
+
+class RecipeCookability(models.Model):
+    # Materialized per-user index: how many of a recipe's ingredients the user is short of.
+    # Kept up to date incrementally by core.signals; rebuilt with `manage.py rebuild_cookability_index`.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recipe_cookability')
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='cookability')
+    missing_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'recipe')
+        indexes = [models.Index(fields=['user', 'missing_count'])]
+
+    def __str__(self):
+        return f"{self.recipe.title}: {self.missing_count} missing for {self.user}"
+
+class DailyDemand(models.Model):
+    # Per-user, per-day ingredient demand of the user's meal plans, so grocery windows are range sums.
+    # Maintained by core.signals and core.grocery.refresh_demand; rebuilt with `manage.py rebuild_grocery_demand`.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_demand')
+    date = models.DateField()
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
+    quantity = models.FloatField()
+
+    class Meta:
+        unique_together = ('user', 'date', 'ingredient')
+
+    def __str__(self):
+        return f"{self.quantity} {self.ingredient.measurement_unit} of {self.ingredient.name} on {self.date}"
+
+class StockMovement(models.Model):
+    # Append-only ledger of every change to InventoryItem.current_stock (see core/inventory.py).
+    REASON_CHOICES = [
+        ('opening', 'Opening balance'),
+        ('restock', 'Restock'),
+        ('purchase', 'Grocery purchase'),
+        ('cook', 'Cooked recipe'),
+        ('meal_plan', 'Meal plan reservation'),
+        ('meal_plan_cancelled', 'Meal plan cancelled'),
+        ('adjustment', 'Manual adjustment'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stock_movements')
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
+    delta = models.FloatField()
+    reason = models.CharField(max_length=30, choices=REASON_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'ingredient', 'id'])]
+
+    def __str__(self):
+        return f"{self.delta:+} {self.ingredient.measurement_unit} of {self.ingredient.name} ({self.reason})"
+
+class StockSnapshot(models.Model):
+    # Ledger balance per user/ingredient including every movement with id <= upto_movement_id.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stock_snapshots')
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
+    balance = models.FloatField()
+    upto_movement_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'ingredient', '-upto_movement_id'])]
+
+    def __str__(self):
+        return f"{self.ingredient.name}: {self.balance} at movement {self.upto_movement_id}"
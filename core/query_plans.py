@@ -0,0 +1,117 @@
+# core/query_plans.py
+"""
+EXPLAIN QUERY PLAN over the queries the hot views run (used by check_query_plans).
+
+Each view in VIEW_CHECKS is requested once as a throwaway user with a little
+sample data (uniquely named, so it never clashes with existing rows), inside a transaction that is rolled back afterwards. Every
+SELECT, UPDATE and DELETE it sends is recorded with its parameters and
+explained by SQLite; a plan step that reads a table row by row without an
+index ("SCAN core_mealplan") is a full scan. Views that list a whole table by
+design name that table in `full_scans_allowed`.
+"""
+import re
+import uuid
+from collections import namedtuple
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import ingredient_index
+from .models import (GroceryList, GroceryListItem, Ingredient, InventoryItem, MealPlan, Recipe,
+                     RecipeIngredient)
+
+# args: names of sample objects (see _sample_data) whose pks go into the URL.
+ViewCheck = namedtuple('ViewCheck', ['url_name', 'args', 'query', 'full_scans_allowed'])
+
+VIEW_CHECKS = [
+    ViewCheck('recipe_list', (), {}, {'core_recipe'}),  # lists every recipe
+    ViewCheck('recipe_list', (), {'q': 'tomato'}, set()),
+    ViewCheck('recipe_detail', ('recipe',), {}, set()),
+    ViewCheck('cook_recipe', ('recipe',), {}, set()),
+    ViewCheck('inventory_list', (), {}, set()),
+    # The first search in a process loads the in-memory ingredient index (core/ingredient_index.py).
+    ViewCheck('inventory_list', (), {'query': 'tomato'}, {'core_ingredient'}),
+    ViewCheck('ingredient_list', (), {}, set()),
+    ViewCheck('ingredient_recipes', ('ingredient',), {}, set()),
+    ViewCheck('meal_plan_list', (), {}, set()),
+    ViewCheck('add_meal_plan', (), {}, {'core_recipe'}),  # recipe choices
+    ViewCheck('bulk_add_meal_plans', (), {}, {'core_recipe'}),  # recipe choices
+    ViewCheck('grocery_list', (), {}, set()),
+    ViewCheck('grocery_checkout', (), {}, set()),
+    ViewCheck('auto_generate_grocery_list', (), {}, set()),
+]
+
+# "SCAN core_recipe" (SQLite >= 3.36) or "SCAN TABLE core_recipe AS T" (older); a scan
+# "USING [COVERING] INDEX ..." walks an index and is not a full scan.
+_FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?"?(\w+)"?(?: AS \w+)?$')
+
+_EXPLAINED = ('SELECT', 'UPDATE', 'DELETE')
+
+
+def explain(sql, params, using=DEFAULT_DB_ALIAS):
+    """The detail column of SQLite's EXPLAIN QUERY PLAN for one statement."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(plan):
+    """Tables `plan` reads without an index."""
+    return [match.group(1) for match in map(_FULL_SCAN.match, plan) if match]
+
+
+def _sample_data(user, suffix):
+    # The names keep "tomato": the search checks query it.
+    tomato = Ingredient.objects.create(name=f'Query plan tomato {suffix}', measurement_unit='g')
+    basil = Ingredient.objects.create(name=f'Query plan basil {suffix}', measurement_unit='g')
+    recipe = Recipe.objects.create(author=user, title=f'Query plan tomato salad {suffix}', instructions='Mix.')
+    RecipeIngredient.objects.create(recipe=recipe, ingredient=tomato, quantity=200)
+    RecipeIngredient.objects.create(recipe=recipe, ingredient=basil, quantity=5)
+    InventoryItem.objects.create(user=user, ingredient=tomato, current_stock=500)
+    InventoryItem.objects.create(user=user, ingredient=basil, current_stock=0)
+    MealPlan.objects.create(user=user, recipe=recipe, date=timezone.localdate())
+    glist = GroceryList.objects.create(user=user)
+    GroceryListItem.objects.create(grocery_list=glist, ingredient=basil, total_quantity=5)
+    return {'recipe': recipe, 'ingredient': tomato}
+
+
+def _recorder(statements):
+    def record(execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith(_EXPLAINED):
+            statements.append((sql, params))
+        return execute(sql, params, many, context)
+    return record
+
+
+def check_views(checks=VIEW_CHECKS, using=DEFAULT_DB_ALIAS):
+    """
+    Run each check's view and explain its queries. Yields
+    (check, [(sql, plan, disallowed full scans)]) per check.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        raise ImproperlyConfigured("Query plans are only checked on SQLite.")
+    with transaction.atomic(using=using), override_settings(ALLOWED_HOSTS=['testserver']):
+        suffix = uuid.uuid4().hex[:12]
+        user = get_user_model().objects.create_user(f'query-plan-check-{suffix}')
+        sample = _sample_data(user, suffix)
+        client = Client()
+        client.force_login(user)
+        for check in checks:
+            statements = []
+            url = reverse(check.url_name, args=[sample[name].pk for name in check.args])
+            with connection.execute_wrapper(_recorder(statements)):
+                client.get(url, check.query)
+            report = []
+            for sql, params in statements:
+                plan = explain(sql, params, using)
+                scans = [table for table in full_scans(plan) if table not in check.full_scans_allowed]
+                report.append((sql, plan, scans))
+            yield check, report
+        transaction.set_rollback(True, using=using)
+    # The in-memory index may have loaded the rolled-back sample ingredients.
+    ingredient_index.reset()
@@ -0,0 +1,208 @@
+# core/query_stats.py
+"""
+Per-request SQL instrumentation (QueryStatsMiddleware).
+
+Every query a request sends, on any database alias, is timed through a
+connection execute wrapper. The wrapper is installed once per connection and
+reports to the QueryStats of the current request, kept in a context variable,
+so the queries an async view runs in sync_to_async threads count too. Per
+request this gives the query count, the total
+SQL time, the slowest queries and the repeated query shapes: the same SQL with
+only its parameters changing, sent QUERY_STATS_REPEAT_THRESHOLD or more times,
+is the signature of an N+1 loop.
+
+The stats are
+- attached to the request as `request.query_stats`;
+- logged as one JSON line on the `core.query_stats` logger (INFO, or WARNING
+  when the request repeats a shape or goes over its budget);
+- sent as a Server-Timing header (`db` and `app` durations, shown by browser
+  dev tools) when QUERY_STATS_SERVER_TIMING is on (default: DEBUG);
+- shown in a panel at the bottom of HTML pages when QUERY_STATS_PANEL is on
+  (default: DEBUG).
+
+QUERY_BUDGETS maps a view to the most queries a request to it may send. A URL
+name alone budgets its GET (and HEAD) requests; a (URL name, method) key
+budgets another method, e.g. ('grocery_checkout', 'POST'). Over budget is a
+logged warning, or a QueryBudgetExceeded error with QUERY_BUDGET_ENFORCE on
+(the tests turn it on with override_settings).
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import re
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.loader import render_to_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPEAT_THRESHOLD = 5
+DEFAULT_SLOWEST = 5
+
+# "IN (%s)", "IN (%s, %s, %s)" and multi-row VALUES differ only by how many parameters they carry.
+_PARAMETER_LIST = re.compile(r'\((?:\s*%s\s*,)*\s*%s\s*\)')
+_VALUES_ROWS = re.compile(r'(\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_shape(sql):
+    """`sql` with parameter lists collapsed, so the same query with more or fewer values matches."""
+    return _VALUES_ROWS.sub(r'\1', _PARAMETER_LIST.sub('(...)', sql))
+
+
+class QueryStats:
+    def __init__(self):
+        self.queries = []  # [(alias, sql, seconds)]
+        self.started = time.perf_counter()
+        self.seconds = None  # whole request, set by finish()
+
+    def __call__(self, execute, sql, params, many, context):
+        # A connection execute wrapper (see connection.execute_wrapper).
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((context['connection'].alias, sql, time.perf_counter() - start))
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def sql_seconds(self):
+        return sum(seconds for alias, sql, seconds in self.queries)
+
+    def slowest(self, n=DEFAULT_SLOWEST):
+        return sorted(self.queries, key=lambda query: query[2], reverse=True)[:n]
+
+    def repeated(self, threshold=DEFAULT_REPEAT_THRESHOLD):
+        """[(shape, times sent)] for the shapes sent at least `threshold` times, most repeated first."""
+        counts = {}
+        for alias, sql, seconds in self.queries:
+            shape = query_shape(sql)
+            counts[shape] = counts.get(shape, 0) + 1
+        return sorted(((shape, n) for shape, n in counts.items() if n >= threshold),
+                      key=lambda item: item[1], reverse=True)
+
+    def as_dict(self, threshold=DEFAULT_REPEAT_THRESHOLD):
+        return {
+            'queries': self.count,
+            'sql_ms': round(self.sql_seconds * 1000, 2),
+            'total_ms': round((self.seconds or 0) * 1000, 2),
+            'slowest': [{'alias': alias, 'sql': sql, 'ms': round(seconds * 1000, 2)}
+                        for alias, sql, seconds in self.slowest()],
+            'repeated': [{'sql': shape, 'times': n} for shape, n in self.repeated(threshold)],
+        }
+
+
+def budget_for(url_name, method='GET'):
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    if (url_name, method) in budgets:
+        return budgets[url_name, method]
+    return budgets.get(url_name) if method in ('GET', 'HEAD') else None
+
+
+# The QueryStats of the request being served; copied into sync_to_async threads with the context.
+_current = contextvars.ContextVar('query_stats', default=None)
+
+
+def _record(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+def _install(connection, **kwargs):
+    if _record not in connection.execute_wrappers:
+        # First in the list: connection.execute_wrapper() blocks pop the last one.
+        connection.execute_wrappers.insert(0, _record)
+
+
+def _install_all():
+    # Connections opened before this module was imported sent no connection_created.
+    for connection in connections.all():
+        _install(connection)
+
+
+connection_created.connect(_install)
+
+
+class QueryStatsMiddleware:
+    """Goes near the top of MIDDLEWARE, so the other middleware's queries count too."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            # Serve async requests without holding a thread (see django.utils.deprecation.MiddlewareMixin).
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        _install_all()
+        stats = request.query_stats = QueryStats()
+        token = _current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, stats)
+
+    async def __acall__(self, request):
+        await sync_to_async(_install_all)()
+        stats = request.query_stats = QueryStats()
+        token = _current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, stats)
+
+    def _finish(self, request, response, stats):
+        stats.finish()
+        threshold = getattr(settings, 'QUERY_STATS_REPEAT_THRESHOLD', DEFAULT_REPEAT_THRESHOLD)
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match else None
+        record = {'method': request.method, 'path': request.path, 'view': view,
+                  'status': response.status_code, **stats.as_dict(threshold)}
+        budget = budget_for(view, request.method)
+        over_budget = budget is not None and stats.count > budget
+        if over_budget:
+            record['budget'] = budget
+        level = logging.WARNING if over_budget or record['repeated'] else logging.INFO
+        logger.log(level, json.dumps(record), extra={'query_stats': record})
+        if over_budget and getattr(settings, 'QUERY_BUDGET_ENFORCE', False):
+            raise QueryBudgetExceeded(f"{request.method} {view} sent {stats.count} queries; its budget is {budget}.")
+
+        if getattr(settings, 'QUERY_STATS_SERVER_TIMING', settings.DEBUG):
+            response['Server-Timing'] = (f'db;dur={stats.sql_seconds * 1000:.1f};desc="{stats.count} queries", '
+                                         f'app;dur={stats.seconds * 1000:.1f}')
+        if getattr(settings, 'QUERY_STATS_PANEL', settings.DEBUG):
+            self._add_panel(request, response, record)
+        return response
+
+    def _add_panel(self, request, response, record):
+        if response.streaming or 'text/html' not in response.get('Content-Type', ''):
+            return
+        content = response.content.decode(response.charset)
+        end = content.rfind('</body>')
+        if end == -1:
+            return
+        panel = render_to_string('core/query_stats_panel.html', {'stats': record}, request=request)
+        response.content = content[:end] + panel + content[end:]
+        if response.has_header('Content-Length'):
+            response['Content-Length'] = str(len(response.content))
@@ -0,0 +1,190 @@
+# core/recipe_import.py
+"""
+Bulk import of external (Spoonacular-format) recipes.
+
+Recipes are processed in batches. Per batch, every ingredient name is matched
+against the Ingredient catalog (by normalized name) in one query and the
+missing ones are created with one bulk_create. The Recipe and RecipeIngredient
+rows are also written with bulk_create, and the derived data (search index,
+cookability index, in-memory ingredient index) is refreshed once. Amounts are converted with core.units (one
+batch call per batch, through the ingredient's density between mass and
+volume), so imported quantities are in the units the forms store.
+"""
+import hashlib
+import json
+import math
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils.html import strip_tags
+
+from . import cookability, search
+from .ingredients import resolve_ingredients
+from .models import Recipe, RecipeIngredient, normalize_ingredient_name
+from .units import convert_many, density_of, to_canonical
+
+DEFAULT_BATCH_SIZE = 500
+
+
+class RecipeImportError(ValueError):
+    pass
+
+
+def load_dump(fp):
+    """
+    Read recipes from a JSON dump: a list of recipes, {"recipes": [...]} (the
+    API's random/bulk responses), one recipe object, or one recipe per line
+    (JSON Lines). Raises RecipeImportError for anything else.
+    """
+    text = fp.read()
+    if isinstance(text, bytes):
+        try:
+            text = text.decode('utf-8')
+        except UnicodeDecodeError as e:
+            raise RecipeImportError(f"The dump is not UTF-8 text: {e}")
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        data = []
+        for number, line in enumerate(text.splitlines(), start=1):
+            if line.strip():
+                try:
+                    data.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    raise RecipeImportError(f"Line {number} is not valid JSON: {e}")
+    if isinstance(data, dict):
+        data = data.get('recipes', [data])
+    if not isinstance(data, list):
+        raise RecipeImportError("Expected a list of recipes, {\"recipes\": [...]} or one recipe per line.")
+    return data
+
+
+def _instructions(data):
+    if data.get('instructions'):
+        return strip_tags(data['instructions']).strip()
+    steps = [step.get('step', '') for block in data.get('analyzedInstructions') or []
+             for step in block.get('steps', [])]
+    return '\n'.join(steps) or data.get('sourceUrl', '')
+
+
+def _ingredient_lines(data):
+    # [(display name, quantity, unit)], preferring the metric measures when present.
+    lines = []
+    for item in data.get('extendedIngredients') or []:
+        name = ' '.join((item.get('nameClean') or item.get('name') or '').split())
+        metric = (item.get('measures') or {}).get('metric') or {}
+        amount = metric.get('amount', item.get('amount'))
+        unit = metric.get('unitShort', item.get('unit', ''))
+        try:
+            amount = float(amount)
+        except (TypeError, ValueError):
+            continue
+        if name and amount > 0:
+            lines.append((name, amount, unit))
+    return lines
+
+
+def parse_recipe(data):
+    """Return the fields of one external recipe, or None if it has no title."""
+    title = ' '.join((data.get('title') or '').split())
+    if not title:
+        return None
+    instructions = _instructions(data)
+    if data.get('id') is not None:
+        external_id = f"spoonacular:{data['id']}"
+    else:
+        digest = hashlib.sha1(f"{title}\n{instructions}".encode()).hexdigest()
+        external_id = f"sha1:{digest}"
+    return {
+        'external_id': external_id,
+        'title': title[:255],
+        'description': strip_tags(data.get('summary') or data.get('description') or '').strip(),
+        'instructions': instructions,
+        'ingredients': _ingredient_lines(data),
+    }
+
+
+def _resolve_ingredients(lines):
+    """Return ({normalized name: Ingredient}, created), creating the missing ones in canonical units."""
+    units = {}
+    for name, amount, unit in lines:
+        units.setdefault(name, to_canonical(amount, unit)[0])
+    return resolve_ingredients(units)
+
+
+@transaction.atomic
+def _import_batch(author, parsed, stats):
+    existing = set(Recipe.objects.filter(
+        author=author, external_id__in=[recipe['external_id'] for recipe in parsed]
+    ).values_list('external_id', flat=True))
+    fresh = {}
+    for recipe in parsed:
+        if recipe['external_id'] in existing or recipe['external_id'] in fresh:
+            stats['skipped'] += 1
+        else:
+            fresh[recipe['external_id']] = recipe
+    if not fresh:
+        return
+    ingredients, created = _resolve_ingredients(
+        [line for recipe in fresh.values() for line in recipe['ingredients']])
+    stats['ingredients_created'] += created
+
+    Recipe.objects.bulk_create([
+        Recipe(author=author, external_id=key, title=recipe['title'],
+               description=recipe['description'], instructions=recipe['instructions'])
+        for key, recipe in fresh.items()
+    ], ignore_conflicts=True)
+    # bulk_create does not return pks on SQLite: reload by external_id. A concurrent
+    # import may have inserted some of these first; its recipes come with their lines.
+    recipe_ids = dict(Recipe.objects.filter(author=author, external_id__in=list(fresh))
+                      .values_list('external_id', 'id'))
+    for key in set(RecipeIngredient.objects.filter(recipe_id__in=list(recipe_ids.values()))
+                   .values_list('recipe__external_id', flat=True)):
+        del recipe_ids[key]
+        del fresh[key]
+        stats['skipped'] += 1
+
+    # Convert every line of the batch into its ingredient's unit in one vectorized call.
+    lines = [(key, ingredients[normalize_ingredient_name(name)], amount, unit)
+             for key, recipe in fresh.items() for name, amount, unit in recipe['ingredients']]
+    converted = convert_many([amount for key, ingredient, amount, unit in lines],
+                             [unit for key, ingredient, amount, unit in lines],
+                             [ingredient.measurement_unit for key, ingredient, amount, unit in lines],
+                             [density_of(ingredient) for key, ingredient, amount, unit in lines])
+    quantities = defaultdict(float)
+    for (key, ingredient, amount, unit), quantity in zip(lines, converted):
+        if math.isnan(quantity):
+            # e.g. a volume for an ingredient kept by weight whose density is unknown.
+            stats['lines_skipped'] += 1
+            continue
+        quantities[key, ingredient.id] += float(quantity)
+    rows = [RecipeIngredient(recipe_id=recipe_ids[key], ingredient_id=ingredient_id, quantity=quantity)
+            for (key, ingredient_id), quantity in quantities.items()]
+    RecipeIngredient.objects.bulk_create(rows, batch_size=DEFAULT_BATCH_SIZE)
+    stats['created'] += len(recipe_ids)
+
+    # Bulk writes bypass the Recipe/RecipeIngredient signals; refresh derived data once.
+    search.index_recipes(recipe_ids.values())
+    cookability.refresh_for_recipes(recipe_ids.values())
+
+
+def import_recipes(author, recipes, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Import external recipe dicts (an iterable; consumed batch by batch) for `author`.
+    Recipes already imported for that author are skipped. Returns counts:
+    {'created', 'skipped', 'invalid', 'ingredients_created', 'lines_skipped'}.
+    """
+    stats = dict.fromkeys(['created', 'skipped', 'invalid', 'ingredients_created', 'lines_skipped'], 0)
+    batch = []
+    for data in recipes:
+        recipe = parse_recipe(data) if isinstance(data, dict) else None
+        if recipe is None:
+            stats['invalid'] += 1
+            continue
+        batch.append(recipe)
+        if len(batch) >= batch_size:
+            _import_batch(author, batch, stats)
+            batch = []
+    if batch:
+        _import_batch(author, batch, stats)
+    return stats
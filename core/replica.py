@@ -0,0 +1,153 @@
+# core/replica.py
+"""
+Read replica routing: the read-only views read from the `replica` database,
+everything else stays on the primary (`default`).
+
+ReplicaMiddleware marks a request as replica-eligible when its view is in
+REPLICA_READ_VIEWS; ReplicaRouter then sends that request's reads to the
+replica until something writes. A write goes to the primary, makes the rest of
+the request read from the primary too, and sticks the session to the primary
+for REPLICA_STICKY_SECONDS, so a user sees their own changes even while the
+replica lags. Requests outside the middleware (commands, tests, signals run
+from them) never use the replica.
+
+Locally the replica is a second SQLite file, a copy of the primary taken with
+SQLite's online backup API by refresh_replica() (`manage.py refresh_replica`).
+Without a `replica` database configured, every read goes to the primary.
+"""
+import asyncio
+import contextvars
+import sqlite3
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.transaction import TransactionManagementError
+
+REPLICA_DB = 'replica'
+DEFAULT_READ_VIEWS = ('recipe_list', 'recipe_detail', 'ingredient_list', 'external_recipe_search')
+DEFAULT_STICKY_SECONDS = 30
+STICKY_SESSION_KEY = '_replica_primary_until'
+
+
+class _Routing:
+    __slots__ = ('use_replica', 'wrote')
+
+    def __init__(self):
+        self.use_replica = False
+        self.wrote = False
+
+
+# One _Routing per request; the object is shared with the threads async views
+# run their database code in, so a write there is seen by the middleware.
+_routing = contextvars.ContextVar('replica_routing', default=None)
+
+
+def replica_configured():
+    return REPLICA_DB in connections
+
+
+def read_views():
+    return frozenset(getattr(settings, 'REPLICA_READ_VIEWS', DEFAULT_READ_VIEWS))
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if routing is None or not routing.use_replica or routing.wrote:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None  # read inside a write transaction: read what it wrote
+        return REPLICA_DB
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both databases hold the same rows.
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA_DB}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema with the data, from refresh_replica().
+        return False if db == REPLICA_DB else None
+
+
+class ReplicaMiddleware:
+    """Goes after SessionMiddleware: stickiness is kept in the session."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            # Serve async requests without holding a thread (see django.utils.deprecation.MiddlewareMixin).
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        routing = _Routing()
+        token = _routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        self._stick(request, routing)
+        return response
+
+    async def __acall__(self, request):
+        routing = _Routing()
+        token = _routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        if routing.wrote:
+            await sync_to_async(self._stick)(request, routing)  # may load the session
+        return response
+
+    def _stick(self, request, routing):
+        if routing.wrote and replica_configured() and hasattr(request, 'session'):
+            request.session[STICKY_SESSION_KEY] = time.time() + getattr(
+                settings, 'REPLICA_STICKY_SECONDS', DEFAULT_STICKY_SECONDS)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = _routing.get()
+        if routing is None or not replica_configured():
+            return None
+        if request.resolver_match.url_name not in read_views():
+            return None
+        session = getattr(request, 'session', None)
+        if session is not None and session.get(STICKY_SESSION_KEY, 0) > time.time():
+            return None
+        routing.use_replica = True
+        return None
+
+
+def refresh_replica(using=DEFAULT_DB_ALIAS, replica=REPLICA_DB):
+    """
+    Copy the primary SQLite database over the replica file with the online
+    backup API (readers of the primary are not blocked). Returns the seconds taken.
+    """
+    source, target = connections[using], connections[replica]
+    if source.vendor != 'sqlite' or target.vendor != 'sqlite':
+        raise ImproperlyConfigured("refresh_replica copies SQLite databases only.")
+    if source.in_atomic_block:
+        # The backup would wait for the open transaction forever.
+        raise TransactionManagementError("refresh_replica() copies committed data; call it outside a transaction.")
+    started = time.monotonic()
+    source.ensure_connection()
+    # The copy is one transaction on the replica: its readers see the old or the new data.
+    destination = sqlite3.connect(str(target.settings_dict['NAME']))
+    try:
+        source.connection.backup(destination)
+    finally:
+        destination.close()
+    return time.monotonic() - started
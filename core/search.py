@@ -0,0 +1,139 @@
+# core/search.py
+import re
+
+from django.db import connections, router
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Recipe
+
+FTS_TABLE = 'core_recipe_fts'
+
+# Column weights for bm25(): title, description, instructions, ingredients.
+# (bm25 returns lower-is-better scores, so results are ordered ascending.)
+FTS_WEIGHTS = (10.0, 2.0, 1.0, 5.0)
+
+# Rebuilds the FTS rows of the recipes selected by the WHERE clause appended to it.
+_INDEX_SQL = f"""
+    INSERT INTO {FTS_TABLE} (rowid, title, description, instructions, ingredients)
+    SELECT r.id, r.title, r.description, r.instructions,
+           COALESCE((SELECT group_concat(i.name, ' ')
+                     FROM core_recipeingredient ri
+                     JOIN core_ingredient i ON i.id = ri.ingredient_id
+                     WHERE ri.recipe_id = r.id), '')
+    FROM core_recipe r
+"""
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_fts_tables = {}
+
+
+def _write_connection():
+    # Index maintenance only: routing a read through db_for_write counts as a
+    # write (see ReplicaRouter) and pins the request to the primary.
+    return connections[router.db_for_write(Recipe)]
+
+
+def fts_enabled(connection=None):
+    """True when the FTS5 table exists on this connection (SQLite with FTS5 compiled in)."""
+    connection = connection or connections[router.db_for_read(Recipe)]
+    if connection.vendor != 'sqlite':
+        return False
+    key = (connection.alias, connection.settings_dict['NAME'])
+    if key not in _fts_tables:
+        _fts_tables[key] = FTS_TABLE in connection.introspection.table_names()
+    return _fts_tables[key]
+
+
+def fts_query(query):
+    """
+    Turn free user input into a safe FTS5 expression: every word becomes a
+    quoted prefix term and all terms must match.
+    """
+    return ' '.join(f'"{token}"*' for token in _TOKEN_RE.findall(query))
+
+
+def index_recipes(recipe_ids):
+    """(Re)index the given recipes. Recipes that no longer exist are simply removed."""
+    recipe_ids = list(recipe_ids)
+    connection = _write_connection()
+    if not recipe_ids or not fts_enabled(connection):
+        return
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", recipe_ids)
+        cursor.execute(f"{_INDEX_SQL} WHERE r.id IN ({placeholders})", recipe_ids)
+
+
+def remove_recipes(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    connection = _write_connection()
+    if not recipe_ids or not fts_enabled(connection):
+        return
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", recipe_ids)
+
+
+def rebuild_index():
+    """Repopulate the whole FTS table from core_recipe; returns False if FTS is unavailable."""
+    connection = _write_connection()
+    if not fts_enabled(connection):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(_INDEX_SQL)
+    return True
+
+
+def _fallback_filter(query):
+    q = Q()
+    for token in _TOKEN_RE.findall(query):
+        q &= (Q(title__icontains=token) | Q(description__icontains=token) |
+              Q(instructions__icontains=token) | Q(recipeingredient__ingredient__name__icontains=token))
+    return q
+
+
+def matching_recipes(query, recipes=None):
+    """Return `recipes` (default: all) restricted to those matching `query`, unordered."""
+    if recipes is None:
+        recipes = Recipe.objects.all()
+    expression = fts_query(query)
+    if not expression:
+        return recipes.none()
+    # The FTS subquery runs on the database the queryset reads from.
+    if fts_enabled(connections[recipes.db]):
+        return recipes.filter(id__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [expression]
+        ))
+    matching_ids = Recipe.objects.filter(_fallback_filter(query)).values('id')
+    return recipes.filter(id__in=matching_ids)
+
+
+def search_recipes(query, recipes=None):
+    """
+    Return `recipes` (default: all) matching `query`, best match first, as a lazy
+    queryset: the ranking is done by the database, so slicing it (one page)
+    loads only that page. Uses bm25 ranking over title, description,
+    instructions and ingredient names when FTS5 is available, otherwise title
+    matches rank above other matches.
+    """
+    if recipes is None:
+        recipes = Recipe.objects.all()
+    expression = fts_query(query)
+    if not expression:
+        return recipes.none()
+    if not fts_enabled(connections[recipes.db]):
+        title_rank = Case(When(title__icontains=query, then=Value(0)), default=Value(1),
+                          output_field=IntegerField())
+        return (matching_recipes(query, recipes)
+                .annotate(title_rank=title_rank).order_by('title_rank', '-created_at'))
+    # A join, not a correlated RawSQL subquery: that would run the MATCH again for every matching recipe.
+    weights = ', '.join(str(w) for w in FTS_WEIGHTS)
+    return recipes.extra(
+        select={'rank': f"bm25({FTS_TABLE}, {weights})"},
+        tables=[FTS_TABLE],
+        where=[f"{FTS_TABLE}.rowid = {Recipe._meta.db_table}.id", f"{FTS_TABLE} MATCH %s"],
+        params=[expression],
+    ).order_by('rank', '-created_at')
@@ -0,0 +1,85 @@
+# core/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cookability, grocery, ingredient_index, search
+from .models import Ingredient, InventoryItem, MealPlan, Recipe, RecipeIngredient, normalize_ingredient_name
+
+
+# Deletes are applied after the surrounding transaction commits: during a cascade
+# (e.g. deleting a Recipe or a User) the rows being refreshed may be about to go away.
+
+@receiver(post_save, sender=InventoryItem)
+def inventory_saved(sender, instance, **kwargs):
+    cookability.refresh_for_ingredients(instance.user_id, [instance.ingredient_id])
+
+
+@receiver(post_delete, sender=InventoryItem)
+def inventory_deleted(sender, instance, **kwargs):
+    user_id, ingredient_id = instance.user_id, instance.ingredient_id
+    transaction.on_commit(lambda: cookability.refresh_for_ingredients(user_id, [ingredient_id]))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, **kwargs):
+    if created:
+        cookability.refresh_for_recipe(instance.id)
+    search.index_recipes([instance.id])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    search.remove_recipes([instance.id])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(sender, instance, **kwargs):
+    cookability.refresh_for_recipe(instance.recipe_id)
+    search.index_recipes([instance.recipe_id])
+    grocery.refresh_demand_for_recipe(instance.recipe_id)
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_deleted(sender, instance, **kwargs):
+    recipe_id = instance.recipe_id
+
+    def refresh():
+        cookability.refresh_for_recipe(recipe_id)
+        search.index_recipes([recipe_id])
+        grocery.refresh_demand_for_recipe(recipe_id)
+    transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=MealPlan)
+def meal_plan_saved(sender, instance, **kwargs):
+    grocery.refresh_demand(instance.user_id, [instance.date])
+
+
+@receiver(post_delete, sender=MealPlan)
+def meal_plan_deleted(sender, instance, **kwargs):
+    user_id, day = instance.user_id, instance.date
+    transaction.on_commit(lambda: grocery.refresh_demand(user_id, [day]))
+
+
+@receiver(pre_save, sender=Ingredient)
+def ingredient_normalize(sender, instance, **kwargs):
+    # Also runs for fixtures (loaddata saves raw, skipping Model.save()).
+    instance.normalized_name = normalize_ingredient_name(instance.name)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, **kwargs):
+    # A renamed ingredient changes the searchable text of every recipe using it.
+    if not created:
+        search.index_recipes(
+            RecipeIngredient.objects.filter(ingredient=instance).values_list('recipe_id', flat=True)
+        )
+    # The in-memory lookup index must not see rows that get rolled back.
+    transaction.on_commit(lambda: ingredient_index.ingredient_saved(instance))
+
+
+@receiver(post_delete, sender=Ingredient)
+def ingredient_deleted(sender, instance, **kwargs):
+    ingredient_id = instance.id
+    transaction.on_commit(lambda: ingredient_index.ingredient_deleted(ingredient_id))
@@ -0,0 +1,335 @@
+# core/spoonacular.py
+"""
+Client for the Spoonacular recipe API.
+
+One process-wide client holds a pooled requests.Session, so connections are
+reused across requests, and every call is bounded by connect/read timeouts.
+Responses are kept in a TTL+LRU cache keyed by the normalized request, and
+identical requests that are already in flight wait for the first one instead
+of hitting the API again. SPOONACULAR_BASE_URL can point the client at the
+local stub (core/spoonacular_stub.py) for offline tests and benchmarks.
+
+Async views use AsyncSpoonacularClient, which shares that cache and those
+counters. It talks to the API through httpx (in requirements.txt) on the
+event loop. Where httpx is not installed, upstream calls fall back to the
+blocking client on a thread pool as large as the concurrency limit, so they
+still never block the loop.
+"""
+import asyncio
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+DEFAULT_BASE_URL = 'https://api.spoonacular.com'
+DEFAULT_TIMEOUT = (3.05, 10)    # (connect, read) seconds
+DEFAULT_CACHE_TTL = 600         # seconds
+DEFAULT_CACHE_SIZE = 256        # responses
+DEFAULT_POOL_SIZE = 10          # connections kept open to the API
+DEFAULT_MAX_CONCURRENCY = 100   # upstream calls in flight per event loop (async client)
+
+_MISSING = object()
+
+
+class SpoonacularError(Exception):
+    """The API could not be reached, timed out, or answered with an error status."""
+
+
+def normalize_query(query):
+    return ' '.join(query.lower().split())
+
+
+def _cache_key(path, params):
+    return path, tuple(sorted(params.items()))
+
+
+def _search_params(query, number):
+    return {'query': normalize_query(query), 'number': number}
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire `ttl` seconds after being stored."""
+
+    def __init__(self, maxsize, ttl, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()  # key -> (expires at, value)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= self._clock():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (self._clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class _Call:
+    # A request in flight that identical requests wait on.
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SpoonacularClient:
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, timeout=DEFAULT_TIMEOUT,
+                 cache_ttl=DEFAULT_CACHE_TTL, cache_size=DEFAULT_CACHE_SIZE, pool_size=DEFAULT_POOL_SIZE):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cache = TTLCache(cache_size, cache_ttl)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'errors': 0, 'latency': 0.0}
+
+    def close(self):
+        self.session.close()
+
+    def stats(self):
+        """Counters: cache hits and misses, coalesced waits, errors, and upstream latency (seconds)."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['avg_latency'] = stats['latency'] / stats['misses'] if stats['misses'] else 0.0
+        return stats
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def search_recipes(self, query, number=10):
+        """Return the `results` list of /recipes/complexSearch for `query`."""
+        params = _search_params(query, number)
+        if not params['query']:
+            return []
+        return self.get_json('/recipes/complexSearch', params).get('results', [])
+
+    def recipe_information(self, ids):
+        """Return full recipes (ingredients included) for many ids in one /recipes/informationBulk call."""
+        ids = sorted({int(i) for i in ids})
+        if not ids:
+            return []
+        return self.get_json('/recipes/informationBulk', {'ids': ','.join(map(str, ids))})
+
+    def get_json(self, path, params):
+        """GET `path` with `params` (the API key is added), served from the cache when possible."""
+        key = _cache_key(path, params)
+        with self._lock:
+            cached = self.cache.get(key, _MISSING)
+            if cached is not _MISSING:
+                self._stats['hits'] += 1
+                return cached
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+        if not leader:
+            self._count('coalesced')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = self._fetch(path, params)
+            self.cache.set(key, call.result)
+            return call.result
+        except Exception as e:
+            # Whatever the leader's call raised, the waiters raise too (not a silent None).
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.done.set()
+
+    def _fetch(self, path, params):
+        self._count('misses')
+        started = time.monotonic()
+        try:
+            response = self.session.get(f"{self.base_url}{path}", params={**params, 'apiKey': self.api_key},
+                                        timeout=self.timeout)
+        except requests.Timeout:
+            self._count('errors')
+            raise SpoonacularError("The recipe service timed out.")
+        except requests.RequestException as e:
+            self._count('errors')
+            raise SpoonacularError(f"Could not reach the recipe service: {e}")
+        finally:
+            self._count('latency', time.monotonic() - started)
+        return self._parse(response)
+
+    def _parse(self, response):
+        # Works for both requests and httpx responses.
+        if response.status_code != 200:
+            self._count('errors')
+            raise SpoonacularError(f"API returned status code {response.status_code}")
+        try:
+            return response.json()
+        except ValueError:
+            self._count('errors')
+            raise SpoonacularError("The recipe service returned invalid JSON.")
+
+
+class AsyncSpoonacularClient:
+    """
+    Asyncio front end to a SpoonacularClient, for one event loop: cache hits are
+    answered without leaving the loop, identical misses share one upstream call,
+    and at most `max_concurrency` upstream calls are in flight at once.
+    """
+
+    def __init__(self, client, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        self.client = client
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._inflight = {}
+        self._http = None
+        if httpx is not None:
+            connect, read = client.timeout
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(read, connect=connect),
+                limits=httpx.Limits(max_connections=max_concurrency),
+            )
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+
+    async def search_recipes(self, query, number=10):
+        params = _search_params(query, number)
+        if not params['query']:
+            return []
+        return (await self.get_json('/recipes/complexSearch', params)).get('results', [])
+
+    async def get_json(self, path, params):
+        key = _cache_key(path, params)
+        cached = self.client.cache.get(key, _MISSING)
+        if cached is not _MISSING:
+            self.client._count('hits')
+            return cached
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._fetch_and_cache(key, path, params))
+            task.add_done_callback(lambda done: self._inflight.pop(key, None))
+        else:
+            self.client._count('coalesced')
+        # shield: a caller that goes away must not cancel the call others are waiting on.
+        return await asyncio.shield(task)
+
+    async def _fetch_and_cache(self, key, path, params):
+        async with self._semaphore:
+            if self._http is None:
+                result = await asyncio.get_running_loop().run_in_executor(
+                    _get_executor(), self.client._fetch, path, params)
+            else:
+                result = await self._fetch(path, params)
+        self.client.cache.set(key, result)
+        return result
+
+    async def _fetch(self, path, params):
+        client = self.client
+        client._count('misses')
+        started = time.monotonic()
+        try:
+            response = await self._http.get(f"{client.base_url}{path}", params={**params, 'apiKey': client.api_key})
+        except httpx.TimeoutException:
+            client._count('errors')
+            raise SpoonacularError("The recipe service timed out.")
+        except httpx.HTTPError as e:
+            client._count('errors')
+            raise SpoonacularError(f"Could not reach the recipe service: {e}")
+        finally:
+            client._count('latency', time.monotonic() - started)
+        return client._parse(response)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide client, configured from settings on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SpoonacularClient(
+                    settings.SPOONACULAR_API_KEY,
+                    base_url=getattr(settings, 'SPOONACULAR_BASE_URL', DEFAULT_BASE_URL),
+                    timeout=getattr(settings, 'SPOONACULAR_TIMEOUT', DEFAULT_TIMEOUT),
+                    cache_ttl=getattr(settings, 'SPOONACULAR_CACHE_TTL', DEFAULT_CACHE_TTL),
+                    cache_size=getattr(settings, 'SPOONACULAR_CACHE_SIZE', DEFAULT_CACHE_SIZE),
+                    pool_size=getattr(settings, 'SPOONACULAR_POOL_SIZE', DEFAULT_POOL_SIZE),
+                )
+    return _client
+
+
+# One async client per event loop: asyncio primitives and httpx connections are loop-bound.
+_async_clients = weakref.WeakKeyDictionary()
+# Without httpx, upstream calls of every loop share one thread pool.
+_executor = None
+
+
+def _max_concurrency():
+    return getattr(settings, 'SPOONACULAR_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _client_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(_max_concurrency(), thread_name_prefix='spoonacular')
+    return _executor
+
+
+def get_async_client():
+    """Return the async client of the running event loop, sharing get_client()'s cache."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncSpoonacularClient(get_client(), _max_concurrency())
+    return client
+
+
+def reset_client():
+    """Close and forget the clients; the next get_client() call re-reads settings."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+        _async_clients.clear()
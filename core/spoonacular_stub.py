@@ -0,0 +1,123 @@
+# core/spoonacular_stub.py
+"""
+A tiny local stand-in for the Spoonacular API, so tests and benchmarks run offline.
+
+    with StubServer(delay=0.05) as stub:
+        client = SpoonacularClient('key', base_url=stub.url)
+
+It serves /recipes/complexSearch from RECIPES (case-insensitive title match)
+and /recipes/informationBulk with a few made-up ingredients per recipe,
+counts the requests it receives and can delay each response.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+RECIPES = [
+    {'id': 716429, 'title': 'Pasta with Garlic, Scallions, Cauliflower & Breadcrumbs', 'image': ''},
+    {'id': 715538, 'title': 'Bruschetta Style Pork & Pasta', 'image': ''},
+    {'id': 715495, 'title': 'Turkey Tomato Cheese Pizza', 'image': ''},
+    {'id': 716406, 'title': 'Asparagus and Pea Soup', 'image': ''},
+    {'id': 644387, 'title': 'Garlicky Kale', 'image': ''},
+    {'id': 782601, 'title': 'Red Kidney Bean Jambalaya', 'image': ''},
+    {'id': 795751, 'title': 'Chicken Fajita Stuffed Bell Pepper', 'image': ''},
+    {'id': 766453, 'title': 'Hummus and Za\'atar', 'image': ''},
+    {'id': 716627, 'title': 'Easy Homemade Rice and Beans', 'image': ''},
+    {'id': 632660, 'title': 'Apricot Glazed Apple Tart', 'image': ''},
+]
+
+
+INGREDIENTS = [
+    ('garlic', 3, 'cloves'), ('olive oil', 2, 'tbsp'), ('salt', 1, 'tsp'),
+    ('pasta', 8, 'oz'), ('tomatoes', 400, 'g'), ('milk', 1, 'cup'),
+]
+
+
+def recipe_information(recipe):
+    """The stub's /recipes/{id}/information payload for one of RECIPES."""
+    picked = [INGREDIENTS[(recipe['id'] + n) % len(INGREDIENTS)] for n in range(3)]
+    return {
+        **recipe,
+        'summary': f"<b>{recipe['title']}</b> from the stub.",
+        'instructions': '<ol><li>Combine everything.</li><li>Cook.</li></ol>',
+        'extendedIngredients': [{'name': name, 'amount': amount, 'unit': unit} for name, amount, unit in picked],
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        stub = self.server.stub
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        with stub.lock:
+            stub.requests.append((url.path, params))
+        if stub.delay:
+            time.sleep(stub.delay)
+        if stub.status != 200:
+            return self._send(stub.status, {'status': 'failure'})
+        if url.path == '/recipes/informationBulk':
+            ids = {int(i) for i in params.get('ids', '').split(',') if i.strip().isdigit()}
+            return self._send(200, [recipe_information(r) for r in RECIPES if r['id'] in ids])
+        if url.path != '/recipes/complexSearch':
+            return self._send(404, {'status': 'failure', 'message': 'Not found'})
+        query = params.get('query', '').lower()
+        results = [recipe for recipe in RECIPES if query in recipe['title'].lower()]
+        results = results[:int(params.get('number', 10))]
+        self._send(200, {'results': results, 'offset': 0, 'number': len(results), 'totalResults': len(results)})
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client timed out and hung up
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # benchmarks open hundreds of connections at once
+
+
+class StubServer:
+    """Runs the stub on 127.0.0.1 in a background thread; usable as a context manager."""
+
+    def __init__(self, port=0, delay=0.0, status=200):
+        self.delay = delay
+        self.status = status
+        self.requests = []
+        self.lock = threading.Lock()
+        self._server = _Server(('127.0.0.1', port), _Handler)
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
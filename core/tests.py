@@ -1,3 +1,1334 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.contrib.messages import get_messages
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.forms import inlineformset_factory
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+
+from . import (catalog_ingest, cookability, flush, grocery, ingredient_index, ingredient_usage, inventory,
+               meal_plans, query_plans, query_stats, recipe_import, replica, search, spoonacular, units, views)
+from .cookability import missing_ingredients, sufficient_recipe_ids
+from .forms import (AddNewIngredientForm, BaseRecipeIngredientInlineFormSet, IngredientAutocompleteWidget,
+                    InventoryItemForm, RecipeIngredientForm)
+from .ingredients import resolve_ingredients
+from .spoonacular_stub import StubServer
+from .models import (GroceryList, GroceryListItem, Ingredient, InventoryItem, MealPlan, Recipe, RecipeCookability,
+                     RecipeIngredient, StockMovement)
+
+
+_query_stats_logger = logging.getLogger('core.query_stats')
+_query_stats_logging = None
+
+
+def setUpModule():
+    # Keep the per-request SQL log lines (core/query_stats.py) out of the test output;
+    # assertLogs still captures them.
+    global _query_stats_logging
+    _query_stats_logging = _query_stats_logger.handlers, _query_stats_logger.propagate
+    _query_stats_logger.handlers, _query_stats_logger.propagate = [logging.NullHandler()], False
+
+
+def tearDownModule():
+    _query_stats_logger.handlers, _query_stats_logger.propagate = _query_stats_logging
+
+
+class CookabilityTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook', password='pw')
+        self.flour = Ingredient.objects.create(name='Flour', measurement_unit='g')
+        self.egg = Ingredient.objects.create(name='Egg', measurement_unit='pieces')
+        self.bread = Recipe.objects.create(title='Bread', instructions='Bake.', author=self.user)
+        self.omelette = Recipe.objects.create(title='Omelette', instructions='Fry.', author=self.user)
+        RecipeIngredient.objects.create(recipe=self.bread, ingredient=self.flour, quantity=500)
+        RecipeIngredient.objects.create(recipe=self.omelette, ingredient=self.egg, quantity=3)
+        InventoryItem.objects.create(user=self.user, ingredient=self.flour, current_stock=600)
+        InventoryItem.objects.create(user=self.user, ingredient=self.egg, current_stock=2)
+
+    def test_sufficient_recipe_ids(self):
+        self.assertEqual(sufficient_recipe_ids(self.user), {self.bread.id})
+
+    def test_missing_ingredients(self):
+        self.assertEqual(missing_ingredients(self.user, self.bread), {})
+        self.assertEqual(missing_ingredients(self.user, self.omelette), {self.egg: 1})
+
+    def test_recipe_list_query_count_is_constant(self):
+        self.client.login(username='cook', password='pw')
+        url = reverse('recipe_list')
+        self.client.get(url)
+        # session + user + count + page of recipes + index read, regardless of recipe count
+        with self.assertNumQueries(5):
+            self.client.get(url)
+        for i in range(20):
+            recipe = Recipe.objects.create(title=f'Extra {i}', instructions='-', author=self.user)
+            RecipeIngredient.objects.create(recipe=recipe, ingredient=self.flour, quantity=i + 1)
+            RecipeIngredient.objects.create(recipe=recipe, ingredient=self.egg, quantity=1)
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['sufficient_recipe_ids']), 21)
+
+
+class CookabilityIndexTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook', password='pw')
+        self.flour = Ingredient.objects.create(name='Flour', measurement_unit='g')
+        self.egg = Ingredient.objects.create(name='Egg', measurement_unit='pieces')
+        self.bread = Recipe.objects.create(title='Bread', instructions='Bake.', author=self.user)
+        RecipeIngredient.objects.create(recipe=self.bread, ingredient=self.flour, quantity=500)
+        self.stock = InventoryItem.objects.create(user=self.user, ingredient=self.flour, current_stock=100)
+        cookability.rebuild_index(self.user)
+
+    def missing_count(self, recipe):
+        return RecipeCookability.objects.get(user=self.user, recipe=recipe).missing_count
+
+    def test_inventory_change_updates_index(self):
+        self.assertEqual(self.missing_count(self.bread), 1)
+        self.stock.current_stock = 500
+        self.stock.save()
+        self.assertEqual(self.missing_count(self.bread), 0)
+
+    def test_recipe_changes_update_index(self):
+        omelette = Recipe.objects.create(title='Omelette', instructions='Fry.', author=self.user)
+        self.assertEqual(self.missing_count(omelette), 0)
+        RecipeIngredient.objects.create(recipe=omelette, ingredient=self.egg, quantity=2)
+        self.assertEqual(self.missing_count(omelette), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeIngredient.objects.filter(recipe=omelette).get().delete()
+        self.assertEqual(self.missing_count(omelette), 0)
+        self.assertEqual(cookability.check_index(self.user), [])
+
+    def test_recipe_edits_write_only_the_rows_that_change(self):
+        guests = [User.objects.create_user(f'guest{n}') for n in range(20)]
+        for guest in guests:
+            cookability.rebuild_index(guest)
+        InventoryItem.objects.create(user=guests[0], ingredient=self.egg, current_stock=5)
+        line = RecipeIngredient.objects.create(recipe=self.bread, ingredient=self.egg, quantity=2)
+        RecipeIngredient.objects.filter(pk=line.pk).update(quantity=6)  # no signal
+        with CaptureQueriesContext(connection) as queries:
+            cookability.refresh_for_recipe(self.bread.id)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT changes()')
+            self.assertEqual(cursor.fetchone()[0], 1)  # only guests[0] is now short of eggs
+        self.assertLessEqual(len(queries), 6)
+        for user in [self.user] + guests:
+            self.assertEqual(cookability.check_index(user), [])
+
+    def test_check_index_reports_drift(self):
+        RecipeCookability.objects.filter(user=self.user).update(missing_count=0)
+        self.assertEqual(cookability.check_index(self.user), [(self.bread.id, 0, 1)])
+
+
+class RecipeSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook', password='pw')
+        self.basil = Ingredient.objects.create(name='Basil', measurement_unit='g')
+        self.pesto = Recipe.objects.create(title='Pesto', description='Green sauce',
+                                           instructions='Blend everything.', author=self.user)
+        self.salad = Recipe.objects.create(title='Tomato salad', instructions='Top with pesto.',
+                                           author=self.user)
+        RecipeIngredient.objects.create(recipe=self.pesto, ingredient=self.basil, quantity=50)
+
+    def test_fts_table_exists(self):
+        self.assertTrue(search.fts_enabled())
+
+    def test_ranked_results(self):
+        self.assertEqual(list(search.search_recipes('pesto')), [self.pesto, self.salad])
+        self.assertEqual(list(search.search_recipes('gre')), [self.pesto])
+
+    def test_ranked_in_sql_one_page_at_a_time(self):
+        Recipe.objects.bulk_create([Recipe(title=f'Pesto {n}', instructions='-', author=self.user)
+                                    for n in range(views.RECIPES_PER_PAGE + 5)])
+        search.rebuild_index()  # bulk_create sends no signals
+        with CaptureQueriesContext(connection) as queries:
+            page = list(search.search_recipes('pesto')[:views.RECIPES_PER_PAGE])
+        self.assertEqual(len(queries), 1)
+        self.assertIn('bm25', queries[0]['sql'])
+        self.assertIn(f'LIMIT {views.RECIPES_PER_PAGE}', queries[0]['sql'])
+        self.assertNotIn(self.salad, page)
+        response = self.client.get(reverse('recipe_list'), {'q': 'pesto', 'page': 2})
+        self.assertEqual(response.context['recipes'][-1], self.salad)
+        self.assertEqual(len(response.context['recipes']), 7)
+
+    def test_ingredient_names_are_searchable_and_kept_in_sync(self):
+        self.assertEqual(list(search.search_recipes('basil')), [self.pesto])
+        self.basil.name = 'Genovese basil'
+        self.basil.save()
+        self.assertEqual(list(search.search_recipes('genovese')), [self.pesto])
+
+    def test_icontains_fallback(self):
+        with mock.patch('core.search.fts_enabled', return_value=False):
+            self.assertEqual(list(search.search_recipes('pesto')), [self.pesto, self.salad])
+            self.assertEqual(list(search.search_recipes('basil')), [self.pesto])
+
+
+class IngredientIndexTests(TestCase):
+    def setUp(self):
+        ingredient_index.reset()
+        self.addCleanup(ingredient_index.reset)
+        self.user = User.objects.create_user('cook', password='pw')
+        for name in ['Sea Salt', 'Salted Butter', 'Basalt Pepper', 'Sage']:
+            Ingredient.objects.create(name=name, measurement_unit='g')
+
+    def names(self, query):
+        index = ingredient_index.get_index()
+        return [index.get(i)[0] for i in index.search(query)]
+
+    def test_search_orders_prefix_then_word_then_substring(self):
+        self.assertEqual(self.names('salt'), ['Salted Butter', 'Sea Salt', 'Basalt Pepper'])
+        self.assertEqual(self.names('sa'), ['Sage', 'Salted Butter', 'Sea Salt'])
+        self.assertEqual(self.names('xyz'), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        ingredient_index.get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            sage = Ingredient.objects.get(name='Sage')
+            sage.name = 'Rock Salt'
+            sage.save()
+        self.assertIn('Rock Salt', self.names('salt'))
+        self.assertEqual(self.names('sage'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.get(name='Sea Salt').delete()
+        self.assertNotIn('Sea Salt', self.names('salt'))
+
+    def test_index_picks_up_changes_made_by_other_processes(self):
+        # bulk_create and update() send no signals, like writes from another process.
+        index = ingredient_index.get_index()
+        Ingredient.objects.bulk_create([Ingredient(name='Smoked Salt')])
+        with self.assertNumQueries(0):
+            self.assertNotIn('Smoked Salt', self.names('salt'))  # checked at most every few seconds
+        with override_settings(INGREDIENT_INDEX_CHECK_SECONDS=0):
+            self.assertIn('Smoked Salt', self.names('salt'))
+            rebuilt = ingredient_index.get_index()
+            self.assertIsNot(rebuilt, index)
+            with self.assertNumQueries(1):
+                self.assertIs(ingredient_index.get_index(), rebuilt)
+            Ingredient.objects.filter(name='Sage').update(name='Sage Salt')
+            self.assertNotIn('Sage Salt', self.names('salt'))  # same count and highest id
+        with override_settings(INGREDIENT_INDEX_MAX_AGE=0):
+            self.assertIn('Sage Salt', self.names('salt'))
+
+    def test_autocomplete_endpoint_paginates_without_queries(self):
+        url = reverse('ingredient_autocomplete')
+        ingredient_index.get_index()
+        with self.assertNumQueries(0):
+            data = self.client.get(url, {'q': 'salt', 'page_size': 2}).json()
+        self.assertEqual(data['total'], 3)
+        self.assertTrue(data['has_next'])
+        self.assertEqual([r['name'] for r in data['results']], ['Salted Butter', 'Sea Salt'])
+        data = self.client.get(url, {'q': 'salt', 'page_size': 2, 'page': 2}).json()
+        self.assertEqual([r['name'] for r in data['results']], ['Basalt Pepper'])
+        self.assertFalse(data['has_next'])
+        self.assertEqual(self.client.get(url, {'q': 'salt', 'page': 'x'}).status_code, 400)
+
+
+class IngredientNameTests(TestCase):
+    def test_names_differing_in_case_or_spacing_are_one_ingredient(self):
+        salt = Ingredient.objects.create(name='Sea Salt', measurement_unit='g')
+        self.assertEqual(salt.normalized_name, 'sea salt')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Ingredient.objects.create(name=' sea  SALT', measurement_unit='g')
+        user = User.objects.create_user('cook', password='pw')
+        form = AddNewIngredientForm({'name': 'SEA salt', 'measurement_unit': 'kg', 'current_stock': 1})
+        self.assertTrue(form.is_valid(), form.errors)
+        item = form.save(commit=False)
+        item.user = user
+        item.save()
+        self.assertEqual(item.ingredient, salt)
+        self.assertEqual(Ingredient.objects.count(), 1)
+
+    def test_resolve_ingredients_uses_fixed_queries(self):
+        salt = Ingredient.objects.create(name='Sea Salt', measurement_unit='g')
+        names = {'sea salt': 'ml', 'Olive  Oil': 'ml', 'olive oil': 'g', 'Eggs': 'pieces'}
+        with self.assertNumQueries(3):  # lookup, insert, reload
+            resolved, created = resolve_ingredients(names)
+        self.assertEqual(created, 2)
+        self.assertEqual(resolved['sea salt'], salt)
+        self.assertEqual((resolved['olive oil'].name, resolved['olive oil'].measurement_unit), ('Olive Oil', 'ml'))
+        with self.assertNumQueries(1):
+            again, created = resolve_ingredients({'EGGS': 'g', 'OLIVE OIL': 'g'})
+        self.assertEqual((created, again['eggs'], again['olive oil']), (0, resolved['eggs'], resolved['olive oil']))
+
+    def test_rename_onto_existing_name_is_refused(self):
+        Ingredient.objects.create(name='Sea Salt', measurement_unit='g')
+        pepper = Ingredient.objects.create(name='Pepper', measurement_unit='g')
+        self.client.force_login(User.objects.create_user('cook', password='pw'))
+        self.client.post(reverse('edit_nonpredefined_ingredient', args=[pepper.id]),
+                         {'name': 'sea salt', 'measurement_unit': 'g'})
+        pepper.refresh_from_db()
+        self.assertEqual(pepper.name, 'Pepper')
+
+
+class IngredientChoiceTests(TestCase):
+    def setUp(self):
+        ingredient_index.reset()
+        self.addCleanup(ingredient_index.reset)
+        self.user = User.objects.create_user('cook', password='pw')
+        Ingredient.objects.bulk_create([Ingredient(name=f'Ingredient {i}') for i in range(30)])
+        self.FormSet = inlineformset_factory(
+            Recipe, RecipeIngredient, form=RecipeIngredientForm,
+            formset=BaseRecipeIngredientInlineFormSet, extra=20, can_delete=False
+        )
+
+    def test_formset_renders_catalog_without_per_row_queries(self):
+        ingredient_index.get_index()
+        with self.assertNumQueries(0):
+            html = self.FormSet().as_p()
+        self.assertEqual(html.count('>Ingredient 7 (unit)</option>'), 20)
+
+    @override_settings(INGREDIENT_AUTOCOMPLETE_THRESHOLD=10)
+    def test_large_catalog_uses_autocomplete_widget(self):
+        formset = self.FormSet()
+        self.assertIsInstance(formset.forms[0].fields['ingredient'].widget, IngredientAutocompleteWidget)
+        html = formset.as_p()
+        self.assertNotIn('<option', html.split('measurement_unit')[0])
+        self.assertIn('js/ingredient_autocomplete.js', str(formset.media))
+        ingredient = Ingredient.objects.get(name='Ingredient 3')
+        form = RecipeIngredientForm({'ingredient': ingredient.id, 'quantity': 2})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['ingredient'], ingredient)
+        self.assertFalse(RecipeIngredientForm({'ingredient': 999999, 'quantity': 2}).is_valid())
+
+
+class RecipeFormsetSaveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook', password='pw')
+        self.client.login(username='cook', password='pw')
+        self.existing = [Ingredient.objects.create(name=f'Spice {i}', measurement_unit='g') for i in range(15)]
+
+    def post_recipe(self, rows):
+        data = {
+            'title': f'Stew {rows}', 'description': '', 'instructions': 'Simmer.',
+            'recipeingredient_set-TOTAL_FORMS': rows,
+            'recipeingredient_set-INITIAL_FORMS': 0,
+        }
+        for i in range(rows):
+            prefix = f'recipeingredient_set-{i}'
+            data[f'{prefix}-quantity'] = 2
+            if i % 2:
+                data[f'{prefix}-ingredient'] = self.existing[i // 2].id
+            else:
+                data[f'{prefix}-new_ingredient'] = f'Herb {rows}-{i}'
+                data[f'{prefix}-measurement_unit'] = 'kg'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('add_recipe'), data)
+        self.assertEqual(response.status_code, 302)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.assertEqual(self.post_recipe(4), self.post_recipe(30))
+        recipe = Recipe.objects.get(title='Stew 30')
+        self.assertEqual(recipe.recipeingredient_set.count(), 30)
+        herb = RecipeIngredient.objects.get(recipe=recipe, ingredient__name='Herb 30-0')
+        self.assertEqual((herb.quantity, herb.ingredient.measurement_unit), (2000, 'g'))
+
+    def test_edit_updates_and_deletes_in_bulk(self):
+        recipe = Recipe.objects.create(title='Soup', instructions='Boil.', author=self.user)
+        keep = RecipeIngredient.objects.create(recipe=recipe, ingredient=self.existing[0], quantity=1)
+        drop = RecipeIngredient.objects.create(recipe=recipe, ingredient=self.existing[1], quantity=1)
+        data = {
+            'title': 'Soup', 'description': '', 'instructions': 'Boil.',
+            'recipeingredient_set-TOTAL_FORMS': 3, 'recipeingredient_set-INITIAL_FORMS': 2,
+            'recipeingredient_set-0-id': keep.id, 'recipeingredient_set-0-recipe': recipe.id,
+            'recipeingredient_set-0-ingredient': self.existing[0].id, 'recipeingredient_set-0-quantity': 5,
+            'recipeingredient_set-1-id': drop.id, 'recipeingredient_set-1-recipe': recipe.id,
+            'recipeingredient_set-1-ingredient': self.existing[1].id, 'recipeingredient_set-1-quantity': 1,
+            'recipeingredient_set-1-DELETE': 'on',
+            'recipeingredient_set-2-recipe': recipe.id,
+            'recipeingredient_set-2-new_ingredient': 'Leek', 'recipeingredient_set-2-quantity': 1,
+        }
+        response = self.client.post(reverse('edit_recipe', args=[recipe.pk]), data)
+        self.assertEqual(response.status_code, 302)
+        rows = dict(recipe.recipeingredient_set.values_list('ingredient__name', 'quantity'))
+        self.assertEqual(rows, {'Spice 0': 5, 'Leek': 1})
+
+
+class InventoryLedgerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook', password='pw')
+        self.client.login(username='cook', password='pw')
+        self.flour = Ingredient.objects.create(name='Flour', measurement_unit='g')
+        self.egg = Ingredient.objects.create(name='Egg', measurement_unit='pieces')
+        self.bread = Recipe.objects.create(title='Bread', instructions='Bake.', author=self.user)
+        RecipeIngredient.objects.create(recipe=self.bread, ingredient=self.flour, quantity=500)
+        RecipeIngredient.objects.create(recipe=self.bread, ingredient=self.egg, quantity=2)
+
+    def stock(self, ingredient):
+        return InventoryItem.objects.get(user=self.user, ingredient=ingredient).current_stock
+
+    def test_withdrawal_is_all_or_nothing(self):
+        inventory.add_stock(self.user, {self.flour.id: 600, self.egg.id: 1}, 'restock')
+        deficits = inventory.reserve_stock(self.user, inventory.recipe_demand(self.bread), 'cook')
+        self.assertEqual(deficits, {self.egg.id: 1})
+        self.assertEqual((self.stock(self.flour), self.stock(self.egg)), (600, 1))
+
+    def test_views_record_ledger_and_snapshots_audit_clean(self):
+        self.client.post(reverse('add_stock', args=[self.flour.id]), {'stock': 1000})
+        self.client.post(reverse('add_stock', args=[self.egg.id]), {'stock': 6})
+        self.client.post(reverse('add_meal_plan'), {'recipe': self.bread.id, 'date': '2026-01-05'})
+        self.assertEqual(inventory.take_snapshots(), 2)
+        self.client.post(reverse('confirm_cook_recipe', args=[self.bread.id]))
+        plan = MealPlan.objects.get(user=self.user)
+        self.client.post(reverse('remove_meal_plan', args=[plan.id]))
+        self.assertEqual((self.stock(self.flour), self.stock(self.egg)), (500, 4))
+        self.assertEqual(
+            list(StockMovement.objects.filter(ingredient=self.egg).values_list('reason', 'delta')),
+            [('restock', 6), ('meal_plan', -2), ('cook', -2), ('meal_plan_cancelled', 2)],
+        )
+        self.assertEqual(inventory.ledger_balance(self.user.id, self.egg.id), 4)
+        self.assertEqual(inventory.audit(self.user), [])
+
+    def add_meal_plan_queries(self, ingredient_count):
+        recipe = Recipe.objects.create(title=f'Feast {ingredient_count}', instructions='-', author=self.user)
+        stock = {}
+        for i in range(ingredient_count):
+            ingredient = Ingredient.objects.create(name=f'Feast {ingredient_count}-{i}')
+            RecipeIngredient.objects.create(recipe=recipe, ingredient=ingredient, quantity=1)
+            stock[ingredient.id] = 3
+        inventory.add_stock(self.user, stock, 'restock')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('add_meal_plan'), {'recipe': recipe.id, 'date': '2026-01-05'})
+        self.assertRedirects(response, reverse('meal_plan_list'), fetch_redirect_response=False)
+        return len(queries)
+
+    def test_add_meal_plan_reserves_with_constant_queries(self):
+        self.assertEqual(self.add_meal_plan_queries(2), self.add_meal_plan_queries(25))
+
+    def test_add_meal_plan_reports_deficits_without_deducting(self):
+        inventory.add_stock(self.user, {self.flour.id: 200}, 'restock')
+        response = self.client.post(reverse('add_meal_plan'), {'recipe': self.bread.id, 'date': '2026-01-05'})
+        self.assertEqual(response.context['missing'], {self.flour: 300, self.egg: 2})
+        self.assertEqual(self.stock(self.flour), 200)
+        self.assertFalse(MealPlan.objects.exists())
+
+    def test_exhausted_retries_are_reported_not_raised(self):
+        inventory.add_stock(self.user, {self.flour.id: 1000, self.egg.id: 6}, 'restock')
+        with mock.patch.object(inventory, '_try_reserve', side_effect=inventory._ReservationConflict) as attempt:
+            with self.assertRaises(inventory.ReservationConflict) as ctx:
+                inventory.reserve_stock(self.user, inventory.recipe_demand(self.bread), 'cook')
+            self.assertEqual((ctx.exception.attempts, attempt.call_count), (3, 3))
+            response = self.client.post(reverse('confirm_cook_recipe', args=[self.bread.id]))
+            self.assertRedirects(response, reverse('cook_recipe', args=[self.bread.id]), fetch_redirect_response=False)
+            self.assertEqual([str(m) for m in get_messages(response.wsgi_request)], [views.STOCK_CONFLICT_MESSAGE])
+            response = self.client.post(reverse('add_meal_plan'), {'recipe': self.bread.id, 'date': '2026-01-05'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([str(m) for m in get_messages(response.wsgi_request)], [views.STOCK_CONFLICT_MESSAGE] * 2)
+        self.assertEqual((self.stock(self.flour), self.stock(self.egg)), (1000, 6))
+        self.assertFalse(MealPlan.objects.exists())
+
+
+class BulkMealPlanTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook', password='pw')
+        self.client.login(username='cook', password='pw')
+        self.egg = Ingredient.objects.create(name='Egg', measurement_unit='pieces')
+        self.omelette = Recipe.objects.create(title='Omelette', instructions='Fry.', author=self.user)
+        RecipeIngredient.objects.create(recipe=self.omelette, ingredient=self.egg, quantity=2)
+        inventory.add_stock(self.user, {self.egg.id: 5}, 'restock')
+
+    def week(self, days):
+        return [(self.omelette.id, date(2026, 3, day)) for day in range(1, days + 1)]
+
+    def egg_stock(self):
+        return InventoryItem.objects.get(user=self.user, ingredient=self.egg).current_stock
+
+    def test_all_or_nothing(self):
+        result = meal_plans.schedule_meals(self.user, self.week(3))
+        self.assertEqual(result['scheduled'], [])
+        self.assertEqual(result['missing'], {self.egg: 1})
+        self.assertEqual((self.egg_stock(), MealPlan.objects.count()), (5, 0))
+
+    def test_best_effort_schedules_earliest_meals_that_fit(self):
+        result = meal_plans.schedule_meals(self.user, self.week(3)[::-1], meal_plans.BEST_EFFORT)
+        self.assertEqual([plan.date.day for plan in result['scheduled']], [1, 2])
+        self.assertEqual(result['skipped'], [(self.omelette.id, date(2026, 3, 3))])
+        self.assertEqual((self.egg_stock(), MealPlan.objects.count()), (1, 2))
+
+    def test_form_and_json_endpoints(self):
+        self.assertContains(self.client.get(reverse('bulk_add_meal_plans')), 'Omelette')
+        data = {'mode': meal_plans.ALL_OR_NOTHING, 'form-TOTAL_FORMS': 3, 'form-INITIAL_FORMS': 0,
+                'form-0-recipe': self.omelette.id, 'form-0-date': '2026-03-01'}
+        response = self.client.post(reverse('bulk_add_meal_plans'), data)
+        self.assertRedirects(response, reverse('meal_plan_list'), fetch_redirect_response=False)
+        response = self.client.post(reverse('bulk_add_meal_plans'), content_type='application/json', data={
+            'mode': meal_plans.BEST_EFFORT,
+            'meals': [{'recipe': self.omelette.id, 'date': '2026-03-0%d' % day} for day in (2, 3)],
+        })
+        self.assertEqual(response.json()['scheduled'], [{'recipe': self.omelette.id, 'date': '2026-03-02'}])
+        self.assertEqual(response.json()['missing'], [{'ingredient': self.egg.id, 'name': 'Egg', 'quantity': 1}])
+        self.assertEqual(MealPlan.objects.count(), 2)
+
+    def test_json_endpoint_reports_reservation_conflicts(self):
+        with mock.patch.object(inventory, '_try_reserve', side_effect=inventory._ReservationConflict):
+            response = self.client.post(reverse('bulk_add_meal_plans'), content_type='application/json', data={
+                'meals': [{'recipe': self.omelette.id, 'date': '2026-03-01'}],
+            })
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['error'], views.STOCK_CONFLICT_MESSAGE)
+        self.assertEqual((self.egg_stock(), MealPlan.objects.count()), (5, 0))
+
+
+class IngredientUsageTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook', password='pw')
+        self.client.login(username='cook', password='pw')
+        self.egg = Ingredient.objects.create(name='Egg', measurement_unit='pieces')
+        self.milk = Ingredient.objects.create(name='Milk', measurement_unit='ml')
+        self.recipes = []
+        for n in range(10):
+            recipe = Recipe.objects.create(title=f'Omelette {n}', instructions='Fry.', author=self.user)
+            RecipeIngredient.objects.create(recipe=recipe, ingredient=self.egg, quantity=2)
+            RecipeIngredient.objects.create(recipe=recipe, ingredient=self.milk, quantity=50)
+            MealPlan.objects.create(user=self.user, recipe=recipe, date=timezone.localdate())
+            self.recipes.append(recipe)
+        self.pancake = Recipe.objects.create(title='Pancake', instructions='Flip.', author=self.user)
+        RecipeIngredient.objects.create(recipe=self.pancake, ingredient=self.milk, quantity=100)
+        MealPlan.objects.create(user=self.user, recipe=self.pancake, date=timezone.localdate())
+        InventoryItem.objects.create(user=self.user, ingredient=self.egg, current_stock=3)
+        glist = GroceryList.objects.create(user=self.user)
+        glist.items.create(ingredient=self.egg, total_quantity=6)
+
+    def test_recipes_using_page(self):
+        response = self.client.get(reverse('ingredient_recipes', args=[self.egg.id]))
+        self.assertContains(response, 'Omelette 9')
+        self.assertNotContains(response, 'Pancake')
+        self.assertEqual(set(ingredient_usage.recipes_using(self.milk)), set(self.recipes) | {self.pancake})
+
+    def test_impact_preview_only_counts(self):
+        with CaptureQueriesContext(connection) as queries:
+            impact = ingredient_usage.deletion_impact(self.egg)
+        self.assertTrue(all(q['sql'].startswith('SELECT COUNT(*)') for q in queries))
+        self.assertEqual((impact['core.Recipe'], impact['core.RecipeIngredient'], impact['core.MealPlan'],
+                          impact['core.InventoryItem'], impact['core.GroceryListItem']), (10, 20, 10, 1, 1))
+        self.assertContains(self.client.get(reverse('delete_nonpredefined_ingredient', args=[self.egg.id])),
+                            '10 recipes')
+
+    def test_cascade_is_set_based(self):
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('delete_nonpredefined_ingredient', args=[self.egg.id]))
+        self.assertRedirects(response, reverse('inventory_list'), fetch_redirect_response=False)
+        self.assertLess(len(queries), 30)
+        self.assertFalse(Ingredient.objects.filter(id=self.egg.id).exists())
+        self.assertEqual(list(Recipe.objects.all()), [self.pancake])
+        self.assertEqual(MealPlan.objects.count(), 1)
+        self.assertFalse(InventoryItem.objects.exists())
+        # Only the pancake's milk is still planned.
+        self.assertEqual(list(grocery.grocery_deficits(self.user).values()), [100])
+        self.assertEqual(list(search.matching_recipes('omelette')), [])
+
+    def test_ingredient_in_use_is_kept(self):
+        self.client.get(reverse('delete_ingredient', args=[self.egg.id]))
+        self.assertTrue(Ingredient.objects.filter(id=self.egg.id).exists())
+        spare = Ingredient.objects.create(name='Spare', measurement_unit='g')
+        self.client.get(reverse('delete_ingredient', args=[spare.id]))
+        self.assertFalse(Ingredient.objects.filter(id=spare.id).exists())
+
+
+class GroceryGenerationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook', password='pw')
+        self.client.login(username='cook', password='pw')
+        self.egg = Ingredient.objects.create(name='Egg', measurement_unit='pieces')
+        self.milk = Ingredient.objects.create(name='Milk', measurement_unit='ml')
+        self.omelette = Recipe.objects.create(title='Omelette', instructions='Fry.', author=self.user)
+        RecipeIngredient.objects.create(recipe=self.omelette, ingredient=self.egg, quantity=2)
+        RecipeIngredient.objects.create(recipe=self.omelette, ingredient=self.milk, quantity=50)
+        InventoryItem.objects.create(user=self.user, ingredient=self.egg, current_stock=3)
+
+    def plan(self, days, first=0):
+        for offset in range(first, first + days):
+            MealPlan.objects.create(user=self.user, recipe=self.omelette, date=timezone.localdate() + timedelta(offset))
+
+    def items(self, glist):
+        return dict(glist.items.values_list('ingredient__name', 'total_quantity'))
+
+    def test_deficits_in_one_query(self):
+        self.plan(3)
+        with self.assertNumQueries(1):
+            deficits = grocery.grocery_deficits(self.user)
+        self.assertEqual(deficits, {self.egg.id: 3, self.milk.id: 150})
+        self.plan(20, first=3)
+        with self.assertNumQueries(1):
+            grocery.grocery_deficits(self.user, *grocery.default_window())
+
+    def test_window_excludes_past_and_later_plans(self):
+        self.plan(1, first=-30)
+        self.plan(2, first=1)
+        self.plan(1, first=10)
+        self.assertEqual(grocery.grocery_deficits(self.user, *grocery.default_window()),
+                         {self.egg.id: 1, self.milk.id: 100})
+
+    def test_demand_table_follows_plans_and_recipes(self):
+        self.plan(2)
+        InventoryItem.objects.create(user=self.user, ingredient=self.milk, current_stock=50)
+        meal_plans.schedule_meals(self.user, [(self.omelette.id, timezone.localdate())], meal_plans.BEST_EFFORT)
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeIngredient.objects.get(ingredient=self.milk).delete()
+            MealPlan.objects.filter(date=timezone.localdate()).first().delete()
+        self.assertEqual(grocery.check_demand(self.user), [])
+        self.assertEqual(grocery.rebuild_demand(self.user), 2)
+
+    def test_generation_merges_into_open_list(self):
+        self.plan(2)
+        self.client.get(reverse('auto_generate_grocery_list'))
+        self.plan(1, first=2)
+        self.client.get(reverse('auto_generate_grocery_list'))
+        self.client.get(reverse('auto_generate_grocery_list'))
+        glist = GroceryList.objects.get(user=self.user)
+        self.assertEqual(self.items(glist), {'Egg': 3, 'Milk': 150})
+
+    def test_new_list_and_accumulating_merge(self):
+        self.plan(1)
+        first = grocery.generate_grocery_list(self.user)
+        second = grocery.generate_grocery_list(self.user, merge=False)
+        self.assertNotEqual(first, second)
+        self.assertEqual(grocery.merge_into_list(second, {self.milk.id: 10, self.egg.id: 1}, accumulate=True),
+                         (1, 1))
+        self.assertEqual(self.items(second), {'Egg': 1, 'Milk': 60})
+
+
+class GroceryCheckoutTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook', password='pw')
+        self.client.login(username='cook', password='pw')
+        Ingredient.objects.bulk_create([Ingredient(name=f'Item {i}', measurement_unit='g') for i in range(40)])
+        self.ingredients = list(Ingredient.objects.order_by('id'))
+
+    def make_list(self, size):
+        glist = GroceryList.objects.create(user=self.user)
+        grocery.merge_into_list(glist, {ing.id: 10 for ing in self.ingredients[:size]})
+        return glist, {item.id: 12 for item in glist.items.all()}
+
+    def test_constant_query_count(self):
+        glist, purchased = self.make_list(5)
+        with CaptureQueriesContext(connection) as small:
+            self.assertTrue(grocery.checkout(self.user, glist, purchased))
+        InventoryItem.objects.all().delete()
+        glist, purchased = self.make_list(40)
+        with CaptureQueriesContext(connection) as large:
+            grocery.checkout(self.user, glist, purchased)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(InventoryItem.objects.filter(user=self.user, current_stock=12).count(), 40)
+        self.assertFalse(grocery.checkout(self.user, glist, purchased))
+
+    def test_short_purchase_changes_nothing(self):
+        glist, purchased = self.make_list(3)
+        purchased[min(purchased)] = 5
+        with self.assertRaises(grocery.ShortPurchase):
+            grocery.checkout(self.user, glist, purchased)
+        glist.refresh_from_db()
+        self.assertFalse(glist.is_complete)
+        self.assertFalse(InventoryItem.objects.exists())
+
+    def test_add_missing_merges_in_constant_queries(self):
+        glist, purchased = self.make_list(2)
+        url = reverse('add_missing_to_grocery_list')
+        posted = {f'missing_{ing.id}': 3 for ing in self.ingredients[:30]}
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(url, posted)
+        self.client.post(url, {f'missing_{ing.id}': 3 for ing in self.ingredients[:3]})
+        self.assertLess(len(queries), 15)
+        self.assertEqual(GroceryList.objects.count(), 1)
+        quantities = dict(glist.items.values_list('ingredient_id', 'total_quantity'))
+        self.assertEqual([quantities[ing.id] for ing in self.ingredients[:4]], [16, 16, 6, 3])
+        self.assertEqual(len(quantities), 30)
+        self.assertEqual(self.client.post(url, {'missing_999999': 1}).status_code, 404)
+
+    def test_checkout_view(self):
+        glist, purchased = self.make_list(2)
+        self.assertContains(self.client.get(reverse('grocery_checkout')), 'Item 1')
+        data = {f'item_{item_id}': qty for item_id, qty in purchased.items()}
+        response = self.client.post(reverse('grocery_checkout'), {**data, f'item_{min(purchased)}': 1})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(reverse('grocery_checkout'), data)
+        self.assertRedirects(response, reverse('grocery_list'))
+        self.assertTrue(GroceryList.objects.get(pk=glist.pk).is_complete)
+
+    def test_checkout_view_reports_a_list_claimed_meanwhile(self):
+        glist, purchased = self.make_list(2)
+        data = {f'item_{item_id}': qty for item_id, qty in purchased.items()}
+        # The list is still open when the view loads it, and closed by the time checkout() claims it.
+        with mock.patch.object(grocery, 'checkout', return_value=False):
+            response = self.client.post(reverse('grocery_checkout'), data)
+        self.assertRedirects(response, reverse('grocery_list'), fetch_redirect_response=False)
+        self.assertEqual([str(m) for m in get_messages(response.wsgi_request)],
+                         ["This grocery list was already checked out."])
+        self.assertFalse(InventoryItem.objects.exists())
+
+
+class SpoonacularClientTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.stub = StubServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stub.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.stub.delay, self.stub.status = 0, 200
+        self.stub.requests.clear()
+        self.client_ = spoonacular.SpoonacularClient('key', base_url=self.stub.url, timeout=(1, 0.5))
+        self.addCleanup(self.client_.close)
+
+    def test_cached_by_normalized_query(self):
+        titles = [r['title'] for r in self.client_.search_recipes('Pasta')]
+        self.assertEqual(len(titles), 2)
+        self.client_.search_recipes('  pasta ')
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertEqual(self.stub.requests[0][1], {'query': 'pasta', 'number': '10', 'apiKey': 'key'})
+        self.assertEqual((self.client_.stats()['hits'], self.client_.stats()['misses']), (1, 1))
+
+    def test_expired_and_evicted_entries(self):
+        now = [0]
+        cache = spoonacular.TTLCache(maxsize=2, ttl=10, clock=lambda: now[0])
+        cache.set('a', 1), cache.set('b', 2), cache.get('a'), cache.set('c', 3)
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+        now[0] = 11
+        self.assertIsNone(cache.get('a'))
+
+    def test_identical_requests_in_flight_are_coalesced(self):
+        self.stub.delay = 0.2
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.client_.search_recipes('kale')))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertEqual([len(r) for r in results], [1] * 5)
+        self.assertEqual(self.client_.stats()['coalesced'], 4)
+
+    def test_coalesced_requests_share_any_error(self):
+        def fail(path, params):
+            time.sleep(0.2)
+            raise RuntimeError('boom')
+
+        errors = []
+
+        def search():
+            try:
+                self.client_.search_recipes('kale')
+            except RuntimeError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=search) for _ in range(3)]
+        with mock.patch.object(self.client_, '_fetch', side_effect=fail) as fetch:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(len(errors), 3)
+        self.assertEqual(len({id(e) for e in errors}), 1)
+        self.assertEqual(self.client_._inflight, {})
+
+    def test_timeouts_and_errors_are_reported(self):
+        self.stub.delay = 0.8
+        with self.assertRaisesMessage(spoonacular.SpoonacularError, 'timed out'):
+            self.client_.search_recipes('kale')
+        self.stub.delay, self.stub.status = 0, 402
+        with self.assertRaisesMessage(spoonacular.SpoonacularError, '402'):
+            self.client_.search_recipes('kale')
+        self.assertEqual(self.client_.stats()['errors'], 2)
+
+    def run_async(self, coroutine_function, max_concurrency=2):
+        async def run():
+            client = spoonacular.AsyncSpoonacularClient(self.client_, max_concurrency=max_concurrency)
+            try:
+                return await coroutine_function(client)
+            finally:
+                await client.aclose()
+        return asyncio.run(run())
+
+    def test_async_client_limits_coalesces_and_shares_cache(self):
+        # Through httpx, and through the thread pool used without it.
+        for backend in [spoonacular.httpx, None]:
+            with self.subTest(httpx=backend is not None), mock.patch.object(spoonacular, 'httpx', backend):
+                self.client_.cache.clear()
+                self.stub.requests.clear()
+                self.stub.delay = 0.1
+                queries = ['kale', 'Kale ', 'pasta', 'soup', 'pizza']
+                started = time.monotonic()
+                results = self.run_async(lambda client: asyncio.gather(*[client.search_recipes(q) for q in queries]))
+                self.assertGreaterEqual(time.monotonic() - started, 0.2)
+                self.assertEqual([len(r) for r in results], [1, 1, 2, 1, 1])
+                self.assertEqual(len(self.stub.requests), 4)
+                self.client_.search_recipes('kale')
+                self.assertEqual(len(self.stub.requests), 4)
+
+    def test_async_timeouts_and_errors_are_reported(self):
+        for backend in [spoonacular.httpx, None]:
+            with self.subTest(httpx=backend is not None), mock.patch.object(spoonacular, 'httpx', backend):
+                errors = self.client_.stats()['errors']
+                self.stub.delay, self.stub.status = 0.8, 200
+                with self.assertRaisesMessage(spoonacular.SpoonacularError, 'timed out'):
+                    self.run_async(lambda client: client.search_recipes('kale'))
+                self.stub.delay, self.stub.status = 0, 402
+                with self.assertRaisesMessage(spoonacular.SpoonacularError, '402'):
+                    self.run_async(lambda client: client.search_recipes('kale'))
+                self.assertEqual(self.client_.stats()['errors'], errors + 2)
+
+    def test_view_uses_shared_client(self):
+        with override_settings(SPOONACULAR_BASE_URL=self.stub.url):
+            spoonacular.reset_client()
+            self.addCleanup(spoonacular.reset_client)
+            response = self.client.get(reverse('external_recipe_search'), {'query': 'mac & cheese'})
+        self.assertContains(response, 'No results found')
+        self.assertEqual(self.stub.requests[0][1]['query'], 'mac & cheese')
+
+
+class UnitConversionTests(TestCase):
+    def setUp(self):
+        self.garlic = Ingredient.objects.create(name='Garlic', measurement_unit='pieces')
+        self.flour = Ingredient.objects.create(name='Flour', measurement_unit='g')
+
+    def test_unit_normalization(self):
+        self.assertEqual(units.to_canonical(2, 'Tablespoons'), ('ml', 30))
+        self.assertEqual(units.convert(1.5, 'kilograms', 'g'), 1500)
+        self.assertEqual(units.convert(3, 'cloves', 'pieces'), 3)
+        self.assertIsNone(units.convert(1, 'cup', 'g'))
+        self.assertAlmostEqual(units.convert(1, 'cup', 'g', density=0.53), 127.2)
+        self.assertAlmostEqual(units.convert(85, 'g', 'cup', density=0.85), 100 / 240)
+        self.assertIsNone(units.convert(1, 'pieces', 'g', density=1.0))
+
+    def test_convert_many_with_and_without_numpy(self):
+        args = ([1, 2, 3, 4], ['cup', 'kg', 'pieces', 'tbsp'], ['g', 'lb', 'g', 'ml'], [0.53, None, None, None])
+        expected = [127.2, 2000 / 453.592, None, 60]
+        for np in {units.np, None}:
+            with mock.patch.object(units, 'np', np):
+                result = [None if x != x else round(float(x), 6) for x in units.convert_many(*args)]
+                self.assertEqual(result, [None if x is None else round(x, 6) for x in expected])
+                self.assertEqual(list(units.convert_many([1, 2], 'L', 'ml')), [1000, 2000])
+
+    def test_convert_many_factorizes_numpy_unit_arrays(self):
+        names = list(units.UNIT_ALIASES) + ['cloves']  # more distinct names than _ARRAY_SCANS
+        from_units = units.np.array(names * 2)
+        result = units.convert_many(units.np.ones(len(from_units)), from_units, 'ml', [1.0] * len(from_units))
+        expected = [units.convert(1, name, 'ml', 1.0) for name in names] * 2
+        self.assertEqual([None if x != x else round(float(x), 6) for x in result],
+                         [None if x is None else round(x, 6) for x in expected])
+        self.assertEqual(len(units.convert_many([], units.np.array([], dtype=str), 'g')), 0)
+
+    def test_forms_convert_into_the_ingredient_unit(self):
+        form = InventoryItemForm({'ingredient': self.flour.id, 'current_stock': 2, 'measurement_unit': 'cup'})
+        self.assertTrue(form.is_valid(), form.errors)
+        item = form.save(commit=False)
+        self.assertAlmostEqual(item.current_stock, 2 * 240 * 0.53)
+        form = InventoryItemForm({'ingredient': self.garlic.id, 'current_stock': 2, 'measurement_unit': 'cup'})
+        self.assertFalse(form.is_valid())
+
+
+class RecipeImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook', password='pw')
+        self.client.login(username='cook', password='pw')
+        self.garlic = Ingredient.objects.create(name='Garlic', measurement_unit='pieces')
+        self.flour = Ingredient.objects.create(name='Flour', measurement_unit='g')
+
+    def external(self, n, *lines):
+        return {'id': n, 'title': f'Recipe {n}', 'summary': '<b>Tasty</b>', 'instructions': '<p>Cook.</p>',
+                'extendedIngredients': [{'name': name, 'amount': amount, 'unit': unit}
+                                        for name, amount, unit in lines]}
+
+    def test_import_matches_catalog_and_converts(self):
+        stats = recipe_import.import_recipes(self.user, [
+            self.external(1, ('garlic', 2, 'cloves'), ('flour', 0.5, 'kg'), ('Olive  Oil', 2, 'tbsp')),
+            self.external(2, ('olive oil', 1, 'cup'), ('flour', 1, 'cup'), ('garlic', 1, 'cup')),
+            {'summary': 'no title'},
+        ])
+        self.assertEqual(stats, {'created': 2, 'skipped': 0, 'invalid': 1,
+                                 'ingredients_created': 1, 'lines_skipped': 1})
+        recipe = Recipe.objects.get(external_id='spoonacular:1')
+        self.assertEqual((recipe.description, recipe.instructions), ('Tasty', 'Cook.'))
+        quantities = dict(recipe.recipeingredient_set.values_list('ingredient__name', 'quantity'))
+        self.assertEqual(quantities, {'Garlic': 2, 'Flour': 500, 'Olive Oil': 30})
+        self.assertEqual(Ingredient.objects.get(name='Olive Oil').measurement_unit, 'ml')
+        self.assertEqual(set(search.search_recipes('olive')), set(Recipe.objects.all()))
+        flour = RecipeIngredient.objects.get(recipe__external_id='spoonacular:2', ingredient=self.flour)
+        self.assertAlmostEqual(flour.quantity, 240 * 0.53)  # through the typical density of flour
+        again = recipe_import.import_recipes(self.user, [self.external(1, ('garlic', 1, ''))])
+        self.assertEqual((again['created'], again['skipped']), (0, 1))
+
+    def test_dump_shapes(self):
+        self.assertEqual(len(recipe_import.load_dump(io.StringIO('{"recipes": [{"id": 1}, {"id": 2}]}'))), 2)
+        self.assertEqual(recipe_import.load_dump(io.StringIO('{"id": 1}\n{"id": 2}\n')), [{'id': 1}, {'id': 2}])
+        for text in ['42', '"pasta"', '{"recipes": 5}', '{"id": 1}\nnot json']:
+            with self.subTest(text=text), self.assertRaises(recipe_import.RecipeImportError):
+                recipe_import.load_dump(io.StringIO(text))
+        dump = io.BytesIO(b'42')
+        dump.name = 'dump.json'
+        response = self.client.post(reverse('import_external_recipes'), {'dump': dump})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Not a valid recipe dump', response.context['form'].errors['dump'][0])
+
+    def test_recipes_imported_concurrently_are_skipped(self):
+        resolve = recipe_import._resolve_ingredients
+
+        def import_elsewhere_first(lines):
+            # Another import commits the same recipe between this batch's check and its insert.
+            recipe = Recipe.objects.create(title='Recipe 1', instructions='Cook.', author=self.user,
+                                           external_id='spoonacular:1')
+            RecipeIngredient.objects.create(recipe=recipe, ingredient=self.garlic, quantity=1)
+            return resolve(lines)
+
+        with mock.patch.object(recipe_import, '_resolve_ingredients', side_effect=import_elsewhere_first):
+            stats = recipe_import.import_recipes(self.user, [self.external(1, ('garlic', 2, '')),
+                                                             self.external(2, ('garlic', 3, ''))])
+        self.assertEqual((stats['created'], stats['skipped']), (1, 1))
+        self.assertEqual(dict(RecipeIngredient.objects.values_list('recipe__external_id', 'quantity')),
+                         {'spoonacular:1': 1, 'spoonacular:2': 3})
+
+    def test_queries_per_batch_not_per_recipe(self):
+        Recipe.objects.create(title='Local', instructions='-', author=self.user)
+        cookability.rebuild_index(self.user)
+
+        def run(first, count):
+            recipes = [self.external(n, ('garlic', 1, ''), (f'spice {n}', 1, 'tsp'))
+                       for n in range(first, first + count)]
+            with CaptureQueriesContext(connection) as queries:
+                recipe_import.import_recipes(self.user, recipes)
+            return len(queries)
+
+        # Only the INSERT statements split with size (SQLite's parameter limit).
+        self.assertLessEqual(run(100, 200) - run(0, 5), 3)
+        self.assertEqual(RecipeCookability.objects.filter(user=self.user).count(), 206)
+
+    def test_view_and_command(self):
+        with StubServer() as stub, override_settings(SPOONACULAR_BASE_URL=stub.url):
+            spoonacular.reset_client()
+            self.addCleanup(spoonacular.reset_client)
+            response = self.client.post(reverse('import_external_recipes'), {'recipe_ids': ['644387', '716406']})
+        self.assertRedirects(response, reverse('recipe_list'), fetch_redirect_response=False)
+        self.assertEqual(set(Recipe.objects.values_list('title', flat=True)),
+                         {'Garlicky Kale', 'Asparagus and Pea Soup'})
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as dump:
+            dump.write('\n'.join(json.dumps(self.external(n, ('flour', 100, 'g'))) for n in range(3)))
+        self.addCleanup(os.remove, dump.name)
+        call_command('import_recipes', dump.name, user='cook', stdout=io.StringIO())
+        self.assertEqual(Recipe.objects.count(), 5)
+
+
+class LegacyQuantityCommandTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook')
+        self.flour = Ingredient.objects.create(name='Flour', measurement_unit='kg')
+        self.salt = Ingredient.objects.create(name='Salt', measurement_unit='g')
+        self.bread = Recipe.objects.create(title='Bread', instructions='Bake.', author=self.user)
+        RecipeIngredient.objects.create(recipe=self.bread, ingredient=self.flour, quantity=500)
+        RecipeIngredient.objects.create(recipe=self.bread, ingredient=self.salt, quantity=10)
+        inventory.add_stock(self.user, {self.flour.id: 2}, 'restock')
+        cookability.rebuild_index(self.user)
+
+    def quantities(self):
+        return (RecipeIngredient.objects.get(ingredient=self.flour).quantity,
+                RecipeIngredient.objects.get(ingredient=self.salt).quantity,
+                InventoryItem.objects.get(ingredient=self.flour).current_stock)
+
+    def test_dry_run_by_default_then_only_the_named_recipe_lines(self):
+        out = io.StringIO()
+        call_command('convert_legacy_quantities', '--ingredient=flour', '--ingredient=Salt', stdout=out)
+        self.assertIn('Flour (kg, / 1000): 1 recipe line(s).', out.getvalue())
+        self.assertIn('Salt: kept in g', out.getvalue())
+        self.assertEqual(self.quantities(), (500, 10, 2))
+        call_command('convert_legacy_quantities', '--ingredient=flour', commit=True, stdout=io.StringIO())
+        self.assertEqual(self.quantities(), (0.5, 10, 2))
+        self.assertEqual(cookability.check_index(self.user), [])
+
+    def test_inventory_and_ledger_are_opt_in(self):
+        call_command('convert_legacy_quantities', '--ingredient=Flour', inventory=True, commit=True,
+                     stdout=io.StringIO())
+        self.assertEqual(self.quantities(), (0.5, 10, 0.002))
+        self.assertEqual(inventory.audit(self.user), [])
+        with self.assertRaisesMessage(CommandError, 'Unknown ingredient(s): Sugar.'):
+            call_command('convert_legacy_quantities', '--ingredient=Sugar', stdout=io.StringIO())
+
+
+class CatalogIngestTests(TestCase):
+    def write(self, suffix, text):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8') as fp:
+            fp.write(text)
+        self.addCleanup(os.remove, fp.name)
+        return fp.name
+
+    def test_jsonl_dedupes_guesses_units_and_batches(self):
+        Ingredient.objects.create(name='Whole Milk', measurement_unit='ml')
+        mine = Ingredient.objects.create(name='Sugar', measurement_unit='pieces')
+        path = self.write('.jsonl', '\n'.join([
+            '"whole milk"', '"Eggs"', '{"name": "EGGS"}', '{"name": "Flour", "unit": "kg"}',
+            '{"name": "sugar", "unit": "g"}', '{"name": "Crème fraîche"}', '""', '"Saffron"',
+        ]))
+        with CaptureQueriesContext(connection) as queries:
+            stats = catalog_ingest.ingest(catalog_ingest.iter_rows(path), batch_size=2)
+        self.assertEqual((stats['rows'], stats['created'], stats['unchanged'], stats['invalid']), (8, 4, 3, 1))
+        self.assertLessEqual(len(queries), 4 * 5)
+        units_by_name = dict(Ingredient.objects.values_list('name', 'measurement_unit'))
+        self.assertEqual(units_by_name['Eggs'], 'pieces')
+        self.assertEqual(units_by_name['Flour'], 'g')
+        mine.refresh_from_db()
+        self.assertEqual(mine.measurement_unit, 'pieces')  # user-created rows are left alone
+        catalog_ingest.ingest(catalog_ingest.iter_rows(path))
+        self.assertEqual(Ingredient.objects.count(), 6)
+
+    def test_csv_updates_predefined_units(self):
+        path = self.write('.csv', 'name,measurement_unit\nRice,cups\nBasil,\n')
+        call_command('ingest_ingredients', path, stdout=io.StringIO())
+        self.assertEqual(Ingredient.objects.get(name='Rice').measurement_unit, 'ml')
+        call_command('ingest_ingredients', self.write('.csv', 'name,unit\nrice,lb\n'), stdout=io.StringIO())
+        self.assertEqual(Ingredient.objects.get(name='Rice').measurement_unit, 'g')
+        with self.assertRaises(CommandError):
+            call_command('ingest_ingredients', self.write('.csv', 'title\nRice\n'), stdout=io.StringIO())
+
+    def test_units_of_ingredients_in_use_are_kept(self):
+        rice = Ingredient.objects.create(name='Rice', measurement_unit='g', is_predefined=True)
+        Ingredient.objects.create(name='Basil', measurement_unit='g', is_predefined=True)
+        user = User.objects.create_user('cook')
+        recipe = Recipe.objects.create(title='Risotto', instructions='Stir.', author=user)
+        RecipeIngredient.objects.create(recipe=recipe, ingredient=rice, quantity=500)
+        stats = catalog_ingest.ingest([('rice', 'cup'), ('basil', 'cup')])
+        self.assertEqual((stats['updated'], stats['in_use']), (1, 1))
+        self.assertEqual(dict(Ingredient.objects.values_list('name', 'measurement_unit')), {'Rice': 'g', 'Basil': 'ml'})
+
+    def test_counts_only_inserted_rows_and_odd_jsonl_items(self):
+        path = self.write('.jsonl', '\n'.join(['"Kale"', '42', '["Leek"]', '{"name": 7}', 'null', '"Leek"']))
+        existing = Ingredient.objects.create(name='kale', measurement_unit='pieces')
+        # As if another writer inserted "kale" between the batch's lookup and its insert.
+        with mock.patch.object(Ingredient.objects, 'in_bulk', return_value={}):
+            stats = catalog_ingest.ingest(catalog_ingest.iter_rows(path))
+        self.assertEqual((stats['rows'], stats['created'], stats['unchanged'], stats['invalid']), (6, 1, 1, 4))
+        self.assertEqual(Ingredient.objects.get(pk=existing.pk).measurement_unit, 'pieces')
+
+
+class FlushExceptUsersTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook', password='pw')
+        group = Group.objects.create(name='cooks')
+        self.user.groups.add(group)
+        ingredients = [Ingredient.objects.create(name=f'Item {i}', measurement_unit='g') for i in range(5)]
+        recipe = Recipe.objects.create(title='Soup', instructions='Boil.', author=self.user)
+        for ingredient in ingredients:
+            RecipeIngredient.objects.create(recipe=recipe, ingredient=ingredient, quantity=1)
+            InventoryItem.objects.create(user=self.user, ingredient=ingredient, current_stock=2)
+
+    def test_plan_deletes_referencing_tables_first(self):
+        plan = flush.plan_flush({User, Group})
+        order = [model._meta.db_table for model in plan.models]
+        self.assertLess(order.index('core_recipeingredient'), order.index('core_recipe'))
+        self.assertLess(order.index('core_inventoryitem'), order.index('core_ingredient'))
+        self.assertLess(order.index('auth_user_user_permissions'), order.index('auth_permission'))
+        self.assertNotIn('auth_user', order)
+        self.assertNotIn('auth_user_groups', order)
+
+    def test_batched_flush_keeps_users(self):
+        out = io.StringIO()
+        call_command('flush_except_users', '--dry-run', stdout=out)
+        self.assertIn('Would delete 5 row(s) from core_recipeingredient.', out.getvalue())
+        self.assertEqual(RecipeIngredient.objects.count(), 5)
+        with CaptureQueriesContext(connection) as queries:
+            call_command('flush_except_users', '--batch-size', '2', stdout=out)
+        self.assertFalse([q for q in queries if q['sql'].startswith('SELECT "core_recipeingredient"."id", ')])
+        self.assertEqual((Recipe.objects.count(), Ingredient.objects.count(), InventoryItem.objects.count()),
+                         (0, 0, 0))
+        self.assertEqual(list(self.user.groups.values_list('name', flat=True)), ['cooks'])
+        if search.fts_enabled():
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT COUNT(*) FROM {search.FTS_TABLE}")
+                self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_truncate_mode(self):
+        call_command('flush_except_users', '--truncate', stdout=io.StringIO())
+        self.assertFalse(RecipeIngredient.objects.exists())
+        self.assertTrue(User.objects.filter(username='cook').exists())
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_views_use_indexes(self):
+        out = io.StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn('Every checked query uses an index.', out.getvalue())
+        self.assertFalse(User.objects.filter(username__startswith='query-plan-check').exists())
+
+    def test_sample_data_does_not_clash_with_existing_rows(self):
+        User.objects.create_user('query-plan-check')
+        Ingredient.objects.create(name='Query plan tomato', measurement_unit='g')
+        checks = [check for check in query_plans.VIEW_CHECKS if check.query.get('q') == 'tomato']
+        [(_, report)] = query_plans.check_views(checks)
+        self.assertTrue(report)
+        self.assertEqual(Ingredient.objects.filter(name__startswith='Query plan').count(), 1)
+
+    def test_other_databases_are_refused(self):
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            with self.assertRaises(ImproperlyConfigured):
+                list(query_plans.check_views())
+            with self.assertRaisesMessage(CommandError, 'only checked on SQLite'):
+                call_command('check_query_plans', stdout=io.StringIO())
+
+    def test_partial_indexes_serve_the_view_filters(self):
+        plans = {check.url_name: [step for sql, plan, scans in report for step in plan]
+                 for check, report in query_plans.check_views()
+                 if check.url_name in ('inventory_list', 'grocery_list') and not check.query}
+        self.assertTrue(any('core_inventory_in_stock' in step for step in plans['inventory_list']))
+        self.assertTrue(any('core_grocerylist_open' in step for step in plans['grocery_list']))
+        self.assertFalse(any('TEMP B-TREE' in step for step in plans['grocery_list']))
+
+    def test_full_scan_fails(self):
+        self.assertEqual(query_plans.full_scans(['SCAN core_recipe', 'SCAN TABLE core_mealplan AS T',
+                                                 'SCAN core_ingredient USING INDEX core_ingredient_name']),
+                         ['core_recipe', 'core_mealplan'])
+        check = query_plans.ViewCheck('recipe_list', (), {}, set())
+        [(_, report)] = query_plans.check_views([check])
+        self.assertIn(['core_recipe'], [scans for sql, plan, scans in report])
+        with self.assertRaises(CommandError):
+            with mock.patch.object(query_plans, 'VIEW_CHECKS', [check]):
+                call_command('check_query_plans', stdout=io.StringIO())
+
+
+class SQLiteProductionProfileTests(SimpleTestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'profile.sqlite3')
+        # A throwaway alias next to the test database, on a file (WAL needs one).
+        connections.settings['prod'] = connections.configure_settings({
+            'default': connections.settings['default'],
+            'prod': {'ENGINE': 'recipe_manager.sqlite_backend', 'NAME': self.path,
+                     'OPTIONS': {'timeout': 0.01, 'busy_retries': 4, 'busy_backoff': 0.05}},
+        })['prod']
+        self.connection = connections['prod']
+        with self.connection.cursor() as cursor:
+            cursor.execute("CREATE TABLE t (n integer)")
+        # A second writer that does not wait for locks.
+        self.other = sqlite3.connect(self.path, timeout=0, isolation_level=None, check_same_thread=False)
+
+    def tearDown(self):
+        self.other.close()
+        self.connection.close()
+        del connections['prod']
+        del connections.settings['prod']
+
+    def test_pragmas(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+    def test_transactions_take_the_write_lock_up_front(self):
+        with transaction.atomic(using='prod'):
+            with self.assertRaisesRegex(sqlite3.OperationalError, 'locked'):
+                self.other.execute("BEGIN IMMEDIATE")
+            self.other.execute("SELECT COUNT(*) FROM t")  # WAL: readers are not blocked
+
+    def test_busy_writes_are_retried(self):
+        self.other.execute("BEGIN IMMEDIATE")
+        threading.Timer(0.1, self.other.execute, args=["COMMIT"]).start()
+        with self.connection.cursor() as cursor:
+            cursor.execute("INSERT INTO t VALUES (1)")
+        with transaction.atomic(using='prod'), self.connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM t")
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_retries_are_bounded(self):
+        self.connection.close()
+        self.connection.settings_dict['OPTIONS']['busy_retries'] = 0
+        self.other.execute("BEGIN IMMEDIATE")
+        with self.assertRaises(OperationalError):
+            with transaction.atomic(using='prod'):
+                pass
+        self.other.execute("ROLLBACK")
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    def setUp(self):
+        # A replica file next to the in-memory test database.
+        path = os.path.join(tempfile.mkdtemp(), 'replica.sqlite3')
+        connections.settings[replica.REPLICA_DB] = connections.configure_settings({
+            'default': connections.settings['default'],
+            replica.REPLICA_DB: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path},
+        })[replica.REPLICA_DB]
+        self.user = User.objects.create_user('cook', password='pw')
+        self.salt = Ingredient.objects.create(name='Salt')
+        recipe = Recipe.objects.create(title='Old soup', instructions='Boil.', author=self.user)
+        RecipeIngredient.objects.create(recipe=recipe, ingredient=self.salt, quantity=1)
+        cookability.rebuild_index(self.user)
+        replica.refresh_replica()
+        self.new = Recipe.objects.create(title='New stew', instructions='Simmer.', author=self.user)
+
+    def tearDown(self):
+        connections[replica.REPLICA_DB].close()
+        del connections[replica.REPLICA_DB]
+        del connections.settings[replica.REPLICA_DB]
+
+    def test_read_views_use_the_replica(self):
+        response = self.client.get(reverse('recipe_list'))
+        self.assertContains(response, 'Old soup')
+        self.assertNotContains(response, 'New stew')
+        self.assertEqual(self.client.get(reverse('recipe_detail', args=[self.new.pk])).status_code, 404)
+        # Other views and code outside requests read the primary.
+        self.assertEqual(Recipe.objects.count(), 2)
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse('cook_recipe', args=[self.new.pk])), 'New stew')
+        replica.refresh_replica()
+        self.assertContains(self.client.get(reverse('recipe_list')), 'New stew')
+
+    def test_search_reads_the_replica_without_pinning_the_session(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('recipe_list'), {'q': 'soup'})
+        self.assertContains(response, 'Old soup')
+        self.assertNotContains(self.client.get(reverse('recipe_list'), {'q': 'stew'}), 'New stew')
+        self.assertNotIn(replica.STICKY_SESSION_KEY, self.client.session)
+
+    def test_reads_after_a_write_stick_to_the_primary(self):
+        self.client.force_login(self.user)
+        self.assertNotContains(self.client.get(reverse('recipe_list')), 'New stew')
+        self.client.post(reverse('add_to_grocery_list'), {'ingredient': self.salt.id, 'quantity': 1})
+        self.assertContains(self.client.get(reverse('recipe_list')), 'New stew')
+        session = self.client.session
+        session[replica.STICKY_SESSION_KEY] = 0
+        session.save()
+        self.assertNotContains(self.client.get(reverse('recipe_list')), 'New stew')
+
+    def test_only_sqlite_replicas_are_refreshed(self):
+        with mock.patch.object(connections[replica.REPLICA_DB], 'vendor', 'postgresql'):
+            with self.assertRaises(ImproperlyConfigured):
+                replica.refresh_replica()
+            with self.assertRaisesMessage(CommandError, 'SQLite databases only'):
+                call_command('refresh_replica', stdout=io.StringIO())
+
+
+@override_settings(QUERY_BUDGET_ENFORCE=True)
+class QueryStatsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook', password='pw')
+        ingredients = [Ingredient.objects.create(name=f'Item {i}', measurement_unit='g') for i in range(8)]
+        for r in range(10):
+            recipe = Recipe.objects.create(title=f'Recipe {r}', instructions='Cook.', author=self.user)
+            for ingredient in ingredients:
+                RecipeIngredient.objects.create(recipe=recipe, ingredient=ingredient, quantity=1)
+            MealPlan.objects.create(user=self.user, recipe=recipe, date=timezone.localdate())
+        glist = GroceryList.objects.create(user=self.user)
+        for ingredient in ingredients:
+            InventoryItem.objects.create(user=self.user, ingredient=ingredient, current_stock=2)
+            GroceryListItem.objects.create(grocery_list=glist, ingredient=ingredient, total_quantity=1)
+        self.recipe, self.ingredient = recipe, ingredients[0]
+        self.client.force_login(self.user)
+
+    def test_views_stay_within_their_query_budgets(self):
+        args = {'recipe_detail': [self.recipe.pk], 'cook_recipe': [self.recipe.pk],
+                'confirm_cook_recipe': [self.recipe.pk], 'ingredient_recipes': [self.ingredient.pk]}
+        data = {'grocery_checkout': {f'item_{item.id}': item.total_quantity for item in GroceryListItem.objects.all()}}
+        for key, budget in settings.QUERY_BUDGETS.items():
+            view, method = key if isinstance(key, tuple) else (key, 'GET')
+            with self.subTest(view=view, method=method):
+                response = self.client.generic(method, reverse(view, args=args.get(view, [])),
+                                               urlencode(data.get(view, {})),
+                                               content_type='application/x-www-form-urlencoded')
+                self.assertLess(response.status_code, 400)
+                stats = response.wsgi_request.query_stats
+                self.assertLessEqual(stats.count, budget)
+                self.assertEqual(stats.repeated(), [])
+
+    def test_over_budget_fails(self):
+        with override_settings(QUERY_BUDGETS={'recipe_detail': 1}), self.assertLogs('core.query_stats', 'WARNING'):
+            with self.assertRaises(query_stats.QueryBudgetExceeded):
+                self.client.get(reverse('recipe_detail', args=[self.recipe.pk]))
+        with override_settings(QUERY_BUDGETS={'recipe_detail': 1}, QUERY_BUDGET_ENFORCE=False):
+            with self.assertLogs('core.query_stats', 'WARNING') as logs:
+                self.client.get(reverse('recipe_detail', args=[self.recipe.pk]))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record['view'], record['budget']), ('recipe_detail', 1))
+
+    @override_settings(QUERY_BUDGETS={'grocery_checkout': 5, ('grocery_checkout', 'POST'): 21})
+    def test_budgets_are_per_method(self):
+        self.assertEqual(query_stats.budget_for('grocery_checkout'), 5)
+        self.assertEqual(query_stats.budget_for('grocery_checkout', 'HEAD'), 5)
+        self.assertEqual(query_stats.budget_for('grocery_checkout', 'POST'), 21)
+        self.assertIsNone(query_stats.budget_for('recipe_detail', 'POST'))
+
+    def test_async_views_are_counted_and_not_serialized(self):
+        # Both project middlewares are async-capable, so async views keep running on the event loop.
+        self.async_client.force_login(self.user)
+        url = reverse('external_recipe_search')
+
+        async def search_all():
+            # Django 3.2's AsyncClient drops a data dict on GET; pass the query string in the path.
+            return await asyncio.gather(*[self.async_client.get(f'{url}?query=kale+{n}') for n in range(3)])
+
+        with StubServer(delay=0.4) as stub, override_settings(SPOONACULAR_BASE_URL=stub.url):
+            spoonacular.reset_client()
+            self.addCleanup(spoonacular.reset_client)
+            started = time.monotonic()
+            responses = async_to_sync(search_all)()
+            self.assertLess(time.monotonic() - started, 0.9)  # one after another would take 1.2 s
+        for response in responses:
+            self.assertEqual(response.status_code, 200)
+            self.assertGreater(response.asgi_request.query_stats.count, 0)  # session and user, in a thread
+
+    def test_repeated_query_shapes(self):
+        stats = query_stats.QueryStats()
+        for pk in range(6):
+            with connection.execute_wrapper(stats):
+                Recipe.objects.filter(pk=pk).first()
+                Recipe.objects.filter(pk__in=range(pk + 2)).count()
+        repeated = stats.repeated()
+        self.assertEqual([n for shape, n in repeated], [6, 6])
+        self.assertTrue(any('IN (...)' in shape for shape, n in repeated))
+
+    @override_settings(QUERY_STATS_SERVER_TIMING=True, QUERY_STATS_PANEL=True)
+    def test_server_timing_and_panel(self):
+        response = self.client.get(reverse('meal_plan_list'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", app;dur=[\d.]+$')
+        self.assertContains(response, 'id="query-stats-panel"')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+
+
+class InventoryConcurrencyTests(TransactionTestCase):
+    def test_concurrent_restocks_lose_no_updates(self):
+        user = User.objects.create_user('cook')
+        salt = Ingredient.objects.create(name='Salt')
+        threads, per_thread = 4, 20
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(per_thread):
+                    while True:
+                        try:
+                            inventory.add_stock(user, {salt.id: 1}, 'restock')
+                            break
+                        except OperationalError:
+                            # The shared in-memory test database reports lock contention
+                            # instead of waiting; retry the whole transaction.
+                            time.sleep(0.001)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        pool = [threading.Thread(target=worker) for _ in range(threads)]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        self.assertEqual(errors, [])
+        item = InventoryItem.objects.get(user=user, ingredient=salt)
+        self.assertEqual(item.current_stock, threads * per_thread)
+        self.assertEqual(StockMovement.objects.filter(ingredient=salt).count(), threads * per_thread)
@@ -0,0 +1,259 @@
+# core/units.py
+"""
+Measurement units: the unit choices offered by the forms, the conversion of
+each unit to its canonical unit (g for mass, ml for volume), and normalization
+of the free-form unit names found in imported recipes.
+
+CONVERSION_MAP is precompiled into flat per-unit tables (kind and factor), so
+a conversion is two lookups and a multiplication. Mass and volume convert
+into each other through a density in g/ml: the ingredient's own
+(Ingredient.density) or one guessed from its name. convert_many() converts
+whole sequences at once, vectorized with NumPy (in requirements.txt); the
+same tables work in plain Python where NumPy is not installed.
+
+Quantities are converted on the way in (the forms, the recipe import), so every
+stored quantity (recipe lines, stock, grocery items) is in its ingredient's own
+unit: the grocery and cookability aggregations compare them in SQL as they are.
+"""
+import math
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Extended measurement unit choices.
+# For mass, canonical unit is grams (g); for volume, canonical is milliliters (ml).
+UNIT_CHOICES = [
+    ("kg", "Kilograms (kg) [1000 g]"),
+    ("g", "Grams (g) [1 g]"),
+    ("oz", "Ounces (oz) [28.35 g]"),
+    ("lb", "Pounds (lb) [453.59 g]"),
+    ("L", "Liters (L) [1000 ml]"),
+    ("ml", "Milliliters (ml) [1 ml]"),
+    ("cup", "Cups (cup) [240 ml]"),
+    ("tbsp", "Tablespoons (tbsp) [15 ml]"),
+    ("tsp", "Teaspoons (tsp) [5 ml]"),
+    ("pint", "Pints (pint) [473 ml]"),
+    ("gallon", "Gallons (gallon) [3785 ml]"),
+    ("pieces", "Pieces"),
+    ("fillets", "Fillets"),
+]
+
+# Conversion map: maps a unit to a tuple (canonical_unit, conversion_factor).
+CONVERSION_MAP = {
+    "kg": ("g", 1000),
+    "g": ("g", 1),
+    "oz": ("g", 28.3495),
+    "lb": ("g", 453.592),
+    "L": ("ml", 1000),
+    "ml": ("ml", 1),
+    "cup": ("ml", 240),
+    "tbsp": ("ml", 15),
+    "tsp": ("ml", 5),
+    "pint": ("ml", 473.176),
+    "gallon": ("ml", 3785.41),
+    "pieces": ("pieces", 1),
+    "fillets": ("fillets", 1),
+}
+
+# Spellings seen in external recipe data, mapped to CONVERSION_MAP keys.
+UNIT_ALIASES = {
+    "gram": "g", "grams": "g", "gr": "g",
+    "kilogram": "kg", "kilograms": "kg", "kgs": "kg",
+    "ounce": "oz", "ounces": "oz",
+    "pound": "lb", "pounds": "lb", "lbs": "lb",
+    "l": "L", "liter": "L", "liters": "L", "litre": "L", "litres": "L",
+    "milliliter": "ml", "milliliters": "ml", "millilitre": "ml", "millilitres": "ml", "mls": "ml",
+    "cups": "cup", "c": "cup",
+    "tablespoon": "tbsp", "tablespoons": "tbsp", "tbs": "tbsp", "tbsps": "tbsp", "tb": "tbsp",
+    "teaspoon": "tsp", "teaspoons": "tsp", "tsps": "tsp",
+    "pints": "pint", "pt": "pint",
+    "gallons": "gallon", "gal": "gallon",
+    "piece": "pieces", "pc": "pieces", "pcs": "pieces", "unit": "pieces", "units": "pieces",
+    "fillet": "fillets",
+}
+
+# Units not in CONVERSION_MAP ("cloves", "large", "", ...) are counted as pieces.
+DEFAULT_UNIT = "pieces"
+
+
+def normalize_unit(unit):
+    """Return the CONVERSION_MAP key for a unit name, or DEFAULT_UNIT if it is not a known unit."""
+    unit = (unit or "").strip().rstrip(".")
+    if unit in CONVERSION_MAP:
+        return unit
+    lowered = unit.lower()
+    if lowered in CONVERSION_MAP:
+        return lowered
+    return UNIT_ALIASES.get(lowered, DEFAULT_UNIT)
+
+
+def to_canonical(quantity, unit):
+    """Return (canonical unit, quantity in that unit) for a quantity in any known unit."""
+    canonical_unit, factor = CONVERSION_MAP[normalize_unit(unit)]
+    return canonical_unit, quantity * factor
+
+
+# The unit graph, precompiled: position of every CONVERSION_MAP key, the kind
+# (canonical unit) it belongs to and its factor to that canonical unit.
+_UNITS = list(CONVERSION_MAP)
+_UNIT_INDEX = {unit: i for i, unit in enumerate(_UNITS)}
+_KINDS = sorted({canonical for canonical, factor in CONVERSION_MAP.values()})
+_KIND = [_KINDS.index(CONVERSION_MAP[unit][0]) for unit in _UNITS]
+_FACTOR = [float(CONVERSION_MAP[unit][1]) for unit in _UNITS]
+_MASS, _VOLUME = _KINDS.index("g"), _KINDS.index("ml")
+if np is not None:
+    _KIND_ARRAY = np.array(_KIND)
+    _FACTOR_ARRAY = np.array(_FACTOR)
+
+
+@lru_cache(maxsize=1024)
+def unit_index(unit):
+    """Position of a unit name (any spelling normalize_unit knows) in the precompiled tables."""
+    return _UNIT_INDEX[normalize_unit(unit)]
+
+
+def _convert_index(quantity, source, target, density):
+    base = quantity * _FACTOR[source]
+    if _KIND[source] != _KIND[target]:
+        if not density or {_KIND[source], _KIND[target]} != {_MASS, _VOLUME}:
+            return None
+        base = base * density if _KIND[source] == _VOLUME else base / density
+    return base / _FACTOR[target]
+
+
+def convert(quantity, from_unit, to_unit, density=None):
+    """
+    Convert a quantity between units. Units of different kinds give None, except
+    mass and volume when a density (g/ml) is given.
+    """
+    return _convert_index(quantity, unit_index(from_unit), unit_index(to_unit), density)
+
+
+class _IndexLookup(dict):
+    def __missing__(self, unit):
+        index = self[unit] = unit_index(unit)
+        return index
+
+
+# Distinct names a NumPy array of units is scanned for before np.unique takes over.
+_ARRAY_SCANS = 16
+
+
+def _array_indices(units):
+    # One vectorized comparison per distinct name, in order of first appearance;
+    # a column holds a handful of units, and np.unique would sort all the strings.
+    indices = np.empty(len(units), dtype=np.intp)
+    pending = np.ones(len(units), dtype=bool)
+    for _ in range(_ARRAY_SCANS):
+        first = pending.argmax()
+        if not pending[first]:
+            return indices
+        same = units == units[first]
+        indices[same] = unit_index(str(units[first]))
+        pending &= ~same
+    if pending.any():
+        names, inverse = np.unique(units[pending], return_inverse=True)
+        indices[pending] = np.array([unit_index(str(name)) for name in names], dtype=np.intp)[inverse.reshape(-1)]
+    return indices
+
+
+def _indices(units, size):
+    """Table positions of `units` (one unit name, or a sequence of `size` names)."""
+    if isinstance(units, str):
+        index = unit_index(units)
+        return [index] * size if np is None else np.full(size, index, dtype=np.intp)
+    if np is not None and isinstance(units, np.ndarray):
+        return _array_indices(units) if size else np.empty(0, dtype=np.intp)
+    # Normalize each distinct spelling once (on its first miss); the rest are plain dict hits.
+    lookup = _IndexLookup()
+    if np is None:
+        return list(map(lookup.__getitem__, units))
+    return np.fromiter(map(lookup.__getitem__, units), dtype=np.intp, count=size)
+
+
+def convert_many(quantities, from_units, to_units, densities=None):
+    """
+    Convert many quantities at once. `from_units` and `to_units` are sequences
+    of unit names (lists, or NumPy string arrays) as long as `quantities`, or
+    one unit name for all of them; `densities` (g/ml, None for unknown) is
+    needed only across mass and volume.
+    Returns a NumPy float array, or a list of floats without NumPy; quantities
+    that cannot be converted come back as NaN.
+    """
+    quantities = list(quantities) if np is None else np.asarray(quantities, dtype=float)
+    size = len(quantities)
+    sources, targets = _indices(from_units, size), _indices(to_units, size)
+    if np is None:
+        if densities is None:
+            densities = [None] * size
+        results = []
+        for quantity, source, target, density in zip(quantities, sources, targets, densities):
+            result = _convert_index(quantity, source, target, density)
+            results.append(math.nan if result is None else result)
+        return results
+    source_kind, target_kind = _KIND_ARRAY[sources], _KIND_ARRAY[targets]
+    base = quantities * _FACTOR_ARRAY[sources]
+    result = np.where(source_kind == target_kind, base, np.nan)
+    if densities is not None:
+        density = np.array(densities, dtype=float)  # None becomes NaN
+        density[density <= 0] = np.nan
+        result = np.where((source_kind == _VOLUME) & (target_kind == _MASS), base * density, result)
+        result = np.where((source_kind == _MASS) & (target_kind == _VOLUME), base / density, result)
+    return result / _FACTOR_ARRAY[targets]
+
+
+# Keyword heuristics for the unit of a catalog ingredient that comes without one
+# (carried over from the old fetch_ingredients.py script).
+_UNIT_KEYWORDS = [
+    (("milk", "water", "oil"), "ml"),
+    (("egg",), "pieces"),
+    (("flour", "sugar", "salt"), "g"),
+]
+GUESSED_UNIT_DEFAULT = "g"
+
+
+def guess_unit(ingredient_name):
+    """Return a canonical unit for an ingredient name."""
+    lower_name = ingredient_name.lower()
+    for terms, unit in _UNIT_KEYWORDS:
+        if any(term in lower_name for term in terms):
+            return unit
+    return GUESSED_UNIT_DEFAULT
+
+
+# Grams per milliliter for common ingredients; the first matching keyword wins,
+# so more specific names come first.
+_DENSITY_KEYWORDS = [
+    (("peanut butter",), 1.09),
+    (("butter", "margarine"), 0.91),
+    (("oil",), 0.92),
+    (("honey",), 1.42),
+    (("syrup", "molasses"), 1.33),
+    (("cream",), 1.01),
+    (("milk", "yogurt", "yoghurt"), 1.03),
+    (("water", "broth", "stock", "juice", "vinegar", "wine", "sauce"), 1.0),
+    (("flour", "cocoa"), 0.53),
+    (("powdered sugar", "icing sugar"), 0.56),
+    (("brown sugar",), 0.83),
+    (("sugar",), 0.85),
+    (("salt",), 1.2),
+    (("rice",), 0.85),
+    (("oats",), 0.41),
+]
+
+
+def guess_density(ingredient_name):
+    """Return a typical density (g/ml) for an ingredient name, or None if it is not known."""
+    lower_name = ingredient_name.lower()
+    for terms, density in _DENSITY_KEYWORDS:
+        if any(term in lower_name for term in terms):
+            return density
+    return None
+
+
+def density_of(ingredient):
+    """The density to convert an Ingredient's quantities with: its own, else a guess from its name."""
+    return ingredient.density or guess_density(ingredient.name)
@@ -17,9 +17,13 @@ urlpatterns = [
     path('ingredients/delete/<int:ingredient_id>/', views.delete_ingredient, name='delete_ingredient'),
     path('meal-plans/', views.meal_plan_list, name='meal_plan_list'),
     path('meal-plans/add/', views.add_meal_plan, name='add_meal_plan'),
+    path('meal-plans/bulk/', views.bulk_add_meal_plans, name='bulk_add_meal_plans'),
     path('grocery-list/', views.grocery_list, name='grocery_list'),
     path('external-recipes/', views.search_external_recipes, name='external_recipe_search'),
+    path('external-recipes/import/', views.import_external_recipes, name='import_external_recipes'),
     path('ingredients/', views.ingredient_list, name='ingredient_list'),
+    path('ingredients/autocomplete/', views.ingredient_autocomplete, name='ingredient_autocomplete'),
+    path('ingredients/<int:ingredient_id>/recipes/', views.ingredient_recipes, name='ingredient_recipes'),
     path('auto-grocery/', views.auto_generate_grocery_list, name='auto_generate_grocery_list'),
     path('add-missing/', views.add_missing_to_grocery_list, name='add_missing_to_grocery_list'),
     path('confirm-purchase/<int:grocery_item_id>/', views.confirm_purchase, name='confirm_purchase'),
@@ -29,6 +33,7 @@ urlpatterns = [
     path('recipes/delete/<int:pk>/', views.delete_recipe, name='delete_recipe'),
     path('recipes/<int:pk>/cook/', views.cook_recipe_view, name='cook_recipe'),
     path('recipes/<int:pk>/confirm-cook/', views.confirm_cook_recipe, name='confirm_cook_recipe'),
+    path('grocery-list/checkout/', views.grocery_checkout, name='grocery_checkout'),
     path('grocery-list/add/', views.add_to_grocery_list, name='add_to_grocery_list'),
     path('grocery-list/remove/<int:grocery_item_id>/', views.remove_grocery_item, name='remove_grocery_item'),
     path('meal-plan/remove/<int:plan_id>/', views.remove_meal_plan, name='remove_meal_plan'),
@@ -4,46 +4,70 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import login
 from datetime import datetime
-import requests
+import json
 
-from django.conf import settings
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Prefetch
+from django.core.paginator import Paginator
 from django.forms import inlineformset_factory
+from django.http import Http404, JsonResponse
 
 from .models import (Recipe, InventoryItem, MealPlan, RecipeIngredient, Ingredient, 
-                     GroceryList, GroceryListItem)
+                     GroceryList, GroceryListItem, normalize_ingredient_name)
 from .forms import (RecipeForm, InventoryItemForm, MealPlanForm, RecipeIngredientForm, 
-                    BaseRecipeIngredientInlineFormSet)
+                    BaseRecipeIngredientInlineFormSet, BulkMealPlanForm, GroceryCheckoutForm,
+                    MealPlanEntryFormSet, RecipeImportForm)
+from .cookability import indexed_missing_counts
+from . import grocery, ingredient_usage, inventory, meal_plans, recipe_import, search, spoonacular
+from .ingredient_index import get_index
+
+INGREDIENTS_PER_PAGE = 50
+RECIPES_PER_PAGE = 50
+AUTOCOMPLETE_MAX_PAGE_SIZE = 50
+MAX_GROCERY_WINDOW_DAYS = 366
+STOCK_CONFLICT_MESSAGE = "Your inventory changed while the ingredients were being reserved; please try again."
+
+
+def _ingredient_page(ids, page_number):
+    # Paginate a list of ingredient ids and load only the current page's rows.
+    page = Paginator(ids, INGREDIENTS_PER_PAGE).get_page(page_number)
+    by_id = Ingredient.objects.in_bulk(list(page.object_list))
+    return page, [by_id[i] for i in page.object_list if i in by_id]
 
 def home(request):
     return render(request, 'core/home.html')
 
 def recipe_list(request):
     query = request.GET.get('q', '')
-    recipes = Recipe.objects.all()
+    recipes = Recipe.objects.select_related('author')
     
     if query:
-        recipes = recipes.filter(title__icontains=query)
+        # Full-text search over title, description, instructions and ingredient names, ranked by the database.
+        recipes = search.search_recipes(query, recipes)
+    else:
+        recipes = recipes.order_by('-id')
+    page = Paginator(recipes, RECIPES_PER_PAGE).get_page(request.GET.get('page'))
+    recipes = list(page.object_list)
 
-    sufficient_recipe_ids = []
+    sufficient_recipe_ids = set()
     if request.user.is_authenticated:
-        user_inventory = {item.ingredient.id: item.current_stock for item in InventoryItem.objects.filter(user=request.user)}
-        for recipe in recipes:
-            enough = True
-            for ri in recipe.recipeingredient_set.all():
-                if user_inventory.get(ri.ingredient.id, 0) < ri.quantity:
-                    enough = False
-                    break
-            if enough:
-                sufficient_recipe_ids.append(recipe.id)
+        # Indexed read from the materialized cookability table (see core/cookability.py).
+        missing_counts = indexed_missing_counts(request.user, [recipe.id for recipe in recipes])
+        sufficient_recipe_ids = {rid for rid, n in missing_counts.items() if n == 0}
 
     return render(request, 'core/recipe_list.html', {
         'recipes': recipes,
+        'page_obj': page,
         'sufficient_recipe_ids': sufficient_recipe_ids,
         'query': query,
     })
 
 def recipe_detail(request, pk):
-    recipe = get_object_or_404(Recipe, pk=pk)
+    # The ingredient lines with their ingredients in one query, not one per line.
+    lines = Prefetch('recipeingredient_set', queryset=RecipeIngredient.objects.select_related('ingredient'))
+    recipe = get_object_or_404(Recipe.objects.prefetch_related(lines), pk=pk)
     return render(request, 'core/recipe_detail.html', {'recipe': recipe})
 
 @login_required
@@ -107,20 +131,32 @@ def signup(request):
 @login_required
 def inventory_list(request):
     query = request.GET.get('query', '')
+    page_number = request.GET.get('page')
 
-    in_stock_items = InventoryItem.objects.filter(user=request.user, current_stock__gt=0)
-    if query:
-        in_stock_items = in_stock_items.filter(ingredient__name__icontains=query)
-
-    in_stock_ids = in_stock_items.values_list('ingredient_id', flat=True)
-    missing_ingredients = Ingredient.objects.all()
+    in_stock_items = (InventoryItem.objects.filter(user=request.user, current_stock__gt=0)
+                      .select_related('ingredient'))
     if query:
-        missing_ingredients = missing_ingredients.filter(name__icontains=query)
-    missing_ingredients = missing_ingredients.exclude(id__in=in_stock_ids)
+        # Match names through the in-memory ingredient index instead of scanning the catalog.
+        matched_ids = get_index().search(query)
+        matched = set(matched_ids)
+        in_stock_items = [item for item in in_stock_items if item.ingredient_id in matched]
+        in_stock_ids = {item.ingredient_id for item in in_stock_items}
+        page, missing_ingredients = _ingredient_page(
+            [i for i in matched_ids if i not in in_stock_ids], page_number
+        )
+    else:
+        in_stock_ids = InventoryItem.objects.filter(
+            user=request.user, current_stock__gt=0
+        ).values_list('ingredient_id', flat=True)
+        page = Paginator(
+            Ingredient.objects.exclude(id__in=in_stock_ids).order_by('name'), INGREDIENTS_PER_PAGE
+        ).get_page(page_number)
+        missing_ingredients = page.object_list
     
     context = {
         'in_stock_items': in_stock_items,
         'missing_ingredients': missing_ingredients,
+        'page_obj': page,
         'query': query,
     }
     return render(request, 'core/inventory_list.html', context)
@@ -131,17 +167,9 @@ def add_inventory_item(request):
         form = InventoryItemForm(request.POST)
         if form.is_valid():
             temp_item = form.save(commit=False)
-            # Check if an inventory item for this user and ingredient already exists
-            existing = InventoryItem.objects.filter(user=request.user, ingredient=temp_item.ingredient).first()
-            if existing:
-                # Add the entered stock to the existing current_stock
-                existing.current_stock += temp_item.current_stock
-                existing.save()
-                return redirect('inventory_list')
-            else:
-                temp_item.user = request.user
-                temp_item.save()
-                return redirect('inventory_list')
+            # Add the entered stock to the user's row for this ingredient (created if needed).
+            inventory.add_stock(request.user, {temp_item.ingredient_id: temp_item.current_stock}, 'restock')
+            return redirect('inventory_list')
     else:
         form = InventoryItemForm()
     return render(request, 'core/add_inventory_item.html', {'form': form})
@@ -150,9 +178,17 @@ def add_inventory_item(request):
 def update_inventory(request, pk):
     item = get_object_or_404(InventoryItem, pk=pk, user=request.user)
     if request.method == 'POST':
+        old_ingredient_id = item.ingredient_id
         form = InventoryItemForm(request.POST, instance=item)
         if form.is_valid():
-            form.save()
+            updated = form.save(commit=False)
+            with transaction.atomic():
+                if updated.ingredient_id == old_ingredient_id:
+                    inventory.set_stock(request.user, old_ingredient_id, updated.current_stock)
+                else:
+                    # Switching ingredient moves the stock over to that ingredient's row.
+                    inventory.set_stock(request.user, old_ingredient_id, 0)
+                    inventory.add_stock(request.user, {updated.ingredient_id: updated.current_stock}, 'adjustment')
             return redirect('inventory_list')
     else:
         form = InventoryItemForm(instance=item)
@@ -170,9 +206,7 @@ def add_stock(request, ingredient_id):
         except (ValueError, TypeError):
             error = "Please enter a valid positive number."
             return render(request, 'core/add_stock.html', {'ingredient': ingredient, 'error': error})
-        inv, created = InventoryItem.objects.get_or_create(user=request.user, ingredient=ingredient, defaults={'current_stock': 0})
-        inv.current_stock += stock
-        inv.save()
+        inventory.add_stock(request.user, {ingredient.id: stock}, 'restock')
         # Redirect to inventory management page instead of ingredients list.
         return redirect('inventory_list')
     return render(request, 'core/add_stock.html', {'ingredient': ingredient})
@@ -186,18 +220,27 @@ def delete_ingredient(request, ingredient_id):
     if ingredient.is_predefined:
         messages.error(request, "Cannot delete a pre-defined ingredient.")
         return redirect('ingredient_list')
-    # Check if the ingredient is used in any recipe.
-    if ingredient.recipeingredient_set.exists():
+    # An index-only probe of the ingredient -> recipe index.
+    if ingredient_usage.recipes_using(ingredient).exists():
         messages.error(request, "Cannot delete ingredient because it is used in a recipe.")
         return redirect('ingredient_list')
-    ingredient.delete()
+    ingredient_usage.delete_ingredient(ingredient)
     messages.success(request, "Ingredient deleted successfully.")
     return redirect('ingredient_list')
 
+def ingredient_recipes(request, ingredient_id):
+    """The recipes that use one ingredient, read from the ingredient -> recipe index."""
+    ingredient = get_object_or_404(Ingredient, id=ingredient_id)
+    recipes = ingredient_usage.recipes_using(ingredient).select_related('author').order_by('title', 'id')
+    page = Paginator(recipes, RECIPES_PER_PAGE).get_page(request.GET.get('page'))
+    return render(request, 'core/ingredient_recipes.html', {
+        'ingredient': ingredient, 'recipes': page.object_list, 'page_obj': page,
+    })
+
 @login_required
 def meal_plan_list(request):
-    meal_plans = MealPlan.objects.filter(user=request.user).order_by('date')
-    return render(request, 'core/meal_plan_list.html', {'meal_plans': meal_plans})
+    plans = MealPlan.objects.filter(user=request.user).select_related('recipe').order_by('date')
+    return render(request, 'core/meal_plan_list.html', {'meal_plans': plans})
 
 @login_required
 def add_meal_plan(request):
@@ -206,91 +249,180 @@ def add_meal_plan(request):
         if form.is_valid():
             meal_plan = form.save(commit=False)
             meal_plan.user = request.user
-            recipe = meal_plan.recipe
-            missing = {}
-            # Check each recipe ingredient against inventory.
-            for ri in recipe.recipeingredient_set.all():
-                req_qty = ri.quantity
-                inv = InventoryItem.objects.filter(user=request.user, ingredient=ri.ingredient).first()
-                available = inv.current_stock if inv else 0
-                if available < req_qty:
-                    missing[ri.ingredient] = req_qty - available
+            # Lock, check and deduct every ingredient in one reservation.
+            try:
+                with transaction.atomic():
+                    missing = inventory.reserve_stock(
+                        request.user, inventory.recipe_requirements(meal_plan.recipe), 'meal_plan'
+                    )
+                    if not missing:
+                        meal_plan.save()
+            except inventory.ReservationConflict:
+                messages.error(request, STOCK_CONFLICT_MESSAGE)
+                return render(request, 'core/add_meal_plan.html', {'form': form})
             if missing:
                 # Render an error page with the missing ingredients.
                 return render(request, 'core/meal_plan_error.html', {'missing': missing, 'form': form})
-            else:
-                # Deduct required quantities from inventory.
-                for ri in recipe.recipeingredient_set.all():
-                    inv = InventoryItem.objects.filter(user=request.user, ingredient=ri.ingredient).first()
-                    if inv:
-                        inv.current_stock -= ri.quantity
-                        inv.save()
-                meal_plan.save()
-                return redirect('meal_plan_list')
+            return redirect('meal_plan_list')
     else:
         form = MealPlanForm()
     return render(request, 'core/add_meal_plan.html', {'form': form})
 
+@login_required
+def bulk_add_meal_plans(request):
+    """Schedule many meals at once; accepts the HTML form or a JSON body."""
+    if request.method == 'POST' and request.content_type == 'application/json':
+        return _bulk_add_meal_plans_json(request)
+    recipe_choices = list(Recipe.objects.order_by('title').values_list('id', 'title'))
+    if request.method == 'POST':
+        form = BulkMealPlanForm(request.POST)
+        formset = MealPlanEntryFormSet(request.POST, form_kwargs={'recipe_choices': recipe_choices})
+        if form.is_valid() and formset.is_valid():
+            try:
+                result = meal_plans.schedule_meals(request.user, formset.entries(), form.cleaned_data['mode'])
+            except inventory.ReservationConflict:
+                messages.error(request, STOCK_CONFLICT_MESSAGE)
+                return render(request, 'core/bulk_add_meal_plans.html', {'form': form, 'formset': formset})
+            if result['scheduled']:
+                messages.success(request, f"Scheduled {len(result['scheduled'])} meal(s).")
+            if not result['missing']:
+                return redirect('meal_plan_list')
+            return render(request, 'core/meal_plan_error.html', {
+                'missing': result['missing'],
+                'scheduled_count': len(result['scheduled']),
+                'skipped_count': len(result['skipped']),
+            })
+    else:
+        form = BulkMealPlanForm()
+        formset = MealPlanEntryFormSet(form_kwargs={'recipe_choices': recipe_choices})
+    return render(request, 'core/bulk_add_meal_plans.html', {'form': form, 'formset': formset})
+
+def _bulk_add_meal_plans_json(request):
+    # {"mode": "all_or_nothing" | "best_effort", "meals": [{"recipe": id, "date": "YYYY-MM-DD"}, ...]}
+    try:
+        payload = json.loads(request.body)
+        mode = payload.get('mode', meal_plans.ALL_OR_NOTHING)
+        entries = [(int(meal['recipe']), datetime.strptime(meal['date'], '%Y-%m-%d').date())
+                   for meal in payload['meals']]
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JsonResponse({'error': "Expected {'mode': ..., 'meals': [{'recipe': id, 'date': 'YYYY-MM-DD'}]}."},
+                            status=400)
+    if mode not in dict(meal_plans.SCHEDULE_MODES):
+        return JsonResponse({'error': f"Unknown mode {mode!r}."}, status=400)
+    recipe_ids = {recipe_id for recipe_id, date in entries}
+    unknown = recipe_ids - set(Recipe.objects.filter(id__in=recipe_ids).values_list('id', flat=True))
+    if unknown:
+        return JsonResponse({'error': "Unknown recipe id(s).", 'recipes': sorted(unknown)}, status=400)
+    try:
+        result = meal_plans.schedule_meals(request.user, entries, mode)
+    except inventory.ReservationConflict:
+        return JsonResponse({'error': STOCK_CONFLICT_MESSAGE}, status=409)
+    return JsonResponse({
+        'scheduled': [{'recipe': plan.recipe_id, 'date': plan.date.isoformat()} for plan in result['scheduled']],
+        'skipped': [{'recipe': recipe_id, 'date': date.isoformat()} for recipe_id, date in result['skipped']],
+        'missing': [{'ingredient': ingredient.id, 'name': ingredient.name, 'quantity': qty}
+                    for ingredient, qty in result['missing'].items()],
+    }, status=200 if result['scheduled'] or not result['missing'] else 409)
+
 @login_required
 def grocery_list(request):
     glist = GroceryList.objects.filter(user=request.user, is_complete=False).order_by('-created_at').first()
     if glist:
-         items = glist.items.all()
+         items = glist.items.select_related('ingredient')
     else:
          items = []
     return render(request, 'core/grocery_list.html', {'items': items})
 
-def search_external_recipes(request):
+async def search_external_recipes(request):
+    # Native async view: under ASGI the wait on Spoonacular does not hold a worker thread.
     query = request.GET.get('query', '')
     results = []
     error = None
     if query:
-        api_key = settings.SPOONACULAR_API_KEY
-        url = f"https://api.spoonacular.com/recipes/complexSearch?query={query}&apiKey={api_key}&number=10"
         try:
-            response = requests.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                results = data.get('results', [])
-            else:
-                error = f"API returned status code {response.status_code}"
-        except Exception as e:
+            results = await spoonacular.get_async_client().search_recipes(query)
+        except spoonacular.SpoonacularError as e:
             error = str(e)
     context = {
         'query': query,
         'results': results,
         'error': error,
     }
-    return render(request, 'core/external_recipe_search.html', context)
+    # Rendering touches the session and user (database), which must run in sync context.
+    return await sync_to_async(render)(request, 'core/external_recipe_search.html', context)
+
+@login_required
+def import_external_recipes(request):
+    # Import many external recipes at once: ids picked on the search page, or an uploaded dump.
+    form = RecipeImportForm()
+    if request.method == 'POST':
+        recipes = None
+        if request.POST.getlist('recipe_ids'):
+            try:
+                recipes = spoonacular.get_client().recipe_information(request.POST.getlist('recipe_ids'))
+            except (spoonacular.SpoonacularError, ValueError) as e:
+                messages.error(request, f"Could not fetch the selected recipes: {e}")
+                return redirect('external_recipe_search')
+        else:
+            form = RecipeImportForm(request.POST, request.FILES)
+            if form.is_valid():
+                try:
+                    recipes = recipe_import.load_dump(form.cleaned_data['dump'])
+                except recipe_import.RecipeImportError as e:
+                    form.add_error('dump', f"Not a valid recipe dump: {e}")
+        if recipes is not None:
+            stats = recipe_import.import_recipes(request.user, recipes)
+            messages.success(request, f"Imported {stats['created']} recipe(s); "
+                                      f"{stats['skipped']} had already been imported.")
+            return redirect('recipe_list')
+    return render(request, 'core/import_recipes.html', {'form': form})
 
 def ingredient_list(request):
     query = request.GET.get('query', '')
+    page_number = request.GET.get('page')
     if query:
-        ingredients = Ingredient.objects.filter(name__icontains=query)
+        page, ingredients = _ingredient_page(get_index().search(query), page_number)
     else:
-        ingredients = Ingredient.objects.all()
-    return render(request, 'core/ingredient_list.html', {'ingredients': ingredients, 'query': query})
+        page = Paginator(Ingredient.objects.order_by('name'), INGREDIENTS_PER_PAGE).get_page(page_number)
+        ingredients = page.object_list
+    return render(request, 'core/ingredient_list.html', {
+        'ingredients': ingredients, 'page_obj': page, 'query': query,
+    })
+
+def ingredient_autocomplete(request):
+    """JSON autocomplete over ingredient names, served from the in-memory index."""
+    query = request.GET.get('q', '')
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+        page_size = min(max(int(request.GET.get('page_size', 10)), 1), AUTOCOMPLETE_MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': "page and page_size must be integers."}, status=400)
+    index = get_index()
+    # An empty query returns nothing rather than the whole catalog.
+    ids = index.search(query) if query.strip() else []
+    start = (page - 1) * page_size
+    results = []
+    for ingredient_id in ids[start:start + page_size]:
+        name, unit = index.get(ingredient_id)
+        results.append({'id': ingredient_id, 'name': name, 'measurement_unit': unit})
+    return JsonResponse({
+        'query': query,
+        'page': page,
+        'total': len(ids),
+        'has_next': start + page_size < len(ids),
+        'results': results,
+    })
 
 @login_required
 def auto_generate_grocery_list(request):
-    meal_plans = MealPlan.objects.filter(user=request.user)
-    required = {}
-    for mp in meal_plans:
-        for ri in mp.recipe.recipeingredient_set.all():
-            required[ri.ingredient] = required.get(ri.ingredient, 0) + ri.quantity
-
-    inventory = {item.ingredient: item.current_stock for item in InventoryItem.objects.filter(user=request.user)}
-    missing = {}
-    for ingredient, req_qty in required.items():
-        available = inventory.get(ingredient, 0)
-        deficit = req_qty - available
-        if deficit > 0:
-            missing[ingredient] = deficit
-
-    if missing:
-        grocery_list = GroceryList.objects.create(user=request.user)
-        for ingredient, qty in missing.items():
-            GroceryListItem.objects.create(grocery_list=grocery_list, ingredient=ingredient, total_quantity=qty)
+    # Shop for the meal plans of the next ?days= days (default a week); ?new=1 starts a
+    # fresh list instead of merging into the open one.
+    try:
+        days = min(max(int(request.GET.get('days', grocery.DEFAULT_WINDOW_DAYS)), 1), MAX_GROCERY_WINDOW_DAYS)
+    except ValueError:
+        days = grocery.DEFAULT_WINDOW_DAYS
+    start, end = grocery.default_window(days)
+    grocery.generate_grocery_list(request.user, start, end, merge=not request.GET.get('new'))
     # Redirect to the grocery list page.
     return redirect('grocery_list')
 
@@ -300,20 +432,18 @@ def add_missing_to_grocery_list(request):
         missing = {}
         for key, value in request.POST.items():
             if key.startswith("missing_"):
-                ing_id = key.replace("missing_", "")
                 try:
-                    missing[ing_id] = float(value)
+                    qty = float(value)
+                    ing_id = int(key[len("missing_"):])
                 except ValueError:
                     continue
+                if qty > 0:
+                    missing[ing_id] = qty
         if missing:
-            grocery_list = GroceryList.objects.create(user=request.user)
-            for ing_id, qty in missing.items():
-                ingredient = get_object_or_404(Ingredient, id=ing_id)
-                GroceryListItem.objects.create(
-                    grocery_list=grocery_list,
-                    ingredient=ingredient,
-                    total_quantity=qty
-                )
+            # Validate every posted id with one lookup, then merge into the open list.
+            if len(Ingredient.objects.in_bulk(list(missing))) != len(missing):
+                raise Http404("Unknown ingredient.")
+            grocery.merge_into_list(grocery.open_grocery_list(request.user), missing, accumulate=True)
         return redirect('grocery_list')
     return redirect('add_meal_plan')
 
@@ -335,19 +465,36 @@ def confirm_purchase(request, grocery_item_id):
                      f"{item.ingredient.measurement_unit}.")
             return render(request, 'core/confirm_purchase.html', {'item': item, 'error': error})
         
-        # If purchase is sufficient, update inventory.
-        inv, created = InventoryItem.objects.get_or_create(
-            user=request.user, 
-            ingredient=item.ingredient,
-            defaults={'current_stock': 0}
-        )
-        inv.current_stock += purchased
-        inv.save()
-        # Once confirmed, remove the grocery list item.
-        item.delete()
+        # If purchase is sufficient, update inventory and remove the grocery list item.
+        with transaction.atomic():
+            inventory.add_stock(request.user, {item.ingredient_id: purchased}, 'purchase')
+            item.delete()
         return redirect('grocery_list')
     return render(request, 'core/confirm_purchase.html', {'item': item})
 
+@login_required
+def grocery_checkout(request):
+    # Confirm the purchase of every item on the open list in one request.
+    glist = grocery.open_grocery_list(request.user, create=False)
+    if glist is None:
+        return redirect('grocery_list')
+    items = glist.items.select_related('ingredient')
+    form = GroceryCheckoutForm(request.POST or None, items=items)
+    if request.method == 'POST' and form.is_valid():
+        try:
+            checked_out = grocery.checkout(request.user, glist, form.purchased())
+        except grocery.ShortPurchase:
+            # The list changed while the form was open.
+            messages.error(request, "The grocery list changed; please confirm the quantities again.")
+            return redirect('grocery_checkout')
+        if not checked_out:
+            # A concurrent submit claimed the list first and added the stock.
+            messages.info(request, "This grocery list was already checked out.")
+            return redirect('grocery_list')
+        messages.success(request, "Grocery list checked out and your inventory was updated.")
+        return redirect('grocery_list')
+    return render(request, 'core/grocery_checkout.html', {'form': form})
+
 from .forms import AddNewIngredientForm, UpdateStockForm
 @login_required
 def add_new_ingredient(request):
@@ -355,8 +502,8 @@ def add_new_ingredient(request):
         form = AddNewIngredientForm(request.POST)
         if form.is_valid():
             instance = form.save(commit=False)
-            instance.user = request.user  # assign the logged-in user
-            instance.save()
+            # Stock goes to the logged-in user's row for the ingredient (added if it already exists).
+            inventory.add_stock(request.user, {instance.ingredient_id: instance.current_stock}, 'restock')
             return redirect('inventory_list')
     else:
         form = AddNewIngredientForm()
@@ -368,7 +515,7 @@ def update_stock(request, pk):
     if request.method == 'POST':
         form = UpdateStockForm(request.POST, instance=item)
         if form.is_valid():
-            form.save()
+            inventory.set_stock(request.user, item.ingredient_id, form.cleaned_data['current_stock'])
             return redirect('inventory_list')
     else:
         form = UpdateStockForm(instance=item)
@@ -396,12 +543,23 @@ def edit_nonpredefined_ingredient(request, ingredient_id):
         # Use a simple form that we build inline.
         name = request.POST.get('name', '').strip()
         measurement_unit = request.POST.get('measurement_unit', '').strip()
+        density = request.POST.get('density', '').strip()
+        try:
+            density = float(density) if density else None
+            valid_density = density is None or density > 0
+        except ValueError:
+            valid_density = False
         if not name or not measurement_unit:
             messages.error(request, "Both name and measurement unit are required.")
+        elif not valid_density:
+            messages.error(request, "Density must be a positive number of grams per milliliter.")
+        elif Ingredient.objects.filter(normalized_name=normalize_ingredient_name(name)).exclude(id=ingredient.id).exists():
+            messages.error(request, f'An ingredient named "{name}" already exists.')
         else:
             # Update the ingredient.
             ingredient.name = name
             ingredient.measurement_unit = measurement_unit
+            ingredient.density = density
             ingredient.save()
             messages.success(request, "Ingredient updated successfully.")
             return redirect('inventory_list')
@@ -409,27 +567,26 @@ def edit_nonpredefined_ingredient(request, ingredient_id):
 
 @login_required
 def delete_nonpredefined_ingredient(request, ingredient_id):
-    from .models import GroceryListItem, MealPlan, Recipe
     ingredient = get_object_or_404(Ingredient, id=ingredient_id)
     if ingredient.is_predefined:
         messages.error(request, "Predefined ingredients cannot be deleted.")
         return redirect('inventory_list')
     
     if request.method == 'POST':
-        # Cascade deletion: 
-        # 1. Find recipes that use this ingredient and delete them.
-        recipes_to_delete = Recipe.objects.filter(recipeingredient__ingredient=ingredient).distinct()
-        for recipe in recipes_to_delete:
-            recipe.delete()
-        # 2. Delete inventory items for this ingredient.
-        InventoryItem.objects.filter(ingredient=ingredient).delete()
-        # 3. Delete grocery list items for this ingredient.
-        GroceryListItem.objects.filter(ingredient=ingredient).delete()
-        # Optionally, if meal plans depend on recipes, they may be cascade-deleted if the foreign key is set with on_delete=CASCADE.
-        ingredient.delete()
-        messages.success(request, "Ingredient and all dependent data have been deleted.")
+        # Cascade deletion as a few set-based DELETEs in one transaction: the recipes
+        # using the ingredient, their meal plans, and the inventory and grocery list rows.
+        deleted = ingredient_usage.delete_ingredient(ingredient)
+        messages.success(request, f"Ingredient and all dependent data have been deleted "
+                                  f"({deleted['core.Recipe']} recipe(s)).")
         return redirect('inventory_list')
-    return render(request, 'core/confirm_delete_ingredient.html', {'ingredient': ingredient})
+    return render(request, 'core/confirm_delete_ingredient.html', {
+        'ingredient': ingredient, 'impact': _impact_rows(ingredient_usage.deletion_impact(ingredient)),
+    })
+
+def _impact_rows(impact):
+    # [(verbose name plural, count)] for the tables that would lose rows.
+    return [(apps.get_model(label)._meta.verbose_name_plural, count)
+            for label, count in impact.items() if count and label != 'core.Ingredient']
 
 @login_required
 def delete_recipe(request, pk):
@@ -447,32 +604,22 @@ def delete_recipe(request, pk):
 @login_required
 def cook_recipe_view(request, pk):
     recipe = get_object_or_404(Recipe, pk=pk)
-    ingredients = recipe.recipeingredient_set.all()
+    ingredients = recipe.recipeingredient_set.select_related('ingredient')
     return render(request, 'core/cook_recipe.html', {'recipe': recipe, 'ingredients': ingredients})
 
 @login_required
 def confirm_cook_recipe(request, pk):
     recipe = get_object_or_404(Recipe, pk=pk)
-    ingredients = recipe.recipeingredient_set.all()
-
-    user_inventory = {item.ingredient.id: item for item in InventoryItem.objects.filter(user=request.user)}
-
-    missing = {}
-    for ri in ingredients:
-        inventory_item = user_inventory.get(ri.ingredient.id)
-        available = inventory_item.current_stock if inventory_item else 0
-        if available < ri.quantity:
-            missing[ri.ingredient] = ri.quantity - available
 
+    # If enough ingredients, deduct them; otherwise nothing is changed.
+    try:
+        missing = inventory.reserve_stock(request.user, inventory.recipe_requirements(recipe), 'cook')
+    except inventory.ReservationConflict:
+        messages.error(request, STOCK_CONFLICT_MESSAGE)
+        return redirect('cook_recipe', pk=recipe.pk)
     if missing:
         return render(request, 'core/cook_recipe_error.html', {'missing': missing, 'recipe': recipe})
 
-    # If enough ingredients, deduct them
-    for ri in ingredients:
-        inventory_item = user_inventory.get(ri.ingredient.id)
-        inventory_item.current_stock -= ri.quantity
-        inventory_item.save()
-
     messages.success(request, f"Successfully cooked {recipe.title} and updated your inventory!")
     return redirect('recipe_list')
 
@@ -498,8 +645,8 @@ def add_to_grocery_list(request):
             )
             return redirect('grocery_list')
 
-    ingredients = Ingredient.objects.all()
-    return render(request, 'core/add_to_grocery_list.html', {'ingredients': ingredients})
+    # Ingredients are picked through the autocomplete endpoint rather than a full <select>.
+    return render(request, 'core/add_to_grocery_list.html')
 
 @login_required
 def remove_grocery_item(request, grocery_item_id):
@@ -512,16 +659,8 @@ def remove_grocery_item(request, grocery_item_id):
 def remove_meal_plan(request, plan_id):
     meal_plan = get_object_or_404(MealPlan, id=plan_id, user=request.user)
     if request.method == 'POST':
-        recipe = meal_plan.recipe
         # Restore ingredients
-        for ri in recipe.recipeingredient_set.all():
-            inventory_item, created = InventoryItem.objects.get_or_create(
-                user=request.user,
-                ingredient=ri.ingredient,
-                defaults={'current_stock': 0}
-            )
-            inventory_item.current_stock += ri.quantity
-            inventory_item.save()
-        
-        meal_plan.delete()
+        with transaction.atomic():
+            inventory.add_stock(request.user, inventory.recipe_demand(meal_plan.recipe_id), 'meal_plan_cancelled')
+            meal_plan.delete()
     return redirect('meal_plan_list')
@@ -42,12 +42,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.query_stats.QueryStatsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.replica.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'recipe_manager.urls'
@@ -71,6 +73,11 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'recipe_manager.wsgi.application'
 SPOONACULAR_API_KEY = '0be22d75f19441339ea1c9e65ef45756'
+# Point at `manage.py spoonacular_stub` to work offline.
+SPOONACULAR_BASE_URL = 'https://api.spoonacular.com'
+SPOONACULAR_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+SPOONACULAR_CACHE_TTL = 600  # seconds
+SPOONACULAR_MAX_CONCURRENCY = 100  # upstream calls in flight per event loop (ASGI)
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
@@ -82,6 +89,58 @@ DATABASES = {
     }
 }
 
+# RECIPE_MANAGER_DB_PROFILE=production: WAL journaling and tuned pragmas, BEGIN IMMEDIATE
+# write transactions with bounded retries while the database is busy (see
+# recipe_manager/sqlite_backend/base.py for the OPTIONS), and connections kept open
+# across requests instead of reopened for each one.
+DB_PROFILE = os.environ.get('RECIPE_MANAGER_DB_PROFILE', 'development')
+if DB_PROFILE == 'production':
+    DATABASES['default'].update({
+        'ENGINE': 'recipe_manager.sqlite_backend',
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            'timeout': 5,  # seconds SQLite waits for a lock before a retry
+            'transaction_mode': 'IMMEDIATE',
+            'busy_retries': 5,
+            'busy_backoff': 0.05,
+        },
+    })
+
+# RECIPE_MANAGER_REPLICA=<path>: the read-only views (REPLICA_READ_VIEWS) read from a
+# replica SQLite file, refreshed from the primary with `manage.py refresh_replica`.
+# After a write, a session reads from the primary for REPLICA_STICKY_SECONDS; keep it
+# above the refresh interval. See core/replica.py.
+if os.environ.get('RECIPE_MANAGER_REPLICA'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['RECIPE_MANAGER_REPLICA'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['core.replica.ReplicaRouter']
+REPLICA_READ_VIEWS = ['recipe_list', 'recipe_detail', 'ingredient_list', 'external_recipe_search']
+REPLICA_STICKY_SECONDS = 30
+
+# Per-request SQL stats (core/query_stats.py): Server-Timing header and debug panel
+# (both default to DEBUG), one JSON log line per request on the `core.query_stats`
+# logger, and query budgets per URL name (and method), enforced as errors under test.
+QUERY_STATS_REPEAT_THRESHOLD = 5  # the same query shape this many times is an N+1
+QUERY_BUDGETS = {
+    'recipe_list': 13,  # includes building the user's cookability index on first visit
+    'recipe_detail': 5,
+    'cook_recipe': 5,
+    'ingredient_list': 5,
+    'ingredient_recipes': 6,
+    'inventory_list': 5,
+    'meal_plan_list': 4,
+    'grocery_list': 5,
+    'grocery_checkout': 5,
+    # Writes: a URL name alone budgets GET requests only.
+    ('grocery_checkout', 'POST'): 21,  # ledger, stock, cookability and demand refreshes; not per item
+    ('confirm_cook_recipe', 'POST'): 17,
+    ('auto_generate_grocery_list', 'POST'): 12,
+}
+QUERY_BUDGET_ENFORCE = False
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -0,0 +1,99 @@
+"""
+SQLite backend for the production database profile (see DATABASES in settings).
+
+On top of Django's sqlite3 backend it
+- runs PRAGMAs on every new connection: WAL journaling, so readers never block
+  the writer; synchronous=NORMAL, which is durable in WAL mode except for the
+  last transactions before a power loss; a larger page cache, memory-mapped
+  reads and in-memory temp tables;
+- starts transactions with BEGIN IMMEDIATE: a write transaction takes the
+  write lock up front instead of failing with "database is locked" when it
+  tries to upgrade a read lock another writer is waiting on;
+- retries a statement outside a transaction (including the BEGIN) when it
+  still finds the database busy after `timeout`, up to `busy_retries` times
+  with exponential backoff and jitter. Statements inside a transaction are not
+  retried: the lock is already held, and a partial transaction cannot be
+  replayed here.
+
+OPTIONS, besides those of sqlite3.connect():
+    pragmas           {name: value}, merged over DEFAULT_PRAGMAS
+    transaction_mode  DEFERRED, IMMEDIATE (default) or EXCLUSIVE
+    busy_retries      retries after the first busy failure (default 5)
+    busy_backoff      seconds before the first retry, doubled each time (default 0.05)
+"""
+import random
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base as sqlite3_base
+from django.db.backends.sqlite3.base import Database, SQLiteCursorWrapper
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,  # negative: KiB, so 64 MB
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+DEFAULT_BUSY_RETRIES = 5
+DEFAULT_BUSY_BACKOFF = 0.05
+
+
+def is_busy(error):
+    return isinstance(error, Database.OperationalError) and 'locked' in str(error)
+
+
+class BusyRetryCursorWrapper(SQLiteCursorWrapper):
+    # Set by DatabaseWrapper.create_cursor.
+    busy_retries = DEFAULT_BUSY_RETRIES
+    busy_backoff = DEFAULT_BUSY_BACKOFF
+
+    def _retrying(self, method, *args):
+        if self.connection.in_transaction:
+            return method(*args)
+        for attempt in range(self.busy_retries + 1):
+            try:
+                return method(*args)
+            except Database.OperationalError as e:
+                if not is_busy(e) or attempt == self.busy_retries:
+                    raise
+            delay = self.busy_backoff * 2 ** attempt
+            time.sleep(delay + random.uniform(0, delay))
+
+    def execute(self, query, params=None):
+        return self._retrying(super().execute, query, params)
+
+    def executemany(self, query, param_list):
+        return self._retrying(super().executemany, query, param_list)
+
+
+class DatabaseWrapper(sqlite3_base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        # Not sqlite3.connect() arguments.
+        options = {name: kwargs.pop(name, None)
+                   for name in ('pragmas', 'transaction_mode', 'busy_retries', 'busy_backoff')}
+        self.pragmas = {**DEFAULT_PRAGMAS, **(options['pragmas'] or {})}
+        self.transaction_mode = (options['transaction_mode'] or 'IMMEDIATE').upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"transaction_mode must be one of {', '.join(TRANSACTION_MODES)}, not {self.transaction_mode!r}.")
+        self.busy_retries = DEFAULT_BUSY_RETRIES if options['busy_retries'] is None else options['busy_retries']
+        self.busy_backoff = DEFAULT_BUSY_BACKOFF if options['busy_backoff'] is None else options['busy_backoff']
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=BusyRetryCursorWrapper)
+        cursor.busy_retries = self.busy_retries
+        cursor.busy_backoff = self.busy_backoff
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f"BEGIN {self.transaction_mode}")
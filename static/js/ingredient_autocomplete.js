@@ -0,0 +1,44 @@
+// Ingredient picker for IngredientAutocompleteWidget (core/forms.py).
+// Delegated on the document so rows cloned by the recipe formset keep working.
+(function () {
+  var idsByLabel = {};
+
+  function hiddenInputFor(textInput) {
+    var name = textInput.name.replace(/_label$/, '');
+    return textInput.parentNode.querySelector('input[type="hidden"][name="' + name + '"]');
+  }
+
+  function setIngredient(textInput, id) {
+    var hidden = hiddenInputFor(textInput);
+    if (hidden && hidden.value !== String(id || '')) {
+      hidden.value = id || '';
+      hidden.dispatchEvent(new Event('change', { bubbles: true }));
+    }
+  }
+
+  document.addEventListener('input', function (event) {
+    var textInput = event.target;
+    if (!textInput.matches || !textInput.matches('input[data-ingredient-autocomplete]')) {
+      return;
+    }
+    setIngredient(textInput, idsByLabel[textInput.value]);
+    if (idsByLabel[textInput.value] || !textInput.value) {
+      return;
+    }
+    var url = textInput.getAttribute('data-ingredient-autocomplete') + '?q=' + encodeURIComponent(textInput.value);
+    fetch(url)
+      .then(function (response) { return response.json(); })
+      .then(function (data) {
+        var options = document.getElementById(textInput.getAttribute('list'));
+        options.innerHTML = '';
+        data.results.forEach(function (item) {
+          var label = item.name + ' (' + item.measurement_unit + ')';
+          idsByLabel[label] = item.id;
+          var option = document.createElement('option');
+          option.value = label;
+          options.appendChild(option);
+        });
+        setIngredient(textInput, idsByLabel[textInput.value]);
+      });
+  });
+})();